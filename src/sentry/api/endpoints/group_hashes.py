@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 
+import logging
+
 from functools import partial
+from uuid import uuid4
 
 from rest_framework.response import Response
 
@@ -12,6 +15,8 @@ from sentry.models import GroupHash
 from sentry.tasks.unmerge import unmerge
 from sentry.utils.snuba import raw_query
 
+logger = logging.getLogger(__name__)
+
 
 class GroupHashesEndpoint(GroupEndpoint):
     def get(self, request, group):
@@ -59,11 +64,23 @@ class GroupHashesEndpoint(GroupEndpoint):
         if not hash_list:
             return Response()
 
+        # The id is chosen here rather than in the task, so that a redelivered
+        # first task resumes from the same progress checkpoint.
+        unmerge_id = uuid4().hex
         unmerge.delay(
-            group.project_id, group.id, None, hash_list, request.user.id if request.user else None
+            group.project_id,
+            group.id,
+            None,
+            hash_list,
+            request.user.id if request.user else None,
+            unmerge_id=unmerge_id,
+        )
+        logger.info(
+            "unmerge.scheduled",
+            extra={"unmerge_id": unmerge_id, "project_id": group.project_id, "group_id": group.id},
         )
 
-        return Response(status=202)
+        return Response({"unmergeId": unmerge_id}, status=202)
 
     def __handle_results(self, project_id, group_id, user, results):
         return [self.__handle_result(user, project_id, group_id, result) for result in results]
@@ -3,10 +3,39 @@ from __future__ import absolute_import
 
 from sentry import features
 from sentry.api.bases import GroupEndpoint
+from sentry.models import GroupRedirect
+from sentry.reprocessing2 import get_progress
 from sentry.tasks.reprocessing2 import reprocess_group
 
 
 class GroupReprocessingEndpoint(GroupEndpoint):
+    def get(self, request, group):
+        """
+        Retrieve reprocessing progress
+        ``````````````````````````````
+
+        Returns the number of events of a group that are still pending
+        reprocessing, the rate at which they are processed and the estimated
+        number of seconds until reprocessing is finished.
+
+        :pparam string issue_id: the ID of the issue to retrieve.
+        :auth: required
+        """
+
+        # Once reprocessing has started, the issue ID refers to the new group
+        # that redirects from the group being reprocessed.
+        group_ids = [group.id] + list(
+            GroupRedirect.objects.filter(group_id=group.id).values_list(
+                "previous_group_id", flat=True
+            )
+        )
+        for group_id in group_ids:
+            progress = get_progress(group_id)
+            if progress is not None:
+                return self.respond(progress)
+
+        return self.respond({"error": "This issue is not being reprocessed"}, status=404)
+
     def post(self, request, group):
         """
         Reprocess a group
@@ -6,15 +6,17 @@ import six
 from rest_framework.response import Response
 
 from django.conf import settings
+from django.http import HttpResponse
 
 from sentry_sdk import Hub, start_span, start_transaction, set_tag
 
+from sentry import options
 from sentry.api.base import Endpoint
 from sentry.api.permissions import RelayPermission
 from sentry.api.authentication import RelayAuthentication
 from sentry.relay import config, projectconfig_cache
 from sentry.models import Project, ProjectKey, Organization, OrganizationOption, ProjectKeyStatus
-from sentry.utils import metrics
+from sentry.utils import json, metrics
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,40 @@ def _sample_apm():
     return random.random() < getattr(settings, "SENTRY_RELAY_ENDPOINT_APM_SAMPLING", 0)
 
 
+def _get_cached_configs(keys, full_config_requested):
+    """
+    Returns the JSON encoded full configs of the given public keys or
+    project ids from the projectconfig cache.
+    """
+    if not full_config_requested or not options.get("relay.serve-cached-project-configs"):
+        return {}
+
+    with start_span(op="relay_fetch_cached_configs"):
+        with metrics.timer("relay_project_configs.fetching_cached_configs.duration"):
+            cached_configs = projectconfig_cache.get_raw_many(keys)
+
+    metrics.timing("relay_project_configs.configs_cached", len(cached_configs))
+    return cached_configs
+
+
+def _configs_response(configs, cached_configs):
+    """
+    Builds the response from computed and cached configs.  The cached configs
+    are already JSON encoded and are embedded into the response as they are.
+    """
+    if not cached_configs:
+        return Response({"configs": configs}, status=200)
+
+    fragments = [
+        u"%s:%s" % (json.dumps(key), json.dumps(value)) for key, value in six.iteritems(configs)
+    ]
+    fragments.extend(
+        u"%s:%s" % (json.dumps(key), value) for key, value in six.iteritems(cached_configs)
+    )
+    body = u'{"configs":{%s}}' % u",".join(fragments)
+    return HttpResponse(body, content_type="application/json", status=200)
+
+
 class RelayProjectConfigsEndpoint(Endpoint):
     authentication_classes = (RelayAuthentication,)
     permission_classes = (RelayPermission,)
@@ -61,6 +97,9 @@ class RelayProjectConfigsEndpoint(Endpoint):
         public_keys = request.relay_request_data.get("publicKeys")
         public_keys = set(public_keys or ())
 
+        cached_configs = _get_cached_configs(public_keys, full_config_requested)
+        public_keys.difference_update(cached_configs)
+
         project_keys = {}  # type: dict[str, ProjectKey]
         project_ids = set()  # type: set[int]
 
@@ -130,14 +169,21 @@ class RelayProjectConfigsEndpoint(Endpoint):
 
             configs[public_key] = project_config.to_dict()
 
-        if full_config_requested:
-            projectconfig_cache.set_many(configs)
+        if full_config_requested and configs:
+            projectconfig_cache.set_many(configs, invalidate=False)
 
-        return Response({"configs": configs}, status=200)
+        return _configs_response(configs, cached_configs)
 
     def _post_by_project(self, request, full_config_requested):
         project_ids = set(request.relay_request_data.get("projects") or ())
 
+        cached_configs = _get_cached_configs(project_ids, full_config_requested)
+        project_ids = set(
+            project_id
+            for project_id in project_ids
+            if six.text_type(project_id) not in cached_configs
+        )
+
         with start_span(op="relay_fetch_projects"):
             if project_ids:
                 with metrics.timer("relay_project_configs.fetching_projects.duration"):
@@ -195,7 +241,7 @@ class RelayProjectConfigsEndpoint(Endpoint):
 
             configs[six.text_type(project_id)] = project_config.to_dict()
 
-        if full_config_requested:
-            projectconfig_cache.set_many(configs)
+        if full_config_requested and configs:
+            projectconfig_cache.set_many(configs, invalidate=False)
 
-        return Response({"configs": configs}, status=200)
+        return _configs_response(configs, cached_configs)
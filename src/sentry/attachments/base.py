@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
+from collections import deque
 from six import string_types
+import six
 import zlib
 
 from sentry.utils import metrics
@@ -13,11 +15,87 @@ ATTACHMENT_DATA_CHUNK_KEY = u"{key}:a:{id}:{chunk_index}"
 
 UNINITIALIZED_DATA = object()
 
+#: Number of chunks that are fetched from the cache at once when streaming
+#: the data of an attachment.
+ATTACHMENT_PREFETCH_CHUNKS = 4
+
 
 class MissingAttachmentChunks(Exception):
     pass
 
 
+class AttachmentChunkReader(object):
+    """
+    A read-only file-like object over the chunks of a cached attachment.
+
+    Chunks are fetched ``prefetch`` at a time and decompressed as they are
+    read, so only a few chunks are held in memory at any time.  The first
+    batch of chunks is fetched immediately, which raises
+    ``MissingAttachmentChunks`` before any data is consumed if the
+    attachment has expired.
+    """
+
+    def __init__(self, cache, chunk_keys, prefetch=ATTACHMENT_PREFETCH_CHUNKS):
+        assert prefetch > 0
+        self._cache = cache
+        self._chunk_keys = list(chunk_keys)
+        self._prefetch = prefetch
+        self._position = 0
+        self._pending = deque()
+        self._buffer = b""
+        self._fetch()
+
+    def _fetch(self):
+        keys = self._chunk_keys[self._position : self._position + self._prefetch]
+        raw_chunks = self._cache.inner.get_many(keys, raw=True)
+        for key in keys:
+            raw_data = raw_chunks.get(key)
+            if raw_data is None:
+                raise MissingAttachmentChunks()
+            self._pending.append(raw_data)
+        self._position += len(keys)
+
+    def _next_chunk(self):
+        if not self._pending:
+            if self._position >= len(self._chunk_keys):
+                return None
+            self._fetch()
+        return zlib.decompress(self._pending.popleft())
+
+    def read(self, size=-1):
+        parts = []
+        remaining = size if size is not None and size >= 0 else None
+
+        while remaining is None or remaining > 0:
+            if not self._buffer:
+                self._buffer = self._next_chunk()
+                if self._buffer is None:
+                    self._buffer = b""
+                    break
+            if remaining is None:
+                part, self._buffer = self._buffer, b""
+            else:
+                part, self._buffer = self._buffer[:remaining], self._buffer[remaining:]
+                remaining -= len(part)
+            parts.append(part)
+
+        return b"".join(parts)
+
+    def __iter__(self):
+        if self._buffer:
+            chunk, self._buffer = self._buffer, b""
+            yield chunk
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self):
+        self._pending.clear()
+        self._buffer = b""
+
+
 class CachedAttachment(object):
     def __init__(
         self,
@@ -67,9 +145,18 @@ class CachedAttachment(object):
         assert self._data is not UNINITIALIZED_DATA
         return self._data
 
+    def getfile(self):
+        """
+        Returns a file-like object with the data of this attachment, which
+        is streamed from the cache if it hasn't been loaded yet.
+        """
+        if self._data is UNINITIALIZED_DATA and self._cache is not None:
+            return self._cache.get_data_stream(self)
+
+        return six.BytesIO(self.data)
+
     def delete(self):
-        for key in self.chunk_keys:
-            self._cache.inner.delete(key)
+        self._cache.inner.delete_many(list(self.chunk_keys))
 
     @property
     def chunk_keys(self):
@@ -104,6 +191,7 @@ class BaseAttachmentCache(object):
         self.inner = inner
 
     def set(self, key, attachments, timeout=None):
+        unchunked_data = {}
         for id, attachment in enumerate(attachments):
             if attachment.chunks is not None:
                 continue
@@ -116,14 +204,14 @@ class BaseAttachmentCache(object):
                 attachment.key = key
 
             metrics_tags = {"type": attachment.type}
-            self.set_unchunked_data(
-                key=key,
-                id=attachment.id,
-                data=attachment.data,
-                timeout=timeout,
-                metrics_tags=metrics_tags,
+            data_key = ATTACHMENT_UNCHUNKED_DATA_KEY.format(key=key, id=attachment.id)
+            unchunked_data[data_key] = self._compress_unchunked_data(
+                attachment.data, metrics_tags=metrics_tags
             )
 
+        if unchunked_data:
+            self.inner.set_many(unchunked_data, timeout, raw=True)
+
         meta = []
 
         for attachment in attachments:
@@ -138,11 +226,15 @@ class BaseAttachmentCache(object):
 
     def set_unchunked_data(self, key, id, data, timeout=None, metrics_tags=None):
         key = ATTACHMENT_UNCHUNKED_DATA_KEY.format(key=key, id=id)
+        compressed = self._compress_unchunked_data(data, metrics_tags=metrics_tags)
+        self.inner.set(key, compressed, timeout, raw=True)
+
+    def _compress_unchunked_data(self, data, metrics_tags=None):
         compressed = zlib.compress(data)
         metrics.timing("attachments.blob-size.raw", len(data), tags=metrics_tags)
         metrics.timing("attachments.blob-size.compressed", len(compressed), tags=metrics_tags)
         metrics.incr("attachments.received", tags=metrics_tags, skip_internal=False)
-        self.inner.set(key, compressed, timeout, raw=True)
+        return compressed
 
     def get_from_chunks(self, key, **attachment):
         return CachedAttachment(key=key, cache=self, **attachment)
@@ -156,18 +248,15 @@ class BaseAttachmentCache(object):
             yield CachedAttachment(cache=self, **attachment)
 
     def get_data(self, attachment):
-        data = []
-
-        for key in attachment.chunk_keys:
-            raw_data = self.inner.get(key, raw=True)
-            if raw_data is None:
-                raise MissingAttachmentChunks()
-            data.append(zlib.decompress(raw_data))
+        return self.get_data_stream(attachment).read()
 
-        return b"".join(data)
+    def get_data_stream(self, attachment):
+        return AttachmentChunkReader(self, attachment.chunk_keys)
 
     def delete(self, key):
+        keys = []
         for attachment in self.get(key):
-            attachment.delete()
+            keys.extend(attachment.chunk_keys)
+        keys.append(ATTACHMENT_META_KEY.format(key=key))
 
-        self.inner.delete(ATTACHMENT_META_KEY.format(key=key))
+        self.inner.delete_many(keys)
@@ -3,10 +3,14 @@ from __future__ import absolute_import
 import logging
 import six
 
-from django.db.models import F
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import AutoField, F, Model
 
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
+from sentry.utils import metrics
 from sentry.utils.services import Service
 
 
@@ -32,7 +36,7 @@ class Buffer(Service):
     keep up with the updates.
     """
 
-    __all__ = ("incr", "process", "process_pending", "validate")
+    __all__ = ("incr", "process", "process_batch", "process_pending", "validate")
 
     def incr(self, model, columns, filters, extra=None, signal_only=None):
         """
@@ -86,3 +90,220 @@ class Buffer(Service):
             created=created,
             sender=model,
         )
+
+    def process_batch(self, incrs):
+        """
+        Processes many buffered increments, given as ``(model, columns,
+        filters, extra, signal_only)`` tuples.
+
+        Increments of a model that update the same columns and are filtered
+        by the same fields are written with a single ``UPDATE ... FROM
+        (VALUES ...)`` statement.  Everything else, including increments
+        whose row does not exist yet, goes through ``process``.
+
+        Returns the increments that could not be written because of a
+        database error, so that callers can keep them buffered.  Increments
+        that fail for any other reason are dropped.
+        """
+        batches = OrderedDict()
+        remaining = []
+        for incr in incrs:
+            model, columns, filters, extra, signal_only = incr
+            batch_key = None
+            if not signal_only:
+                batch_key = _get_batch_key(model, columns, filters, extra)
+            if batch_key is None:
+                remaining.append(incr)
+            else:
+                batches.setdefault(batch_key, []).append(incr)
+
+        for batch_key, batch in six.iteritems(batches):
+            if len(batch) == 1:
+                remaining.extend(batch)
+                continue
+
+            model = batch_key[0]
+            try:
+                with metrics.timer("buffer.batch.update", tags={"model": model.__name__}):
+                    with transaction.atomic(using=router.db_for_write(model)):
+                        updated, missing = _bulk_update(batch_key, batch)
+            except Exception:
+                self.logger.exception("buffer.batch.update.failed", extra={"model": model.__name__})
+                remaining.extend(batch)
+                continue
+            metrics.timing("buffer.batch.rows", len(updated), tags={"model": model.__name__})
+            remaining.extend(missing)
+
+            # Receivers are looked up once for the whole batch, as there are
+            # usually none for the hot models.
+            if updated and buffer_incr_complete.has_listeners(model):
+                for model, columns, filters, extra, _ in updated:
+                    buffer_incr_complete.send_robust(
+                        model=model,
+                        columns=columns,
+                        filters=filters,
+                        extra=extra,
+                        created=False,
+                        sender=model,
+                    )
+
+        failed = []
+        for incr in remaining:
+            try:
+                self.process(*incr)
+            except DatabaseError:
+                self.logger.exception("buffer.process.failed", extra={"model": incr[0].__name__})
+                failed.append(incr)
+            except Exception:
+                self.logger.exception("buffer.process.failed", extra={"model": incr[0].__name__})
+                metrics.incr("buffer.process_batch.dropped", tags={"reason": "error"})
+        return failed
+
+
+def _get_field(model, name):
+    if name == "pk":
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def _computes_score(model, column_names, extra_names):
+    from sentry.models import Group
+
+    return model is Group and "times_seen" in column_names and "last_seen" in extra_names
+
+
+def _get_batch_key(model, columns, filters, extra):
+    """
+    Returns the key by which increments are grouped into one statement, or
+    ``None`` if the increment cannot be written in bulk.
+    """
+    extra = extra or {}
+    if not columns or not filters:
+        return None
+
+    # Group increments carry a ``ScoreClause`` that ``process`` replaces with
+    # one computed from ``times_seen`` and ``last_seen``, the statement
+    # computes the same expression instead.
+    if "score" in extra:
+        if not _computes_score(model, columns, extra):
+            return None
+        extra = {name: value for name, value in six.iteritems(extra) if name != "score"}
+
+    # Lookups like ``__in`` and ``NULL`` filters don't translate to a join
+    # on equal values.
+    if any("__" in name or value is None for name, value in six.iteritems(filters)):
+        return None
+
+    names = list(columns) + list(filters) + list(extra)
+    try:
+        db_columns = [_get_field(model, name).column for name in names]
+    except FieldDoesNotExist:
+        return None
+    if None in db_columns or len(set(db_columns)) != len(db_columns):
+        return None
+
+    if connections[router.db_for_write(model)].vendor != "postgresql":
+        return None
+
+    return (model, tuple(sorted(columns)), tuple(sorted(filters)), tuple(sorted(extra)))
+
+
+def _get_cast_type(field, connection):
+    # Serial types only exist in column definitions.
+    if isinstance(field, AutoField):
+        return "bigint"
+    return field.db_type(connection)
+
+
+def _bulk_update(batch_key, batch):
+    """
+    Applies a batch of increments with a single statement and returns the
+    increments that updated a row, and those that did not.
+    """
+    model, column_names, filter_names, extra_names = batch_key
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+
+    fields = [(name, _get_field(model, name)) for name in filter_names + column_names + extra_names]
+
+    params = []
+    rows = []
+    seen = set()
+    for index, incr in enumerate(batch):
+        _, columns, filters, extra, _ = incr
+        row = [index]
+        for name, field in fields:
+            if name in filters:
+                value = filters[name]
+            elif name in columns:
+                value = columns[name]
+            else:
+                value = extra[name]
+            if isinstance(value, Model):
+                value = value.pk
+            row.append(field.get_db_prep_save(value, connection))
+
+        # A row may only be joined once, otherwise all but one of its
+        # increments are silently dropped.
+        filter_values = tuple(row[1 : len(filter_names) + 1])
+        if filter_values in seen:
+            continue
+        seen.add(filter_values)
+        rows.append(u"(%s)" % u", ".join([u"%s::integer"] + [u"%s::{}"] * len(fields)))
+        params.extend(row)
+
+    casts = [_get_cast_type(field, connection) for _, field in fields]
+    values_sql = u", ".join(row.format(*casts) for row in rows)
+
+    assignments = [
+        u"{col} = t.{col} + v.{col}".format(col=quote_name(_get_field(model, name).column))
+        for name in column_names
+    ] + [
+        u"{col} = v.{col}".format(col=quote_name(_get_field(model, name).column))
+        for name in extra_names
+    ]
+
+    # Same as the ``ScoreClause`` set by ``process``.
+    if _computes_score(model, column_names, extra_names):
+        assignments.append(
+            u"{score} = log(t.{times_seen} + v.{times_seen}) * 600"
+            u" + floor(extract(epoch from v.{last_seen}))".format(
+                score=quote_name("score"),
+                times_seen=quote_name("times_seen"),
+                last_seen=quote_name("last_seen"),
+            )
+        )
+
+    query = u"""
+        update {table} as t
+        set {assignments}
+        from (values {values}) as v ({columns})
+        where {conditions}
+        returning v.{index}
+    """.format(
+        table=quote_name(model._meta.db_table),
+        assignments=u", ".join(assignments),
+        values=values_sql,
+        columns=u", ".join(
+            [quote_name("__index")] + [quote_name(field.column) for _, field in fields]
+        ),
+        conditions=u" and ".join(
+            u"t.{col} = v.{col}".format(col=quote_name(_get_field(model, name).column))
+            for name in filter_names
+        ),
+        index=quote_name("__index"),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        updated_indexes = set(index for index, in cursor.fetchall())
+
+    updated = []
+    missing = []
+    for index, incr in enumerate(batch):
+        if index in updated_indexes:
+            updated.append(incr)
+        else:
+            missing.append(incr)
+    return updated, missing
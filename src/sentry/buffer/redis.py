@@ -1,10 +1,13 @@
 from __future__ import absolute_import
 
+import atexit
 import six
 
 import threading
 from time import time
+from uuid import uuid4
 
+from celery.signals import worker_process_shutdown
 from datetime import datetime
 from django.db import models
 from django.utils import timezone
@@ -50,16 +53,88 @@ class PendingBuffer(object):
         return rv
 
 
+class PendingIncr(object):
+    """
+    An increment for a single buffer key that has not been written to Redis
+    yet. Counters of merged increments are summed, extra values are last
+    write wins and ``signal_only`` sticks once set.  ``retries`` counts how
+    often the increment failed to be written to the database.
+    """
+
+    __slots__ = ("key", "model", "columns", "filters", "extra", "signal_only", "retries")
+
+    def __init__(self, key, model, columns, filters, extra=None, signal_only=None, retries=0):
+        self.key = key
+        self.model = model
+        self.columns = dict(columns)
+        self.filters = filters
+        self.extra = dict(extra or {})
+        self.signal_only = signal_only
+        self.retries = retries
+
+    def merge(self, columns, extra=None, signal_only=None):
+        for column, amount in six.iteritems(columns):
+            self.columns[column] = self.columns.get(column, 0) + amount
+        if extra:
+            self.extra.update(extra)
+        if signal_only is True:
+            self.signal_only = True
+
+
 class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = "b:p"
-
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    inflight_key = "b:inflight-batches"
+    # Queued batches whose task never ran are forgotten after this many seconds
+    inflight_expire = 60 * 10
+    # Increments that failed to be written this many times are dropped
+    incr_max_retries = 5
+
+    def __init__(
+        self,
+        pending_partitions=1,
+        incr_batch_size=2,
+        incr_coalesce_window=0,
+        incr_coalesce_max_keys=1000,
+        flush_on_shutdown=True,
+        pending_scan_size=1000,
+        max_inflight_batches=None,
+        **options
+    ):
+        """
+        ``incr_coalesce_window`` (in seconds) enables merging of increments
+        to the same key in memory before they are written to Redis, up to
+        ``incr_coalesce_max_keys`` distinct keys. Increments that are not
+        flushed yet are lost if the process dies, unless it shuts down
+        cleanly and ``flush_on_shutdown`` is set.
+
+        ``process_pending`` reads the pending keys in slices of
+        ``pending_scan_size``.  With ``max_inflight_batches`` set, it stops
+        once that many ``process_incr`` tasks are queued and not done yet,
+        leaving the remaining keys for the next run.
+        """
         self.cluster, options = get_cluster_from_options("SENTRY_BUFFER_OPTIONS", options)
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        self.incr_coalesce_window = incr_coalesce_window
+        self.incr_coalesce_max_keys = incr_coalesce_max_keys
+        self.pending_scan_size = pending_scan_size
+        self.max_inflight_batches = max_inflight_batches
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
+        assert self.incr_coalesce_max_keys > 0
+        assert self.pending_scan_size > 0
+        assert self.max_inflight_batches is None or self.max_inflight_batches > 0
+
+        self._coalesced = {}
+        self._coalesced_count = 0
+        self._coalesced_since = None
+        self._coalesce_lock = threading.Lock()
+
+        if self.incr_coalesce_window > 0 and flush_on_shutdown:
+            atexit.register(self.flush_coalesced)
+            # Celery pool processes exit without running atexit handlers.
+            worker_process_shutdown.connect(self._flush_on_worker_shutdown, weak=False)
 
     def validate(self):
         try:
@@ -158,47 +233,122 @@ class RedisBuffer(Buffer):
             - Perform a set (last write wins) on extra
             - Perform a set on signal_only (only if True)
         - Add hashmap key to pending flushes
+
+        When ``incr_coalesce_window`` is configured, increments are merged in
+        memory per key and written out in batches by ``flush_coalesced``.
         """
 
         # TODO(dcramer): longer term we'd rather not have to serialize values
         # here (unless it's to JSON)
         key = self._make_key(model, filters)
-        pending_key = self._make_pending_key_from_key(key)
-        # We can't use conn.map() due to wanting to support multiple pending
-        # keys (one per Redis partition)
-        conn = self.cluster.get_local_client_for_key(key)
-
-        pipe = conn.pipeline()
-        pipe.hsetnx(key, "m", "%s.%s" % (model.__module__, model.__name__))
-        # TODO(dcramer): once this goes live in production, we can kill the pickle path
-        # (this is to ensure a zero downtime deploy where we can transition event processing)
-        pipe.hsetnx(key, "f", pickle.dumps(filters))
-        # pipe.hsetnx(key, 'f', json.dumps(self._dump_values(filters)))
-        for column, amount in six.iteritems(columns):
-            pipe.hincrby(key, "i+" + column, amount)
 
-        if extra:
+        if self.incr_coalesce_window > 0:
+            self._coalesce_incr(key, model, columns, filters, extra, signal_only)
+        else:
+            self._write_incrs([PendingIncr(key, model, columns, filters, extra, signal_only)])
+
+        metrics.incr(
+            "buffer.incr",
+            skip_internal=True,
+            tags={"module": model.__module__, "model": model.__name__},
+        )
+
+    def _coalesce_incr(self, key, model, columns, filters, extra, signal_only):
+        with self._coalesce_lock:
+            pending = self._coalesced.get(key)
+            if pending is None:
+                self._coalesced[key] = PendingIncr(key, model, columns, filters, extra, signal_only)
+            else:
+                pending.merge(columns, extra, signal_only)
+            self._coalesced_count += 1
+
+            if self._coalesced_since is None:
+                self._coalesced_since = time()
+                self._schedule_flush()
+
+            should_flush = (
+                len(self._coalesced) >= self.incr_coalesce_max_keys
+                or time() - self._coalesced_since >= self.incr_coalesce_window
+            )
+
+        if should_flush:
+            self.flush_coalesced()
+
+    def _schedule_flush(self):
+        # Makes sure increments sitting in memory are written out even if no
+        # further ``incr`` calls arrive to trigger the flush.
+        timer = threading.Timer(self.incr_coalesce_window, self.flush_coalesced)
+        timer.daemon = True
+        timer.start()
+
+    def flush_coalesced(self):
+        """
+        Writes all increments that were merged in memory to Redis.
+        """
+        with self._coalesce_lock:
+            pending = self._coalesced
+            count = self._coalesced_count
+            self._coalesced = {}
+            self._coalesced_count = 0
+            self._coalesced_since = None
+
+        if not pending:
+            return
+
+        with metrics.timer("buffer.coalesce.flush"):
+            self._write_incrs(six.itervalues(pending))
+
+        metrics.timing("buffer.coalesce.keys", len(pending))
+        metrics.timing("buffer.coalesce.ratio", float(count) / len(pending))
+
+    def _flush_on_worker_shutdown(self, **kwargs):
+        self.flush_coalesced()
+
+    def _write_incrs(self, incrs):
+        """
+        Writes the given increments with a single pipeline per Redis node.
+        """
+        router = self.cluster.get_router()
+        pipes = {}
+
+        for incr in incrs:
+            key = incr.key
+            # We can't use conn.map() due to wanting to support multiple pending
+            # keys (one per Redis partition)
+            host_id = router.get_host_for_key(key)
+            pipe = pipes.get(host_id)
+            if pipe is None:
+                pipe = pipes[host_id] = self.cluster.get_local_client(host_id).pipeline()
+
+            model = incr.model
+            pipe.hsetnx(key, "m", "%s.%s" % (model.__module__, model.__name__))
+            # TODO(dcramer): once this goes live in production, we can kill the pickle path
+            # (this is to ensure a zero downtime deploy where we can transition event processing)
+            pipe.hsetnx(key, "f", pickle.dumps(incr.filters))
+            # pipe.hsetnx(key, 'f', json.dumps(self._dump_values(filters)))
+            for column, amount in six.iteritems(incr.columns):
+                pipe.hincrby(key, "i+" + column, amount)
+
             # Group tries to serialize 'score', so we'd need some kind of processing
             # hook here
             # e.g. "update score if last_seen or times_seen is changed"
-            for column, value in six.iteritems(extra):
+            for column, value in six.iteritems(incr.extra):
                 # TODO(dcramer): once this goes live in production, we can kill the pickle path
                 # (this is to ensure a zero downtime deploy where we can transition event processing)
                 pipe.hset(key, "e+" + column, pickle.dumps(value))
                 # pipe.hset(key, 'e+' + column, json.dumps(self._dump_value(value)))
 
-        if signal_only is True:
-            pipe.hset(key, "s", "1")
+            if incr.signal_only is True:
+                pipe.hset(key, "s", "1")
 
-        pipe.expire(key, self.key_expire)
-        pipe.zadd(pending_key, {key: time()})
-        pipe.execute()
+            if incr.retries:
+                pipe.hset(key, "r", incr.retries)
 
-        metrics.incr(
-            "buffer.incr",
-            skip_internal=True,
-            tags={"module": model.__module__, "model": model.__name__},
-        )
+            pipe.expire(key, self.key_expire)
+            pipe.zadd(self._make_pending_key_from_key(key), {key: time()})
+
+        for pipe in six.itervalues(pipes):
+            pipe.execute()
 
     def process_pending(self, partition=None):
         if partition is None and self.pending_partitions > 1:
@@ -217,41 +367,197 @@ class RedisBuffer(Buffer):
         if not client.set(lock_key, "1", nx=True, ex=60):
             return
 
-        pending_buffer = PendingBuffer(self.incr_batch_size)
-
         try:
-            keycount = 0
-            with self.cluster.all() as conn:
-                results = conn.zrange(pending_key, 0, -1)
-
-            with self.cluster.all() as conn:
-                for host_id, keys in six.iteritems(results.value):
-                    if not keys:
-                        continue
-                    keycount += len(keys)
-                    for key in keys:
-                        pending_buffer.append(key.decode("utf-8"))
-                        if pending_buffer.full():
-                            process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
-                    conn.target([host_id]).zrem(pending_key, *keys)
-
-            # queue up remainder of pending keys
-            if not pending_buffer.empty():
-                process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
-
-            metrics.timing("buffer.pending-size", keycount)
+            self._drain_pending(pending_key)
         finally:
             client.delete(lock_key)
 
-    def process(self, key=None, batch_keys=None):
+    def _reserve_inflight(self, batches):
+        """
+        Reserves up to ``batches`` queued ``process_incr`` tasks against
+        ``max_inflight_batches`` and returns the ids of the reserved batches.
+
+        In-flight batches are the members of a sorted set scored by the time
+        they were reserved, and their tasks remove them when done.  Members
+        of tasks that never ran are dropped once they are older than
+        ``inflight_expire``.  The set is shared by the drains of all
+        partitions, so batches are reserved before their tasks are queued
+        and what exceeds the cap is handed back right away.
+        """
+        now = time()
+        batch_ids = [uuid4().hex for _ in range(min(batches, self.max_inflight_batches))]
+        client = self.cluster.get_local_client_for_key(self.inflight_key)
+        pipe = client.pipeline()
+        pipe.zremrangebyscore(self.inflight_key, "-inf", now - self.inflight_expire)
+        pipe.zadd(self.inflight_key, {batch_id: now for batch_id in batch_ids})
+        pipe.zcard(self.inflight_key)
+        pipe.expire(self.inflight_key, self.inflight_expire)
+        inflight = pipe.execute()[2]
+        metrics.timing("buffer.inflight-batches", inflight)
+
+        excess = min(max(inflight - self.max_inflight_batches, 0), len(batch_ids))
+        if excess:
+            client.zrem(self.inflight_key, *batch_ids[-excess:])
+            batch_ids = batch_ids[:-excess]
+        return batch_ids
+
+    def _release_inflight(self, batch_ids):
+        if batch_ids:
+            self.cluster.get_local_client_for_key(self.inflight_key).zrem(
+                self.inflight_key, *batch_ids
+            )
+
+    def _drain_pending(self, pending_key):
+        """
+        Queues ``process_incr`` tasks for the keys in the pending sets.
+
+        The pending set of every host is read in slices of the oldest keys,
+        which are removed as soon as they are queued.  Only keys that were
+        pending when the drain started are read, so a single run is bounded
+        even while new increments keep arriving.
+        """
+        scan_until = time()
+        capped = self.max_inflight_batches is not None
+        pending_buffer = PendingBuffer(self.incr_batch_size)
+        keycount = 0
+        batches = 0
+        # The ids of reserved batches that are not queued yet
+        batch_ids = []
+        # The number of keys that still fit into the reserved batches
+        reserved_keys = 0
+
+        def queue_batch():
+            kwargs = {"batch_keys": pending_buffer.flush()}
+            if capped:
+                kwargs["batch_id"] = batch_ids.pop()
+            process_incr.apply_async(kwargs=kwargs)
+
+        hosts = list(self.cluster.hosts)
+        while hosts:
+            for host_id in list(hosts):
+                num = self.pending_scan_size
+                if capped:
+                    if reserved_keys < num:
+                        reserved = self._reserve_inflight(
+                            -(-(num - reserved_keys) // self.incr_batch_size)
+                        )
+                        batch_ids.extend(reserved)
+                        reserved_keys += len(reserved) * self.incr_batch_size
+                    num = min(num, reserved_keys)
+                    if num <= 0:
+                        hosts = []
+                        break
+
+                conn = self.cluster.get_local_client(host_id)
+                keys = conn.zrangebyscore(pending_key, "-inf", scan_until, start=0, num=num)
+                if len(keys) < num:
+                    hosts.remove(host_id)
+                if not keys:
+                    continue
+
+                keycount += len(keys)
+                reserved_keys -= len(keys)
+                for key in keys:
+                    pending_buffer.append(key.decode("utf-8"))
+                    if pending_buffer.full():
+                        queue_batch()
+                        batches += 1
+                conn.zrem(pending_key, *keys)
+
+        # queue up remainder of pending keys
+        if not pending_buffer.empty():
+            queue_batch()
+            batches += 1
+
+        self._release_inflight(batch_ids)
+
+        metrics.timing("buffer.pending-size", keycount)
+        metrics.timing("buffer.pending-batches", batches)
+        self._record_pending_lag(pending_key)
+
+    def _record_pending_lag(self, pending_key):
+        """
+        Reports the number of keys left in the pending sets and how long
+        the oldest of them has been waiting.
+        """
+        with self.cluster.all() as conn:
+            sizes = conn.zcard(pending_key)
+            oldest = conn.zrange(pending_key, 0, 0, withscores=True)
+
+        metrics.timing("buffer.pending-remaining", sum(six.itervalues(sizes.value)))
+        scores = [items[0][1] for items in six.itervalues(oldest.value) if items]
+        if scores:
+            metrics.timing("buffer.pending-lag", time() - min(scores))
+
+    def process(self, key=None, batch_keys=None, batch_id=None):
         assert not (key is None and batch_keys is None)
         assert not (key is not None and batch_keys is not None)
 
         if key is not None:
-            batch_keys = [key]
-
-        for key in batch_keys:
             self._process_single_incr(key)
+            return
+
+        try:
+            if len(batch_keys) > 1:
+                self._process_batch_incr(batch_keys)
+            else:
+                self._process_single_incr(batch_keys[0])
+        finally:
+            if batch_id is not None:
+                self._release_inflight([batch_id])
+
+    def _load_incr(self, key, values):
+        """
+        Returns the ``(model, columns, filters, extra, signal_only)`` of the
+        increment stored in a buffer hash, or ``None`` if it is empty.
+        """
+        # XXX(python3): In python2 this isn't as important since redis will
+        # return string tyes (be it, byte strings), but in py3 we get bytes
+        # back, and really we just want to deal with keys as strings.
+        values = {force_text(k): v for k, v in six.iteritems(values)}
+
+        if not values:
+            metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
+            self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+            return None
+
+        # XXX(py3): Note that ``import_string`` explicitly wants a str in
+        # python2, so we'll decode (for python3) and then translate back to
+        # a byte string (in python2) for import_string.
+        model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
+
+        if values["f"].startswith(b"{"):
+            filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
+        else:
+            # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+            filters = pickle.loads(values.pop("f"))
+
+        incr_values = {}
+        extra_values = {}
+        signal_only = None
+        for k, v in six.iteritems(values):
+            if k.startswith("i+"):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith("e+"):
+                if v.startswith(b"["):
+                    extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
+                else:
+                    # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+                    extra_values[k[2:]] = pickle.loads(v)
+            elif k == "s":
+                signal_only = bool(int(v))  # Should be 1 if set
+
+        return model, incr_values, filters, extra_values, signal_only
+
+    def _load_retries(self, values):
+        """
+        Returns how often the increment stored in a buffer hash failed to be
+        written to the database.
+        """
+        for k, v in six.iteritems(values):
+            if force_text(k) == "r":
+                return int(v)
+        return 0
 
     def _process_single_incr(self, key):
         client = self.cluster.get_routing_client()
@@ -273,42 +579,84 @@ class RedisBuffer(Buffer):
             pipe.delete(key)
             values = pipe.execute()[0]
 
-            # XXX(python3): In python2 this isn't as important since redis will
-            # return string tyes (be it, byte strings), but in py3 we get bytes
-            # back, and really we just want to deal with keys as strings.
-            values = {force_text(k): v for k, v in six.iteritems(values)}
-
-            if not values:
-                metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
-                self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+            incr = self._load_incr(key, values)
+            if incr is None:
                 return
 
-            # XXX(py3): Note that ``import_string`` explicitly wants a str in
-            # python2, so we'll decode (for python3) and then translate back to
-            # a byte string (in python2) for import_string.
-            model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
+            super(RedisBuffer, self).process(*incr)
+        finally:
+            client.delete(lock_key)
+
+    def _process_batch_incr(self, keys):
+        """
+        Like ``_process_single_incr``, but takes the locks and reads the
+        buffer hashes of all keys with a single pipeline per Redis node, and
+        writes the increments with ``process_batch``.
+        """
+        with self.cluster.map() as conn:
+            locks = [(key, conn.set(self._make_lock_key(key), "1", nx=True, ex=10)) for key in keys]
 
-            if values["f"].startswith(b"{"):
-                filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
+        locked_keys = []
+        for key, promise in locks:
+            if promise.value:
+                locked_keys.append(key)
             else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(values.pop("f"))
-
-            incr_values = {}
-            extra_values = {}
-            signal_only = None
-            for k, v in six.iteritems(values):
-                if k.startswith("i+"):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith("e+"):
-                    if v.startswith(b"["):
-                        extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(v)
-                elif k == "s":
-                    signal_only = bool(int(v))  # Should be 1 if set
-
-            super(RedisBuffer, self).process(model, incr_values, filters, extra_values, signal_only)
+                metrics.incr("buffer.revoked", tags={"reason": "locked"}, skip_internal=False)
+                self.logger.debug("buffer.revoked.locked", extra={"redis_key": key})
+
+        if not locked_keys:
+            return
+
+        try:
+            router = self.cluster.get_router()
+            pipes = {}
+            for key in locked_keys:
+                host_id = router.get_host_for_key(key)
+                if host_id not in pipes:
+                    pipes[host_id] = (self.cluster.get_local_client(host_id).pipeline(), [])
+                pipe, host_keys = pipes[host_id]
+                pipe.hgetall(key)
+                pipe.zrem(self._make_pending_key_from_key(key), key)
+                pipe.delete(key)
+                host_keys.append(key)
+
+            values = {}
+            for pipe, host_keys in six.itervalues(pipes):
+                results = pipe.execute()
+                # Every key queued an hgetall, zrem and delete.
+                values.update(zip(host_keys, results[::3]))
+
+            incrs = []
+            keys_by_incr = {}
+            for key in locked_keys:
+                incr = self._load_incr(key, values[key])
+                if incr is not None:
+                    incrs.append(incr)
+                    keys_by_incr[id(incr)] = key
+
+            with metrics.timer("buffer.process_batch"):
+                failed = super(RedisBuffer, self).process_batch(incrs)
+            metrics.timing("buffer.process_batch.size", len(incrs))
+
+            # The hashes are gone already, put the increments that could not
+            # be written back into the buffer for the next flush, unless they
+            # failed too often already.
+            if failed:
+                metrics.incr("buffer.process_batch.failed", amount=len(failed))
+                retry = []
+                for incr in failed:
+                    key = keys_by_incr[id(incr)]
+                    retries = self._load_retries(values[key]) + 1
+                    if retries > self.incr_max_retries:
+                        metrics.incr("buffer.process_batch.dropped", tags={"reason": "retries"})
+                        self.logger.error(
+                            "buffer.process_batch.dropped",
+                            extra={"redis_key": key, "retries": retries - 1},
+                        )
+                        continue
+                    retry.append(PendingIncr(key, *incr, retries=retries))
+                self._write_incrs(retry)
         finally:
-            client.delete(lock_key)
+            with self.cluster.map() as conn:
+                for key in locked_keys:
+                    conn.delete(self._make_lock_key(key))
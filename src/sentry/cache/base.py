@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import six
+
 from django.conf import settings
 
 from threading import local
@@ -24,3 +26,22 @@ class BaseCache(local):
 
     def get(self, key, version=None, raw=False):
         raise NotImplementedError
+
+    def get_many(self, keys, version=None, raw=False):
+        """
+        Returns a dict of the keys that were found and their values.
+        """
+        rv = {}
+        for key in keys:
+            value = self.get(key, version=version, raw=raw)
+            if value is not None:
+                rv[key] = value
+        return rv
+
+    def set_many(self, mapping, timeout, version=None, raw=False):
+        for key, value in six.iteritems(mapping):
+            self.set(key, value, timeout, version=version, raw=raw)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
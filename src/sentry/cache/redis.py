@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import six
+
 from sentry.utils import json
 from sentry.utils.redis import get_cluster_from_options, redis_clusters
 
@@ -18,15 +20,37 @@ class CommonRedisCache(BaseCache):
         self.client = client
         BaseCache.__init__(self, **options)
 
-    def set(self, key, value, timeout, version=None, raw=False):
-        key = self.make_key(key, version=version)
+    def _encode_value(self, key, value, raw):
         v = json.dumps(value) if not raw else value
         if len(v) > self.max_size:
             raise ValueTooLarge("Cache key too large: %r %r" % (key, len(v)))
+        return v
+
+    def _decode_value(self, value, raw):
+        if value is not None and not raw:
+            value = json.loads(value)
+        return value
+
+    def _execute_many(self, commands):
+        """
+        Executes a list of ``(method, args)`` commands, pipelined per node,
+        and returns their results in order.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for method, args in commands:
+            getattr(pipe, method)(*args)
+        return pipe.execute()
+
+    def _set_command(self, key, value, timeout):
         if timeout:
-            self.client.setex(key, int(timeout), v)
-        else:
-            self.client.set(key, v)
+            return ("setex", (key, int(timeout), value))
+        return ("set", (key, value))
+
+    def set(self, key, value, timeout, version=None, raw=False):
+        key = self.make_key(key, version=version)
+        v = self._encode_value(key, value, raw)
+        method, args = self._set_command(key, v, timeout)
+        getattr(self.client, method)(*args)
 
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
@@ -34,18 +58,51 @@ class CommonRedisCache(BaseCache):
 
     def get(self, key, version=None, raw=False):
         key = self.make_key(key, version=version)
-        result = self.client.get(key)
-        if result is not None and not raw:
-            result = json.loads(result)
-        return result
+        return self._decode_value(self.client.get(key), raw)
+
+    def get_many(self, keys, version=None, raw=False):
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        results = self._execute_many(
+            [("get", (self.make_key(key, version=version),)) for key in keys]
+        )
+        return {
+            key: self._decode_value(result, raw)
+            for key, result in zip(keys, results)
+            if result is not None
+        }
+
+    def set_many(self, mapping, timeout, version=None, raw=False):
+        commands = []
+        # Check all values before writing any of them.
+        for key, value in six.iteritems(mapping):
+            key = self.make_key(key, version=version)
+            commands.append(self._set_command(key, self._encode_value(key, value, raw), timeout))
+        if commands:
+            self._execute_many(commands)
+
+    def delete_many(self, keys, version=None):
+        commands = [("delete", (self.make_key(key, version=version),)) for key in keys]
+        if commands:
+            self._execute_many(commands)
 
 
 class RbCache(CommonRedisCache):
     def __init__(self, **options):
         cluster, options = get_cluster_from_options("SENTRY_CACHE_OPTIONS", options)
         client = cluster.get_routing_client()
+        self.cluster = cluster
         CommonRedisCache.__init__(self, client, **options)
 
+    def _execute_many(self, commands):
+        # rb does not support manual pipelines, but batches the commands of a
+        # map per host and runs the hosts in parallel.
+        with self.cluster.map() as client:
+            promises = [getattr(client, method)(*args) for method, args in commands]
+        return [promise.value for promise in promises]
+
 
 # Confusing legacy name for RbCache.  We don't actually have a pure redis cache
 RedisCache = RbCache
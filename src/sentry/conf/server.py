@@ -1096,6 +1096,11 @@ SENTRY_ALLOW_ORIGIN = None
 # Enable scraping of javascript context for source code
 SENTRY_SCRAPE_JAVASCRIPT_CONTEXT = True
 
+# Maximum size in bytes of parsed release artifacts (sourcemaps and source
+# files) kept in memory per process and shared across events.  Set to 0 to
+# disable the cache.
+SENTRY_JS_PARSED_ARTIFACT_CACHE_SIZE = 100 * 1024 * 1024
+
 # Buffer backend
 SENTRY_BUFFER = "sentry.buffer.Buffer"
 SENTRY_BUFFER_OPTIONS = {}
@@ -1156,6 +1161,20 @@ SENTRY_SNUBA_TIMEOUT = 30
 SENTRY_NODESTORE = "sentry.nodestore.django.DjangoNodeStorage"
 SENTRY_NODESTORE_OPTIONS = {}
 
+# The maximum size (in bytes of JSON) of decoded node payloads kept in memory
+# per process in front of the ``nodedata`` cache, 0 disables the local tier.
+SENTRY_NODESTORE_LOCAL_CACHE_SIZE = 0
+
+# The number of seconds a node payload is kept in the local tier.
+SENTRY_NODESTORE_LOCAL_CACHE_TTL = 60
+
+# The maximum number of stacktrace processors' frame cache values kept in
+# memory per process in front of the default cache, 0 disables the local tier.
+SENTRY_FRAME_CACHE_LOCAL_SIZE = 0
+
+# The number of seconds a frame cache value is kept in the local tier.
+SENTRY_FRAME_CACHE_LOCAL_TTL = 60
+
 # Tag storage backend
 SENTRY_TAGSTORE = os.environ.get("SENTRY_TAGSTORE", "sentry.tagstore.snuba.SnubaTagStorage")
 SENTRY_TAGSTORE_OPTIONS = {}
@@ -1234,6 +1253,14 @@ SENTRY_SOURCE_FETCH_SOCKET_TIMEOUT = 2
 # Maximum content length for source files before we abort fetching
 SENTRY_SOURCE_FETCH_MAX_SIZE = 40 * 1024 * 1024
 
+# Number of source files and sourcemaps fetched concurrently per event.  A
+# value of 1 fetches them one after another.
+SENTRY_SOURCE_FETCH_CONCURRENCY = 1
+
+# Time budget (in seconds) for concurrently fetching all source files and
+# sourcemaps of one event.  Fetches not done by then are recorded as timeouts.
+SENTRY_SOURCE_FETCH_EVENT_TIMEOUT = 30
+
 # Fields which managed users cannot change via Sentry UI. Username and password
 # cannot be changed by managed users. Optionally include 'email' and
 # 'name' in SENTRY_MANAGED_USER_FIELDS.
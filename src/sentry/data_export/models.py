@@ -134,9 +134,12 @@ class ExportedDataBlob(Model):
 
     data_export = FlexibleForeignKey("sentry.ExportedData")
     blob = FlexibleForeignKey("sentry.FileBlob", db_constraint=False)
+    # The time shard of a sharded export, the blobs of every shard have
+    # their own offsets.  Unsharded exports only have shard 0.
+    shard = BoundedPositiveIntegerField(default=0)
     offset = BoundedBigIntegerField()
 
     class Meta:
         app_label = "sentry"
         db_table = "sentry_exporteddatablob"
-        unique_together = (("data_export", "blob", "offset"),)
+        unique_together = (("data_export", "blob", "shard", "offset"),)
@@ -2,11 +2,12 @@ from __future__ import absolute_import
 
 import logging
 
-from sentry.api.event_search import get_function_alias
+from sentry.api.event_search import get_function_alias, is_function
 from sentry.api.utils import get_date_range_from_params
 from sentry.models import Environment, Group, Project
 from sentry.snuba import discover
 from sentry.utils.compat import map
+from sentry.utils.snuba import SNUBA_AND, SNUBA_OR
 
 from ..base import ExportError
 
@@ -32,7 +33,9 @@ class DiscoverProcessor(object):
         # an empty list DOES NOT work
         if self.environments:
             self.params["environment"] = self.environments
-        self.header_fields = map(lambda x: get_function_alias(x), discover_query["field"])
+        self.fields = discover_query["field"]
+        self.query = discover_query["query"]
+        self.header_fields = map(lambda x: get_function_alias(x), self.fields)
         self.data_fn = self.get_data_fn(
             fields=discover_query["field"], query=discover_query["query"], params=self.params
         )
@@ -82,6 +85,63 @@ class DiscoverProcessor(object):
 
         return data_fn
 
+    @property
+    def can_shard(self):
+        """
+        Aggregated rows have no stable event key to page by, so only plain
+        event queries can be split into time shards and paged by keyset.
+        """
+        return not any(is_function(field) for field in self.fields)
+
+    def get_keyset_page(self, start, end, cursor, limit):
+        """
+        Returns the events in ``[start, end)`` following ``cursor`` ordered by
+        ``(timestamp, id)``, along with the cursor of the last returned event.
+        Unlike offset paging the cost of a page does not grow with its depth.
+        """
+        conditions = None
+        if cursor is not None:
+            timestamp = cursor["timestamp"]
+            conditions = [
+                [
+                    [
+                        SNUBA_OR,
+                        [
+                            ["greater", ["timestamp", timestamp]],
+                            [
+                                SNUBA_AND,
+                                [
+                                    ["equals", ["timestamp", timestamp]],
+                                    ["greater", ["event_id", cursor["id"]]],
+                                ],
+                            ],
+                        ],
+                    ],
+                    "=",
+                    1,
+                ]
+            ]
+
+        fields = list(self.fields)
+        for field in ("timestamp", "id"):
+            if field not in fields:
+                fields.append(field)
+
+        result = discover.query(
+            selected_columns=fields,
+            query=self.query,
+            params=dict(self.params, start=start, end=end),
+            orderby=["timestamp", "id"],
+            limit=limit,
+            conditions=conditions,
+            referrer="data_export.tasks.discover",
+            auto_fields=True,
+        )["data"]
+
+        if result:
+            cursor = {"timestamp": result[-1]["timestamp"], "id": result[-1]["id"]}
+        return result, cursor
+
     def handle_fields(self, result_list):
         # Find issue short_id if present
         # (originally in `/api/bases/organization_events.py`)
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+
+from sentry.utils import json, redis
+from sentry.utils.dates import to_datetime, to_timestamp
+
+# How long the progress of a sharded export is kept around
+SHARD_STATE_TTL = 60 * 60 * 24 * 7
+
+
+def split_time_range(start, end, count):
+    """
+    Splits the time range ``[start, end)`` into ``count`` contiguous ranges.
+    """
+    step = (end - start) // count
+    bounds = [start + step * i for i in range(count)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class ShardedExportState(object):
+    """
+    The progress of a sharded export, stored in a single Redis hash.
+
+    For every shard this records its time range, the keyset cursor of the
+    last exported row and the number of bytes it has written, so that
+    retried shard tasks resume where the last successful batch ended.
+    It also tracks the totals across shards, which are used to enforce
+    the export limits, and which shards are done.
+    """
+
+    def __init__(self, data_export_id):
+        self.key = u"dataexport:{}:shards".format(data_export_id)
+        self.cluster = redis.clusters.get("default")
+
+    @property
+    def client(self):
+        return self.cluster.get_local_client_for_key(self.key)
+
+    def _shard_field(self, shard):
+        return u"shard:{}".format(shard)
+
+    def _done_field(self, shard):
+        return u"done:{}".format(shard)
+
+    def init(self, time_ranges):
+        pipe = self.client.pipeline()
+        for shard, (start, end) in enumerate(time_ranges):
+            # A retried fan out must not reset the progress of its shards
+            pipe.hsetnx(
+                self.key,
+                self._shard_field(shard),
+                json.dumps(
+                    {
+                        "start": to_timestamp(start),
+                        "end": to_timestamp(end),
+                        "cursor": None,
+                        "bytes_written": 0,
+                    }
+                ),
+            )
+        pipe.expire(self.key, SHARD_STATE_TTL)
+        pipe.execute()
+
+    def get_shard(self, shard):
+        """
+        Returns the progress of a shard, or ``None`` if the export state is gone.
+        """
+        value = self.client.hget(self.key, self._shard_field(shard))
+        if value is None:
+            return None
+        progress = json.loads(value)
+        progress["start"] = to_datetime(progress["start"])
+        progress["end"] = to_datetime(progress["end"])
+        return progress
+
+    def get_totals(self):
+        rows, bytes_written = self.client.hmget(self.key, "rows", "bytes")
+        return int(rows or 0), int(bytes_written or 0)
+
+    def update_shard(self, shard, progress, rows, bytes_written):
+        progress = dict(
+            progress, start=to_timestamp(progress["start"]), end=to_timestamp(progress["end"])
+        )
+        pipe = self.client.pipeline()
+        pipe.hset(self.key, self._shard_field(shard), json.dumps(progress))
+        pipe.hincrby(self.key, "rows", rows)
+        pipe.hincrby(self.key, "bytes", bytes_written)
+        pipe.execute()
+
+    def finish_shard(self, shard, shard_count):
+        """
+        Marks a shard as done.  Returns ``True`` for exactly one caller once
+        all shards are done, which is then responsible for merging the export.
+        """
+        client = self.client
+        client.hset(self.key, self._done_field(shard), 1)
+        done = client.hmget(self.key, [self._done_field(i) for i in range(shard_count)])
+        if not all(done):
+            return False
+        return bool(client.hsetnx(self.key, "merging", 1))
+
+    def delete(self):
+        self.client.delete(self.key)
@@ -16,6 +16,7 @@ from django.utils import timezone
 
 import sentry_sdk
 
+from sentry import options
 from sentry.models import (
     AssembleChecksumMismatch,
     DEFAULT_BLOB_SIZE,
@@ -39,6 +40,7 @@ from .models import ExportedData, ExportedDataBlob
 from .utils import convert_to_utf8, handle_snuba_errors
 from .processors.discover import DiscoverProcessor
 from .processors.issues_by_tag import IssuesByTagProcessor
+from .sharding import ShardedExportState, split_time_range
 
 
 logger = logging.getLogger(__name__)
@@ -58,6 +60,7 @@ def assemble_download(
     offset=0,
     bytes_written=0,
     environment_id=None,
+    shards=None,
     **kwargs
 ):
     with sentry_sdk.start_transaction(
@@ -103,6 +106,19 @@ def assemble_download(
 
             processor = get_processor(data_export, environment_id)
 
+            if shards is None:
+                shards = options.get("dataexport.shards")
+
+            if (
+                first_page
+                and shards > 1
+                and data_export.query_type == ExportQueryType.DISCOVER
+                and processor.can_shard
+            ):
+                return start_sharded_export(
+                    data_export, processor, shards, export_limit, batch_size
+                )
+
             with tempfile.TemporaryFile(mode="w+b") as tf:
                 # XXX(python3):
                 #
@@ -196,6 +212,162 @@ def assemble_download(
                 merge_export_blobs.delay(data_export_id)
 
 
+def start_sharded_export(data_export, processor, shard_count, export_limit, batch_size):
+    """
+    Splits the time range of a discover export into ``shard_count`` shards
+    that are exported concurrently, each by its own chain of tasks.
+    """
+    time_ranges = split_time_range(processor.start, processor.end, shard_count)
+    ShardedExportState(data_export.id).init(time_ranges)
+    logger.info(
+        "dataexport.shard.start",
+        extra={"data_export_id": data_export.id, "shard_count": shard_count},
+    )
+    for shard in range(shard_count):
+        assemble_download_shard.delay(
+            data_export.id,
+            shard=shard,
+            shard_count=shard_count,
+            export_limit=export_limit,
+            batch_size=batch_size,
+        )
+
+
+@instrumented_task(
+    name="sentry.data_export.tasks.assemble_download_shard",
+    queue="data_export",
+    default_retry_delay=30,
+    max_retries=3,
+    acks_late=True,
+)
+def assemble_download_shard(
+    data_export_id,
+    shard,
+    shard_count,
+    export_limit=EXPORTED_ROWS_LIMIT,
+    batch_size=SNUBA_MAX_RESULTS,
+    **kwargs
+):
+    """
+    Exports the next batch of rows of one time shard of a discover export.
+
+    The progress of the shard is kept in its ``ShardedExportState`` so that
+    retries resume from the last stored batch.  The blobs are stored with
+    the shard and their offset within it, which lets ``merge_export_blobs``
+    assemble the shards in order.
+    """
+    with sentry_sdk.start_transaction(
+        op="task.data_export.assemble_shard", name="DataExportAssembleShard", sampled=True,
+    ):
+        try:
+            data_export = ExportedData.objects.get(id=data_export_id)
+        except ExportedData.DoesNotExist as error:
+            logger.exception(error)
+            return
+
+        logger.info(
+            "dataexport.shard.run", extra={"data_export_id": data_export_id, "shard": shard}
+        )
+
+        state = ShardedExportState(data_export_id)
+        try:
+            progress = state.get_shard(shard)
+            if progress is None:
+                raise ExportError("Export expired before it could be completed")
+
+            total_rows, total_bytes = state.get_totals()
+            processor = get_processor(data_export, None)
+            cursor = progress["cursor"]
+            rows = []
+            limit = 0
+            rows_written = 0
+            new_bytes_written = 0
+
+            # other shards may already have exhausted the export limit
+            if total_rows < export_limit:
+                with tempfile.TemporaryFile(mode="w+b") as tf:
+                    # XXX(python3): see `assemble_download`
+                    if six.PY2:
+                        tfw = tf
+                    else:
+                        tfw = codecs.getwriter("utf-8")(tf)
+
+                    writer = csv.DictWriter(tfw, processor.header_fields, extrasaction="ignore")
+                    if shard == 0 and cursor is None:
+                        writer.writeheader()
+
+                    starting_pos = tf.tell()
+
+                    while True:
+                        limit = min(batch_size, max(export_limit - total_rows - rows_written, 1))
+                        rows, cursor = process_discover_keyset(
+                            processor, progress["start"], progress["end"], cursor, limit
+                        )
+                        writer.writerows(rows)
+                        rows_written += len(rows)
+
+                        if (
+                            not rows
+                            or len(rows) < limit
+                            or tf.tell() - starting_pos >= MAX_BATCH_SIZE
+                        ):
+                            break
+
+                    tf.seek(0)
+                    new_bytes_written = store_export_chunk_as_blob(
+                        data_export, total_bytes, tf, offset=progress["bytes_written"], shard=shard,
+                    )
+        except ExportError as error:
+            state.delete()
+            return data_export.email_failure(message=six.text_type(error))
+        except Exception as error:
+            metrics.incr("dataexport.error", tags={"error": six.text_type(error)}, sample_rate=1.0)
+            logger.error(
+                "dataexport.error: %s",
+                six.text_type(error),
+                extra={"query": data_export.payload, "org": data_export.organization_id},
+            )
+            capture_exception(error)
+
+            try:
+                current.retry()
+            except MaxRetriesExceededError:
+                metrics.incr(
+                    "dataexport.end",
+                    tags={"success": False, "error": six.text_type(error)},
+                    sample_rate=1.0,
+                )
+                state.delete()
+                return data_export.email_failure(message="Internal processing failure")
+        else:
+            progress["cursor"] = cursor
+            progress["bytes_written"] += new_bytes_written
+            state.update_shard(shard, progress, rows_written, new_bytes_written)
+
+            if (
+                rows
+                and len(rows) >= limit
+                and new_bytes_written
+                and total_rows + rows_written < export_limit
+            ):
+                assemble_download_shard.delay(
+                    data_export_id,
+                    shard=shard,
+                    shard_count=shard_count,
+                    export_limit=export_limit,
+                    batch_size=batch_size,
+                )
+            elif state.finish_shard(shard, shard_count):
+                # the rows of concurrent shards are counted against the limit
+                # only once they are stored, so the limit may be overshot by
+                # at most one batch per shard.
+                total_rows, total_bytes = state.get_totals()
+                metrics.timing("dataexport.row_count", total_rows, sample_rate=1.0)
+                metrics.timing("dataexport.file_size", total_bytes, sample_rate=1.0)
+                state.delete()
+                merge_export_blobs.delay(data_export_id)
+
+
 def get_processor(data_export, environment_id):
     try:
         if data_export.query_type == ExportQueryType.ISSUES_BY_TAG:
@@ -257,9 +429,28 @@ def process_discover(processor, limit, offset):
     return raw_data
 
 
+@handle_snuba_errors(logger)
+def process_discover_keyset(processor, start, end, cursor, limit):
+    raw_data_unicode, cursor = processor.get_keyset_page(start, end, cursor, limit)
+    # TODO(python3): Remove next block once the 'csv' module has been updated
+    # to Python 3
+    if six.PY2:
+        raw_data = convert_to_utf8(raw_data_unicode)
+    else:
+        raw_data = raw_data_unicode
+    raw_data = processor.handle_fields(raw_data)
+    return raw_data, cursor
+
+
 @transaction.atomic()
-def store_export_chunk_as_blob(data_export, bytes_written, fileobj, blob_size=DEFAULT_BLOB_SIZE):
+def store_export_chunk_as_blob(
+    data_export, bytes_written, fileobj, blob_size=DEFAULT_BLOB_SIZE, offset=None, shard=0
+):
     # adapted from `putfile` in  `src/sentry/models/file.py`
+    # ``offset`` is where the blobs are stored within ``shard`` if it differs from
+    # ``bytes_written``, which is the size of the export so far.
+    if offset is None:
+        offset = bytes_written
     bytes_offset = 0
     while True:
         contents = fileobj.read(blob_size)
@@ -269,7 +460,7 @@ def store_export_chunk_as_blob(data_export, bytes_written, fileobj, blob_size=DE
         blob_fileobj = ContentFile(contents)
         blob = FileBlob.from_file(blob_fileobj, logger=logger)
         ExportedDataBlob.objects.get_or_create(
-            data_export=data_export, blob=blob, offset=bytes_written + bytes_offset
+            data_export=data_export, blob=blob, shard=shard, offset=offset + bytes_offset
         )
 
         bytes_offset += blob.size
@@ -321,7 +512,7 @@ def merge_export_blobs(data_export_id, **kwargs):
 
                 for export_blob in ExportedDataBlob.objects.filter(
                     data_export=data_export
-                ).order_by("offset"):
+                ).order_by("shard", "offset"):
                     blob = export_blob.blob
                     FileBlobIndex.objects.create(file=file, blob=blob, offset=size)
                     size += blob.size
@@ -132,23 +132,32 @@ class NodeData(collections.MutableMapping):
             self.data["_ref"] = ref
             self.data["_ref_version"] = self.ref_version
 
-    def save(self):
+    def get_data_to_save(self):
         """
-        Write current data back to nodestore.
+        Returns the data to write to nodestore, or ``None`` if there is
+        nothing to save.
         """
 
         # We never loaded any data for reading or writing, so there
         # is nothing to save.
         if self._node_data is None:
-            return
+            return None
 
         # We can't put our wrappers into the nodestore, so we need to
         # ensure that the data is converted into a plain old dict
         to_write = self._node_data
         if isinstance(to_write, CANONICAL_TYPES):
             to_write = dict(to_write.items())
+        return to_write
+
+    def save(self):
+        """
+        Write current data back to nodestore.
+        """
 
-        nodestore.set(self.id, to_write)
+        to_write = self.get_data_to_save()
+        if to_write is not None:
+            nodestore.set(self.id, to_write)
 
 
 class NodeField(GzippedDictField):
@@ -2,6 +2,9 @@ from __future__ import absolute_import, print_function
 
 import logging
 import re
+import six
+
+from collections import OrderedDict
 
 from sentry.constants import ObjectStatus
 from sentry.utils.query import bulk_delete_objects
@@ -28,6 +31,44 @@ class ModelRelation(BaseRelation):
         super(ModelRelation, self).__init__(params=params, task=task)
 
 
+def merge_relations(relations):
+    """
+    Merges the relations of a chunk of instances that only differ in the
+    id they are looking up, e.g. ``{"group_id": 1}`` and ``{"group_id": 2}``,
+    into a single relation with an ``__in`` lookup.  The order of the first
+    occurrence of every relation is preserved.
+    """
+    merged = OrderedDict()
+    for relation in relations:
+        query = relation.params.get("query")
+        if type(relation) is not ModelRelation or len(query) != 1:
+            merged[id(relation)] = relation
+            continue
+
+        ((field, value),) = query.items()
+        if not isinstance(value, six.integer_types) or "__" in field:
+            merged[id(relation)] = relation
+            continue
+
+        key = (
+            relation.params["model"],
+            field,
+            relation.task,
+            tuple(sorted(six.iteritems(relation.params.get("partition_key") or {}))),
+        )
+        if key in merged:
+            merged[key].params["query"][field + "__in"].append(value)
+        else:
+            merged[key] = ModelRelation(
+                relation.params["model"],
+                {field + "__in": [value]},
+                task=relation.task,
+                partition_key=relation.params.get("partition_key"),
+            )
+
+    return list(merged.values())
+
+
 class BaseDeletionTask(object):
     logger = logging.getLogger("sentry.deletions.async")
 
@@ -99,14 +140,16 @@ class BaseDeletionTask(object):
             if has_more:
                 return has_more
 
+        child_relations = []
         for instance in instance_list:
-            child_relations = self.get_child_relations(instance)
-            child_relations = self.extend_relations(child_relations, instance)
-            child_relations = self.filter_relations(child_relations)
-            if child_relations:
-                has_more = self.delete_children(child_relations)
-                if has_more:
-                    return has_more
+            relations = self.get_child_relations(instance)
+            relations = self.extend_relations(relations, instance)
+            child_relations.extend(self.filter_relations(relations))
+        child_relations = merge_relations(child_relations)
+        if child_relations:
+            has_more = self.delete_children(child_relations)
+            if has_more:
+                return has_more
 
         return self.delete_instance_bulk(instance_list)
 
@@ -139,12 +182,27 @@ class ModelDeletionTask(BaseDeletionTask):
     DEFAULT_QUERY_LIMIT = None
     manager_name = "objects"
 
-    def __init__(self, manager, model, query, query_limit=None, order_by=None, **kwargs):
+    def __init__(
+        self,
+        manager,
+        model,
+        query,
+        query_limit=None,
+        order_by=None,
+        id_range=None,
+        cursor=None,
+        **kwargs
+    ):
         super(ModelDeletionTask, self).__init__(manager, **kwargs)
         self.model = model
         self.query = query
         self.query_limit = query_limit or self.DEFAULT_QUERY_LIMIT or self.chunk_size
         self.order_by = order_by
+        # With an inclusive ``id_range``, rows are deleted in id order and
+        # ``cursor`` is the last deleted id, so a chunk does not need to skip
+        # over rows that are still locked or failed to delete.
+        self.id_range = id_range
+        self.cursor = cursor
 
     def __repr__(self):
         return "<%s: model=%s query=%s order_by=%s transaction_id=%s actor_id=%s>" % (
@@ -177,7 +235,12 @@ class ModelDeletionTask(BaseDeletionTask):
         remaining = self.chunk_size
         while remaining > 0:
             queryset = getattr(self.model, self.manager_name).filter(**self.query)
-            if self.order_by:
+            if self.id_range is not None:
+                start, end = self.id_range
+                if self.cursor is not None:
+                    start = max(start, self.cursor + 1)
+                queryset = queryset.filter(id__gte=start, id__lte=end).order_by("id")
+            elif self.order_by:
                 queryset = queryset.order_by(self.order_by)
 
             if num_shards:
@@ -196,6 +259,8 @@ class ModelDeletionTask(BaseDeletionTask):
                 return False
 
             self.delete_bulk(queryset)
+            if self.id_range is not None:
+                self.cursor = queryset[-1].id
             remaining -= query_limit
         return True
 
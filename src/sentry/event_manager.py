@@ -6,6 +6,7 @@ import logging
 import ipaddress
 import six
 
+from collections import defaultdict
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.cache import cache
@@ -14,7 +15,7 @@ from django.db.models import Func
 from django.utils.encoding import force_text
 from pytz import UTC
 
-from sentry import buffer, eventstore, eventtypes, eventstream, features, tsdb
+from sentry import buffer, eventstore, eventtypes, eventstream, features, nodestore, tsdb
 from sentry.attachments import MissingAttachmentChunks, attachment_cache
 from sentry.constants import (
     DataCategory,
@@ -695,78 +696,110 @@ def _tsdb_record_all_metrics(jobs):
 
     # XXX: validate whether anybody actually uses those metrics
 
-    for job in jobs:
-        incrs = []
-        frequencies = []
-        records = []
+    # The writes of all jobs are merged, so that a batch of jobs takes one
+    # call per environment, or per environment and timestamp where a call
+    # only supports a single timestamp.
+    # environment_id -> (model, key, timestamp) -> count
+    incrs = defaultdict(lambda: defaultdict(int))
+    # (environment_id, timestamp) -> (model, key) -> values
+    records = defaultdict(lambda: defaultdict(set))
+    # timestamp -> model -> key -> item -> count
+    frequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int))))
 
-        incrs.append((tsdb.models.project, job["project_id"]))
+    for job in jobs:
         event = job["event"]
         group = job["group"]
         release = job["release"]
         environment = job["environment"]
+        timestamp = event.datetime
+
+        job_incrs = incrs[environment.id]
+        job_incrs[(tsdb.models.project, job["project_id"], timestamp)] += 1
 
         if group:
-            incrs.append((tsdb.models.group, group.id))
-            frequencies.append(
-                (tsdb.models.frequent_environments_by_group, {group.id: {environment.id: 1}})
-            )
+            job_incrs[(tsdb.models.group, group.id, timestamp)] += 1
+            frequencies[timestamp][tsdb.models.frequent_environments_by_group][group.id][
+                environment.id
+            ] += 1
 
             if release:
-                frequencies.append(
-                    (
-                        tsdb.models.frequent_releases_by_group,
-                        {group.id: {job["grouprelease"].id: 1}},
-                    )
-                )
+                frequencies[timestamp][tsdb.models.frequent_releases_by_group][group.id][
+                    job["grouprelease"].id
+                ] += 1
 
         if release:
-            incrs.append((tsdb.models.release, release.id))
+            job_incrs[(tsdb.models.release, release.id, timestamp)] += 1
 
         user = job["user"]
 
         if user:
-            project_id = job["project_id"]
-            records.append((tsdb.models.users_affected_by_project, project_id, (user.tag_value,)))
+            job_records = records[(environment.id, timestamp)]
+            job_records[(tsdb.models.users_affected_by_project, job["project_id"])].add(
+                user.tag_value
+            )
 
             if group:
-                records.append((tsdb.models.users_affected_by_group, group.id, (user.tag_value,)))
-
-        if incrs:
-            tsdb.incr_multi(incrs, timestamp=event.datetime, environment_id=environment.id)
+                job_records[(tsdb.models.users_affected_by_group, group.id)].add(user.tag_value)
+
+    for environment_id, counts in six.iteritems(incrs):
+        tsdb.incr_multi(
+            [
+                (model, key, {"timestamp": timestamp, "count": count})
+                for (model, key, timestamp), count in six.iteritems(counts)
+            ],
+            environment_id=environment_id,
+        )
 
-        if records:
-            tsdb.record_multi(records, timestamp=event.datetime, environment_id=environment.id)
+    for (environment_id, timestamp), values in six.iteritems(records):
+        tsdb.record_multi(
+            [(model, key, tuple(items)) for (model, key), items in six.iteritems(values)],
+            timestamp=timestamp,
+            environment_id=environment_id,
+        )
 
-        if frequencies:
-            tsdb.record_frequency_multi(frequencies, timestamp=event.datetime)
+    for timestamp, requests in six.iteritems(frequencies):
+        tsdb.record_frequency_multi(list(requests.items()), timestamp=timestamp)
 
 
 @metrics.wraps("save_event.nodestore_save_many")
 def _nodestore_save_many(jobs):
+    # Write the events to Nodestore
+    values = {}
     for job in jobs:
-        # Write the event to Nodestore
-        job["event"].data.save()
+        node_data = job["event"].data
+        data = node_data.get_data_to_save()
+        if data is not None:
+            values[node_data.id] = data
+
+    if values:
+        nodestore.set_multi(values)
 
 
 @metrics.wraps("save_event.eventstream_insert_many")
 def _eventstream_insert_many(jobs):
-    for job in jobs:
-        eventstream.insert(
-            group=job["group"],
-            event=job["event"],
-            is_new=job["is_new"],
-            is_regression=job["is_regression"],
-            is_new_group_environment=job["is_new_group_environment"],
-            primary_hash=job["data"]["hashes"][0] if "hashes" in job["data"] else "",
-            received_timestamp=job["received_timestamp"],
+    inserts = [
+        {
+            "group": job["group"],
+            "event": job["event"],
+            "is_new": job["is_new"],
+            "is_regression": job["is_regression"],
+            "is_new_group_environment": job["is_new_group_environment"],
+            "primary_hash": job["data"]["hashes"][0] if "hashes" in job["data"] else "",
+            "received_timestamp": job["received_timestamp"],
             # We are choosing to skip consuming the event back
             # in the eventstream if it's flagged as raw.
             # This means that we want to publish the event
             # through the event stream, but we don't care
             # about post processing and handling the commit.
-            skip_consume=job.get("raw", False),
-        )
+            "skip_consume": job.get("raw", False),
+        }
+        for job in jobs
+    ]
+
+    if len(inserts) == 1:
+        eventstream.insert(**inserts[0])
+    else:
+        eventstream.insert_many(inserts)
 
 
 @metrics.wraps("save_event.track_outcome_accepted_many")
@@ -1288,9 +1321,7 @@ def save_attachment(
     else:
         timestamp = datetime.utcnow().replace(tzinfo=UTC)
 
-    try:
-        data = attachment.data
-    except MissingAttachmentChunks:
+    def track_missing_chunks():
         track_outcome(
             org_id=project.organization_id,
             project_id=project.id,
@@ -1303,6 +1334,11 @@ def save_attachment(
         )
 
         logger.exception("Missing chunks for cache_key=%s", cache_key)
+
+    try:
+        fileobj = attachment.getfile()
+    except MissingAttachmentChunks:
+        track_missing_chunks()
         return
 
     file = File.objects.create(
@@ -1310,7 +1346,14 @@ def save_attachment(
         type=attachment.type,
         headers={"Content-Type": attachment.content_type},
     )
-    file.putfile(six.BytesIO(data), blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
+
+    try:
+        file.putfile(fileobj, blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
+    except MissingAttachmentChunks:
+        # Chunks after the first batch expired while streaming them.
+        file.delete()
+        track_missing_chunks()
+        return
 
     EventAttachment.objects.create(
         event_id=event_id,
@@ -1384,6 +1427,8 @@ def _materialize_event_metrics(jobs):
 
 @metrics.wraps("event_manager.save_transaction_events")
 def save_transaction_events(jobs, projects):
+    metrics.timing("event_manager.save_transactions.jobs", len(jobs))
+
     with metrics.timer("event_manager.save_transactions.collect_organization_ids"):
         organization_ids = set(project.organization_id for project in six.itervalues(projects))
 
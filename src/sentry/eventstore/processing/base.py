@@ -38,8 +38,7 @@ class BaseEventProcessingStore(object):
         return self.inner.get(key)
 
     def delete_by_key(self, key):
-        self.inner.delete(key)
-        self.inner.delete(_get_unprocessed_key(key))
+        self.inner.delete_many([key, _get_unprocessed_key(key)])
 
     def delete(self, event):
         key = cache_key_for_event(event)
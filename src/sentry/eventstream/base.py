@@ -20,6 +20,7 @@ class ForwarderNotRequired(NotImplementedError):
 class EventStream(Service):
     __all__ = (
         "insert",
+        "insert_many",
         "start_delete_groups",
         "end_delete_groups",
         "start_merge",
@@ -71,6 +72,14 @@ class EventStream(Service):
             event, is_new, is_regression, is_new_group_environment, primary_hash, skip_consume
         )
 
+    def insert_many(self, inserts):
+        """
+        Inserts several events at once.  Every item of ``inserts`` is a
+        dictionary of the keyword arguments of ``insert``.
+        """
+        for kwargs in inserts:
+            self.insert(**kwargs)
+
     def start_delete_groups(self, project_id, group_ids):
         pass
 
@@ -36,9 +36,6 @@ class KafkaEventStream(SnubaProtocolEventStream):
         asynchronous=True,
         headers=None,  # Optional[Mapping[str, str]]
     ):
-        if headers is None:
-            headers = {}
-
         # Polling the producer is required to ensure callbacks are fired. This
         # means that the latency between a message being delivered (or failing
         # to be delivered) and the corresponding callback being fired is
@@ -51,6 +48,26 @@ class KafkaEventStream(SnubaProtocolEventStream):
         # asynchronous produce() calls from the same process.
         self.producer.poll(0.0)
 
+        if not self._produce(project_id, _type, extra_data, headers):
+            return
+
+        if not asynchronous:
+            # flush() is a convenience method that calls poll() until len() is zero
+            self.producer.flush()
+
+    def _send_many(self, _type, messages):
+        # Callbacks of earlier produce() calls only need to be served once
+        # for the whole batch, see ``_send``.
+        self.producer.poll(0.0)
+
+        for project_id, extra_data, headers in messages:
+            self._produce(project_id, _type, extra_data, headers)
+
+    def _produce(self, project_id, _type, extra_data, headers):
+        """
+        Produces a single message without polling the producer.  Returns
+        whether the message could be handed to the producer.
+        """
         assert isinstance(extra_data, tuple)
         key = six.text_type(project_id)
 
@@ -60,15 +77,12 @@ class KafkaEventStream(SnubaProtocolEventStream):
                 key=key.encode("utf-8"),
                 value=json.dumps((self.EVENT_PROTOCOL_VERSION, _type) + extra_data),
                 on_delivery=self.delivery_callback,
-                headers=[(k, v.encode("utf-8")) for k, v in headers.items()],
+                headers=[(k, v.encode("utf-8")) for k, v in (headers or {}).items()],
             )
         except Exception as error:
             logger.error("Could not publish message: %s", error, exc_info=True)
-            return
-
-        if not asynchronous:
-            # flush() is a convenience method that calls poll() until len() is zero
-            self.producer.flush()
+            return False
+        return True
 
     def requires_post_process_forwarder(self):
         return True
@@ -87,6 +87,32 @@ class SnubaProtocolEventStream(EventStream):
         primary_hash,
         received_timestamp,  # type: float
         skip_consume=False,
+    ):
+        project_id, extra_data, headers = self._get_insert_message(
+            group,
+            event,
+            is_new,
+            is_regression,
+            is_new_group_environment,
+            primary_hash,
+            received_timestamp,
+            skip_consume,
+        )
+        self._send(project_id, "insert", extra_data=extra_data, headers=headers)
+
+    def insert_many(self, inserts):
+        self._send_many("insert", [self._get_insert_message(**kwargs) for kwargs in inserts])
+
+    def _get_insert_message(
+        self,
+        group,
+        event,
+        is_new,
+        is_regression,
+        is_new_group_environment,
+        primary_hash,
+        received_timestamp,  # type: float
+        skip_consume=False,
     ):
         project = event.project
         set_current_project(project.id)
@@ -104,10 +130,9 @@ class SnubaProtocolEventStream(EventStream):
         if unexpected_tags:
             logger.error("%r received unexpected tags: %r", self, unexpected_tags)
 
-        self._send(
+        return (
             project.id,
-            "insert",
-            extra_data=(
+            (
                 {
                     "group_id": event.group_id,
                     "event_id": event.event_id,
@@ -129,7 +154,7 @@ class SnubaProtocolEventStream(EventStream):
                     "skip_consume": skip_consume,
                 },
             ),
-            headers={"Received-Timestamp": six.text_type(received_timestamp)},
+            {"Received-Timestamp": six.text_type(received_timestamp)},
         )
 
     def start_delete_groups(self, project_id, group_ids):
@@ -227,6 +252,14 @@ class SnubaProtocolEventStream(EventStream):
     ):
         raise NotImplementedError
 
+    def _send_many(self, _type, messages):
+        """
+        Sends several asynchronous messages of the same type, given as
+        ``(project_id, extra_data, headers)`` tuples.
+        """
+        for project_id, extra_data, headers in messages:
+            self._send(project_id, _type, extra_data=extra_data, headers=headers)
+
 
 class SnubaEventStream(SnubaProtocolEventStream):
     def _send(
@@ -290,3 +323,15 @@ class SnubaEventStream(SnubaProtocolEventStream):
         self._dispatch_post_process_group_task(
             event, is_new, is_regression, is_new_group_environment, primary_hash, skip_consume
         )
+
+    def insert_many(self, inserts):
+        super(SnubaEventStream, self).insert_many(inserts)
+        for kwargs in inserts:
+            self._dispatch_post_process_group_task(
+                kwargs["event"],
+                kwargs["is_new"],
+                kwargs["is_regression"],
+                kwargs["is_new_group_environment"],
+                kwargs["primary_hash"],
+                kwargs.get("skip_consume", False),
+            )
@@ -16,7 +16,7 @@ from sentry.stacktraces.functions import set_in_app
 from sentry.stacktraces.platform import get_behavior_family_for_platform
 from sentry.grouping.component import GroupingComponent
 from sentry.grouping.utils import get_rule_bool
-from sentry.utils.compat import implements_to_string
+from sentry.utils.compat import functools, implements_to_string
 from sentry.utils.glob import glob_match
 from sentry.utils.safe import get_path
 from sentry.utils.compat import zip
@@ -111,10 +111,41 @@ MATCHERS = {
 }
 
 
+# Matchers on these keys are case sensitive and not normalized, so a glob
+# that is a literal or a literal followed by `*` can only match values that
+# start with that literal.  This is used to pre-bucket rules.
+INDEXABLE_MATCH_KEYS = ("function", "module")
+GLOB_SPECIAL_CHARS = frozenset("*?[]{}!\\")
+
+# Number of loaded enhancement configs kept around by `load_enhancements`.
+ENHANCEMENTS_CACHE_SIZE = 100
+
+
 class InvalidEnhancerConfig(Exception):
     pass
 
 
+def _get_frame_value(key, frame_data, platform):
+    if key == "function":
+        from sentry.stacktraces.functions import get_function_name_for_frame
+
+        return get_function_name_for_frame(frame_data, platform) or "<unknown>"
+    elif key == "module":
+        return frame_data.get("module") or "<unknown>"
+    # should not happen :)
+    return "<unknown>"
+
+
+def _get_indexable_prefix(pattern):
+    """Returns `(prefix, is_literal)` for globs that can only match values
+    starting with `prefix`, or `None` if the glob cannot be indexed.
+    """
+    prefix = pattern.rstrip("*")
+    if any(c in GLOB_SPECIAL_CHARS for c in prefix):
+        return None
+    return prefix, prefix == pattern
+
+
 class Match(object):
     def __init__(self, key, pattern, negated=False):
         try:
@@ -168,16 +199,7 @@ class Match(object):
             return ref_val is not None and ref_val == frame_data.get("in_app")
 
         # all other matches are case sensitive
-        if self.key == "function":
-            from sentry.stacktraces.functions import get_function_name_for_frame
-
-            value = get_function_name_for_frame(frame_data, platform) or "<unknown>"
-        elif self.key == "module":
-            value = frame_data.get("module") or "<unknown>"
-        else:
-            # should not happen :)
-            value = "<unknown>"
-        return glob_match(value, self.pattern)
+        return glob_match(_get_frame_value(self.key, frame_data, platform), self.pattern)
 
     def _to_config_structure(self):
         if self.key == "family":
@@ -330,7 +352,103 @@ class StacktraceState(object):
         return "%s by stack trace rule (%s)" % (hint, description)
 
 
+class EnhancementsIndex(object):
+    """A compiled form of the rules of an `Enhancements` object.
+
+    Rules with a positive, non-wildcard `function` or `module` matcher are
+    bucketed by that matcher so they are only tried on frames that can match
+    them.  Matcher results that do not depend on `in_app` are memoized per
+    frame, so identical matchers shared by many rules are evaluated once.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.unindexed = set()
+        self.literals = dict((key, {}) for key in INDEXABLE_MATCH_KEYS)
+        self.prefixes = dict((key, {}) for key in INDEXABLE_MATCH_KEYS)
+
+        for rule_idx, rule in enumerate(self.rules):
+            # Rules without matchers never match anything
+            if not rule.matchers:
+                continue
+            for matcher in rule.matchers:
+                if matcher.negated or matcher.key not in INDEXABLE_MATCH_KEYS:
+                    continue
+                rv = _get_indexable_prefix(matcher.pattern)
+                if rv is None:
+                    continue
+                prefix, is_literal = rv
+                if is_literal:
+                    self.literals[matcher.key].setdefault(prefix, []).append(rule_idx)
+                elif prefix:
+                    self.prefixes[matcher.key].setdefault(len(prefix), {}).setdefault(
+                        prefix, []
+                    ).append(rule_idx)
+                else:
+                    continue
+                break
+            else:
+                self.unindexed.add(rule_idx)
+
+        self.indexed_keys = [
+            key for key in INDEXABLE_MATCH_KEYS if self.literals[key] or self.prefixes[key]
+        ]
+
+    def _get_candidates(self, frames, platform):
+        candidates = {}
+        for frame_idx, frame in enumerate(frames):
+            rule_idxs = set()
+            for key in self.indexed_keys:
+                value = _get_frame_value(key, frame, platform)
+                rule_idxs.update(self.literals[key].get(value, ()))
+                for length, bucket in six.iteritems(self.prefixes[key]):
+                    rule_idxs.update(bucket.get(value[:length], ()))
+            for rule_idx in rule_idxs:
+                candidates.setdefault(rule_idx, []).append(frame_idx)
+        return candidates
+
+    def _matches_frame(self, rule, frame_idx, frame_data, platform, match_cache):
+        for matcher in rule.matchers:
+            # `in_app` may be changed by previous rules and cannot be cached
+            if matcher.key == "app":
+                rv = matcher.matches_frame(frame_data, platform)
+            else:
+                cache_key = (matcher.key, matcher.pattern, frame_idx)
+                rv = match_cache.get(cache_key)
+                if rv is None:
+                    rv = match_cache[cache_key] = matcher._positive_frame_match(
+                        frame_data, platform
+                    )
+                if matcher.negated:
+                    rv = not rv
+            if not rv:
+                return False
+        return True
+
+    def iter_matching_frame_actions(self, frames, platform):
+        """Yields `(rule, idx, actions)` for every frame matching a rule, in
+        the same order as looping over all rules and then all frames.  Frames
+        are evaluated lazily so actions applied to earlier matches are
+        visible to later rules.
+        """
+        candidates = self._get_candidates(frames, platform)
+        all_frames = range(len(frames))
+        match_cache = {}
+        for rule_idx in sorted(self.unindexed.union(candidates)):
+            rule = self.rules[rule_idx]
+            if rule_idx in self.unindexed:
+                frame_idxs = all_frames
+            else:
+                frame_idxs = candidates[rule_idx]
+            for frame_idx in frame_idxs:
+                if self._matches_frame(rule, frame_idx, frames[frame_idx], platform, match_cache):
+                    yield rule, frame_idx, rule.actions
+
+
 class Enhancements(object):
+    # Lazily built `EnhancementsIndex`, see `get_index`
+    _index = None
+
     def __init__(self, rules, changelog=None, version=None, bases=None, id=None):
         self.id = id
         self.rules = rules
@@ -346,22 +464,19 @@ class Enhancements(object):
         """This applies the frame modifications to the frames itself.  This
         does not affect grouping.
         """
-        for rule in self.iter_rules():
-            for idx, frame in enumerate(frames):
-                actions = rule.get_matching_frame_actions(frame, platform)
-                for action in actions or ():
-                    action.apply_modifications_to_frame(frames, idx)
+        for rule, idx, actions in self.get_index().iter_matching_frame_actions(frames, platform):
+            for action in actions:
+                action.apply_modifications_to_frame(frames, idx)
 
     def update_frame_components_contributions(self, components, frames, platform):
         stacktrace_state = StacktraceState()
 
         # Apply direct frame actions and update the stack state alongside
-        for rule in self.iter_rules():
-            for idx, (component, frame) in enumerate(zip(components, frames)):
-                actions = rule.get_matching_frame_actions(frame, platform)
-                for action in actions or ():
-                    action.update_frame_components_contributions(components, frames, idx, rule=rule)
-                    action.modify_stacktrace_state(stacktrace_state, rule)
+        matches = self.get_index().iter_matching_frame_actions(frames[: len(components)], platform)
+        for rule, idx, actions in matches:
+            for action in actions:
+                action.update_frame_components_contributions(components, frames, idx, rule=rule)
+                action.modify_stacktrace_state(stacktrace_state, rule)
 
         # Use the stack state to update frame contributions again to trim
         # down to max-frames.  min-frames is handled on the other hand for
@@ -434,6 +549,12 @@ class Enhancements(object):
             .strip(u"=")
         )
 
+    def get_index(self):
+        """Returns the compiled rule index for this config."""
+        if self._index is None:
+            self._index = EnhancementsIndex(self.iter_rules())
+        return self._index
+
     def iter_rules(self):
         for base in self.bases:
             base = ENHANCEMENT_BASES.get(base)
@@ -478,6 +599,14 @@ class Enhancements(object):
         return EnhancmentsVisitor(bases, id).visit(tree)
 
 
+@functools.lru_cache(maxsize=ENHANCEMENTS_CACHE_SIZE)
+def load_enhancements(data):
+    """Like `Enhancements.loads` but returns a shared instance per config so
+    that the compiled rule index is reused across events.
+    """
+    return Enhancements.loads(data)
+
+
 class Rule(object):
     def __init__(self, matchers, actions):
         self.matchers = matchers
@@ -5,7 +5,7 @@ import inspect
 
 from sentry import projectoptions
 from sentry.grouping.component import GroupingComponent
-from sentry.grouping.enhancer import Enhancements
+from sentry.grouping.enhancer import Enhancements, load_enhancements
 
 
 STRATEGIES = {}
@@ -180,7 +180,7 @@ class StrategyConfiguration(object):
         if enhancements is None:
             enhancements = Enhancements([])
         else:
-            enhancements = Enhancements.loads(enhancements)
+            enhancements = load_enhancements(enhancements)
         self.enhancements = enhancements
 
     def __repr__(self):
@@ -4,6 +4,10 @@ import random
 import functools
 import logging
 import msgpack
+import six
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.core.cache import cache
@@ -34,6 +38,15 @@ CACHE_TIMEOUT = 3600
 
 
 class IngestConsumerWorker(AbstractBatchWorker):
+    def __init__(self, concurrency=None):
+        # When `concurrency` is set, batches are flushed on a bounded thread
+        # pool. Messages are partitioned by event so that attachment chunks
+        # are still processed before the attachment and event they belong to.
+        self.concurrency = concurrency
+        self.executor = None
+        if concurrency and concurrency > 1:
+            self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
     def process_message(self, message):
         message = msgpack.unpackb(message.value(), use_list=False)
         return message
@@ -41,9 +54,11 @@ class IngestConsumerWorker(AbstractBatchWorker):
     def flush_batch(self, batch):
         mark_scope_as_unsafe()
         with metrics.timer("ingest_consumer.flush_batch"):
+            if self.executor is not None:
+                return self._flush_batch_concurrent(batch)
             return self._flush_batch(batch)
 
-    def _flush_batch(self, batch):
+    def _prepare_messages(self, batch):
         attachment_chunks = []
         other_messages = []
 
@@ -57,7 +72,7 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 if message_type == "event":
                     other_messages.append((process_event, message))
                 elif message_type == "attachment_chunk":
-                    attachment_chunks.append(message)
+                    attachment_chunks.append((process_attachment_chunk, message))
                 elif message_type == "attachment":
                     other_messages.append((process_individual_attachment, message))
                 elif message_type == "user_report":
@@ -71,19 +86,56 @@ class IngestConsumerWorker(AbstractBatchWorker):
         with metrics.timer("ingest_consumer.fetch_projects"):
             projects = {p.id: p for p in Project.objects.get_many_from_cache(projects_to_fetch)}
 
+        return attachment_chunks, other_messages, projects
+
+    def _flush_batch(self, batch):
+        attachment_chunks, other_messages, projects = self._prepare_messages(batch)
+
         if attachment_chunks:
             # attachment_chunk messages need to be processed before attachment/event messages.
             with metrics.timer("ingest_consumer.process_attachment_chunk_batch"):
-                for attachment_chunk in attachment_chunks:
-                    process_attachment_chunk(attachment_chunk, projects=projects)
+                for processing_func, attachment_chunk in attachment_chunks:
+                    processing_func(attachment_chunk, projects=projects)
 
         if other_messages:
             with metrics.timer("ingest_consumer.process_other_messages_batch"):
                 for processing_func, message in other_messages:
                     processing_func(message, projects=projects)
 
+    def _flush_batch_concurrent(self, batch):
+        attachment_chunks, other_messages, projects = self._prepare_messages(batch)
+
+        # Messages of the same event are processed in order on one thread,
+        # attachment chunks first. Distinct events are processed in parallel.
+        with metrics.timer("ingest_consumer.partition_messages"):
+            partitions = OrderedDict()
+            for processing_func, message in attachment_chunks + other_messages:
+                key = (message["project_id"], message.get("event_id"))
+                partitions.setdefault(key, []).append((processing_func, message))
+
+        metrics.timing("ingest_consumer.flush.partitions", len(partitions))
+
+        with metrics.timer("ingest_consumer.process_partitions_batch"):
+            futures = [
+                self.executor.submit(_process_partition, messages, projects)
+                for messages in six.itervalues(partitions)
+            ]
+
+            # Wait for the entire batch and re-raise the first error, so that
+            # offsets are only committed once every message has been handled.
+            for future in futures:
+                future.result()
+
     def shutdown(self):
-        pass
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def _process_partition(messages, projects):
+    mark_scope_as_unsafe()
+    with metrics.timer("ingest_consumer.process_partition"):
+        for processing_func, message in messages:
+            processing_func(message, projects=projects)
 
 
 def trace_func(**span_kwargs):
@@ -268,15 +320,20 @@ def process_userreport(message, projects):
         return False
 
 
-def get_ingest_consumer(consumer_types, once=False, **options):
+def get_ingest_consumer(consumer_types, once=False, flush_concurrency=None, **options):
     """
     Handles events coming via a kafka queue.
 
     The events should have already been processed (normalized... ) upstream (by Relay).
+
+    If `flush_concurrency` is larger than one, batches are flushed on a thread
+    pool of that size.
     """
     topic_names = set(
         ConsumerType.get_topic_name(consumer_type) for consumer_type in consumer_types
     )
     return create_batching_kafka_consumer(
-        topic_names=topic_names, worker=IngestConsumerWorker(), **options
+        topic_names=topic_names,
+        worker=IngestConsumerWorker(concurrency=flush_concurrency),
+        **options
     )
@@ -1,10 +1,15 @@
 from __future__ import absolute_import, print_function
 
+import threading
+
+from collections import OrderedDict
+from django.conf import settings
 from six import text_type
 from symbolic import SourceView
+from sentry.utils import metrics
 from sentry.utils.strings import codec_lookup
 
-__all__ = ["SourceCache", "SourceMapCache"]
+__all__ = ["SourceCache", "SourceMapCache", "ParsedArtifactCache"]
 
 
 def is_utf8(codec):
@@ -12,6 +17,22 @@ def is_utf8(codec):
     return name in ("utf-8", "ascii")
 
 
+def make_source_view(source, encoding=None):
+    if isinstance(source, SourceView):
+        return source
+    if isinstance(source, text_type):
+        source = source.encode("utf-8")
+    # If an encoding is provided and it's not utf-8 compatible
+    # we try to re-encoding the source and create a source view
+    # from it.
+    elif encoding is not None and not is_utf8(encoding):
+        try:
+            source = source.decode(encoding).encode("utf-8")
+        except UnicodeError:
+            pass
+    return SourceView.from_bytes(source)
+
+
 class SourceCache(object):
     def __init__(self):
         self._cache = {}
@@ -40,20 +61,7 @@ class SourceCache(object):
 
     def add(self, url, source, encoding=None):
         url = self._get_canonical_url(url)
-
-        if not isinstance(source, SourceView):
-            if isinstance(source, text_type):
-                source = source.encode("utf-8")
-            # If an encoding is provided and it's not utf-8 compatible
-            # we try to re-encoding the source and create a source view
-            # from it.
-            elif encoding is not None and not is_utf8(encoding):
-                try:
-                    source = source.decode(encoding).encode("utf-8")
-                except UnicodeError:
-                    pass
-            source = SourceView.from_bytes(source)
-        self._cache[url] = source
+        self._cache[url] = make_source_view(source, encoding)
 
     def add_error(self, url, error):
         url = self._get_canonical_url(url)
@@ -92,3 +100,77 @@ class SourceMapCache(object):
             sourcemap = self.get(sourcemap_url)
             return (sourcemap_url, sourcemap)
         return (None, None)
+
+
+class ParsedArtifactCache(object):
+    """
+    A process wide LRU of parsed release artifacts (source views and source
+    map views), shared across events.
+
+    Keys must identify the contents of an artifact, e.g. include the checksum
+    of the file.  The cache is bounded by the sum of the sizes passed to
+    `set`, which defaults to the `SENTRY_JS_PARSED_ARTIFACT_CACHE_SIZE`
+    setting.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return settings.SENTRY_JS_PARSED_ARTIFACT_CACHE_SIZE
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, size = self._items.pop(key)
+            except KeyError:
+                rv = None
+            else:
+                self._items[key] = (value, size)
+                rv = value
+
+        metrics.incr("sourcemaps.parsed_cache.%s" % ("miss" if rv is None else "hit"))
+        return rv
+
+    def set(self, key, value, size):
+        max_size = self.max_size
+        if size > max_size:
+            return
+
+        evicted = 0
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > max_size:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self._size -= old_size
+                evicted += 1
+            total_size = self._size
+
+        if evicted:
+            metrics.incr("sourcemaps.parsed_cache.evict", amount=evicted)
+        metrics.timing("sourcemaps.parsed_cache.size", total_size)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
@@ -8,9 +8,13 @@ import logging
 import re
 import sys
 import base64
+import itertools
 import six
+import time
 import zlib
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from django import db
 from django.conf import settings
 from os.path import splitext
 from requests.utils import get_encoding_from_headers
@@ -36,14 +40,14 @@ from sentry.models import EventError, ReleaseFile, Organization
 from sentry.utils.cache import cache
 
 from sentry.utils.files import compress_file
-from sentry.utils.hashlib import md5_text
+from sentry.utils.hashlib import md5_text, sha1_text
 from sentry.utils.http import is_valid_origin
 from sentry.utils.safe import get_path
 from sentry.utils import metrics
 from sentry.utils.urls import non_standard_url_join
 from sentry.stacktraces.processing import StacktraceProcessor
 
-from .cache import SourceCache, SourceMapCache
+from .cache import SourceCache, SourceMapCache, ParsedArtifactCache, make_source_view
 
 # number of surrounding lines (on each side) to fetch
 LINES_OF_CONTEXT = 5
@@ -76,6 +80,16 @@ MAX_RESOURCE_FETCHES = 100
 
 logger = logging.getLogger(__name__)
 
+# holds parsed release artifacts across events, keyed by the return value of
+# `get_release_file_key`
+parsed_artifact_cache = ParsedArtifactCache()
+
+# thread pool used by `populate_source_cache` when fetching concurrently
+_fetch_executor = None
+
+# marks urls missing from the `release_files` passed to `fetch_file`
+_not_prefetched = object()
+
 
 class UnparseableSourcemap(http.BadSource):
     error_type = EventError.JS_INVALID_SOURCEMAP
@@ -217,84 +231,225 @@ def fetch_release_file(filename, release, dist=None):
 
     Caches the result of that attempt (whether successful or not).
     """
+    return fetch_release_files([filename], release, dist)[filename]
 
+
+def get_release_file_cache_key(filename, release, dist=None):
     dist_name = dist and dist.name or None
-    cache_key = "releasefile:v1:%s:%s" % (release.id, ReleaseFile.get_ident(filename, dist_name))
+    return "releasefile:v1:%s:%s" % (release.id, ReleaseFile.get_ident(filename, dist_name))
 
-    logger.debug("Checking cache for release artifact %r (release_id=%s)", filename, release.id)
-    result = cache.get(cache_key)
 
-    # not in the cache (meaning we haven't checked the database recently), so check the database
-    if result is None:
-        filename_choices = ReleaseFile.normalize(filename)
-        filename_idents = [ReleaseFile.get_ident(f, dist_name) for f in filename_choices]
+def fetch_release_files(filenames, release, dist=None):
+    """
+    Attempt to retrieve the release artifacts for all `filenames` from the
+    database.  Returns a dictionary of filename to `UrlResult`, or `None` if
+    the artifact does not exist.
 
-        logger.debug(
-            "Checking database for release artifact %r (release_id=%s)", filename, release.id
-        )
+    All files are looked up in the cache at once, and all cache misses are
+    resolved with a single query.  Caches the result of each attempt (whether
+    successful or not).
+    """
+    rv = lookup_release_files(filenames, release, dist)
+    for filename, result in six.iteritems(rv):
+        if isinstance(result, ReleaseFile):
+            rv[filename] = read_release_file(filename, result, release, dist)
+    return rv
 
-        possible_files = list(
-            ReleaseFile.objects.filter(
-                release=release, dist=dist, ident__in=filename_idents
-            ).select_related("file")
-        )
 
-        if len(possible_files) == 0:
-            logger.debug(
-                "Release artifact %r not found in database (release_id=%s)", filename, release.id
-            )
-            cache.set(cache_key, -1, 60)
-            return None
+def lookup_release_files(filenames, release, dist=None):
+    """
+    Like `fetch_release_files`, but does not read the artifacts that are not
+    in the cache yet.  Their `ReleaseFile` is returned instead, to be read
+    with `read_release_file`.
+    """
+
+    cache_keys = dict(
+        (filename, get_release_file_cache_key(filename, release, dist)) for filename in filenames
+    )
+
+    logger.debug(
+        "Checking cache for %d release artifacts (release_id=%s)", len(cache_keys), release.id
+    )
+    cached = cache.get_many(list(cache_keys.values()))
+
+    rv = {}
+    missing = []
+    for filename, cache_key in six.iteritems(cache_keys):
+        result = cached.get(cache_key)
 
-        elif len(possible_files) == 1:
-            releasefile = possible_files[0]
+        # not in the cache (meaning we haven't checked the database recently)
+        if result is None:
+            missing.append(filename)
 
+        # in the cache as an unsuccessful attempt
+        elif result == -1:
+            rv[filename] = None
+
+        # in the cache as a successful attempt, including the zipped contents of the file
         else:
-            # Pick first one that matches in priority order.
-            # This is O(N*M) but there are only ever at most 4 things here
-            # so not really worth optimizing.
-            releasefile = next(
-                (rf for ident in filename_idents for rf in possible_files if rf.ident == ident)
+            # Previous caches would be a 3-tuple instead of a 4-tuple,
+            # so this is being maintained for backwards compatibility
+            try:
+                encoding = result[3]
+            except IndexError:
+                encoding = None
+            rv[filename] = http.UrlResult(
+                filename, result[0], zlib.decompress(result[1]), result[2], encoding
+            )
+
+    if not missing:
+        return rv
+
+    releasefiles = get_release_files(missing, release, dist)
+    not_found = {}
+    for filename in missing:
+        releasefile = releasefiles.get(filename)
+        if releasefile is None:
+            logger.debug(
+                "Release artifact %r not found in database (release_id=%s)", filename, release.id
             )
+            not_found[cache_keys[filename]] = -1
+            rv[filename] = None
+            continue
 
         logger.debug(
             "Found release artifact %r (id=%s, release_id=%s)", filename, releasefile.id, release.id
         )
-        try:
-            with metrics.timer("sourcemaps.release_file_read"):
-                with ReleaseFile.cache.getfile(releasefile) as fp:
-                    z_body, body = compress_file(fp)
-        except Exception:
-            logger.error("sourcemap.compress_read_failed", exc_info=sys.exc_info())
-            result = None
-        else:
-            headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
-            encoding = get_encoding_from_headers(headers)
-            result = http.UrlResult(filename, headers, body, 200, encoding)
-            # This will implicitly skip too large payloads. Those will be cached
-            # on the file system by `ReleaseFile.cache`, instead.
-            cache.set(cache_key, (headers, z_body, 200, encoding), 3600)
-
-    # in the cache as an unsuccessful attempt
-    elif result == -1:
-        result = None
+        rv[filename] = releasefile
 
-    # in the cache as a successful attempt, including the zipped contents of the file
-    else:
-        # Previous caches would be a 3-tuple instead of a 4-tuple,
-        # so this is being maintained for backwards compatibility
-        try:
-            encoding = result[3]
-        except IndexError:
-            encoding = None
-        result = http.UrlResult(
-            filename, result[0], zlib.decompress(result[1]), result[2], encoding
+    if not_found:
+        cache.set_many(not_found, 60)
+
+    return rv
+
+
+def read_release_file(filename, releasefile, release, dist=None):
+    """
+    Read the body of a `ReleaseFile` found by `lookup_release_files` and
+    cache it.  Returns a `UrlResult`, or `None` if the file cannot be read.
+    """
+    try:
+        with metrics.timer("sourcemaps.release_file_read"):
+            with ReleaseFile.cache.getfile(releasefile) as fp:
+                z_body, body = compress_file(fp)
+    except Exception:
+        logger.error("sourcemap.compress_read_failed", exc_info=sys.exc_info())
+        return None
+
+    headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
+    encoding = get_encoding_from_headers(headers)
+    # This will implicitly skip too large payloads. Those will be cached
+    # on the file system by `ReleaseFile.cache`, instead.
+    cache.set(
+        get_release_file_cache_key(filename, release, dist), (headers, z_body, 200, encoding), 3600,
+    )
+    return http.UrlResult(filename, headers, body, 200, encoding)
+
+
+def get_release_files(filenames, release, dist=None):
+    """
+    Look up the `ReleaseFile` of every filename with a single query.  Returns
+    a dictionary of filename to `ReleaseFile` for all filenames that have one.
+    """
+
+    dist_name = dist and dist.name or None
+    filename_idents = dict(
+        (filename, [ReleaseFile.get_ident(f, dist_name) for f in ReleaseFile.normalize(filename)])
+        for filename in filenames
+    )
+
+    logger.debug(
+        "Checking database for %d release artifacts (release_id=%s)", len(filenames), release.id
+    )
+
+    possible_files = dict(
+        (rf.ident, rf)
+        for rf in ReleaseFile.objects.filter(
+            release=release,
+            dist=dist,
+            ident__in=set(itertools.chain.from_iterable(six.itervalues(filename_idents))),
+        ).select_related("file")
+    )
+
+    rv = {}
+    for filename, idents in six.iteritems(filename_idents):
+        # Pick first one that matches in priority order.
+        releasefile = next((possible_files[i] for i in idents if i in possible_files), None)
+        if releasefile is not None:
+            rv[filename] = releasefile
+    return rv
+
+
+def get_release_file_key(filename, release, dist=None):
+    """
+    Return a key identifying the contents of the release artifact that
+    `fetch_release_file` resolves `filename` to, or `None` if there is no
+    such artifact.  The key is `(release_id, dist, ident, checksum)`.
+
+    Caches the result of the lookup (whether successful or not).
+    """
+    return get_release_file_keys([filename], release, dist)[filename]
+
+
+def get_release_file_keys(filenames, release, dist=None):
+    """
+    Bulk version of `get_release_file_key`, returning a dictionary of
+    filename to key.  Uses a single cache lookup and at most one query.
+    """
+
+    dist_name = dist and dist.name or None
+    cache_keys = dict(
+        (
+            filename,
+            "releasefile:checksum:v1:%s:%s"
+            % (release.id, ReleaseFile.get_ident(filename, dist_name)),
         )
+        for filename in filenames
+    )
+    results = cache.get_many(list(cache_keys.values()))
+
+    missing = [
+        filename for filename, cache_key in six.iteritems(cache_keys) if cache_key not in results
+    ]
+    if missing:
+        releasefiles = get_release_files(missing, release, dist)
+        found = {}
+        not_found = {}
+        for filename in missing:
+            releasefile = releasefiles.get(filename)
+            if releasefile is None:
+                not_found[cache_keys[filename]] = -1
+            else:
+                found[cache_keys[filename]] = (releasefile.ident, releasefile.file.checksum)
+        if found:
+            cache.set_many(found, 3600)
+        if not_found:
+            cache.set_many(not_found, 60)
+        results.update(found)
+        results.update(not_found)
+
+    rv = {}
+    for filename, cache_key in six.iteritems(cache_keys):
+        result = results[cache_key]
+        if result == -1 or not result[1]:
+            rv[filename] = None
+        else:
+            ident, checksum = result
+            rv[filename] = (release.id, dist_name, ident, checksum)
+    return rv
 
-    return result
 
+def matches_release_file_key(key, body):
+    """
+    Check that `body` is the content of the release artifact identified by
+    `key`.  `fetch_file` falls back to scraping and the release file cache can
+    be stale, so this guards the parsed artifact cache against storing
+    contents under the wrong key.
+    """
+    return sha1_text(body).hexdigest() == key[3]
 
-def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
+
+def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True, release_files=None):
     """
     Pull down a URL, returning a UrlResult object.
 
@@ -302,6 +457,10 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
     event), then the internet. Caches the result of each of those two attempts
     separately, whether or not those attempts are successful. Used for both
     source files and source maps.
+
+    `release_files` may hold release artifacts prefetched with
+    `lookup_release_files`.  Artifacts are removed from it once used, and
+    artifacts that were not in the cache are read here.
     """
 
     # If our url has been truncated, it'd be impossible to fetch
@@ -311,8 +470,12 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
 
     # if we've got a release to look on, try that first (incl associated cache)
     if release:
-        with metrics.timer("sourcemaps.release_file"):
-            result = fetch_release_file(url, release, dist)
+        result = (release_files or {}).pop(url, _not_prefetched)
+        if result is _not_prefetched:
+            with metrics.timer("sourcemaps.release_file"):
+                result = fetch_release_file(url, release, dist)
+        elif isinstance(result, ReleaseFile):
+            result = read_release_file(url, result, release, dist)
     else:
         result = None
 
@@ -419,6 +582,15 @@ def get_max_age(headers):
 
 
 def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=True):
+    body = fetch_sourcemap_body(
+        url, project=project, release=release, dist=dist, allow_scraping=allow_scraping
+    )
+    return parse_sourcemap(url, body)
+
+
+def fetch_sourcemap_body(
+    url, project=None, release=None, dist=None, allow_scraping=True, release_files=None
+):
     if is_data_uri(url):
         try:
             body = base64.b64decode(
@@ -430,9 +602,18 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
     else:
         # look in the database and, if not found, optionally try to scrape the web
         result = fetch_file(
-            url, project=project, release=release, dist=dist, allow_scraping=allow_scraping
+            url,
+            project=project,
+            release=release,
+            dist=dist,
+            allow_scraping=allow_scraping,
+            release_files=release_files,
         )
         body = result.body
+    return body
+
+
+def parse_sourcemap(url, body):
     try:
         return SourceMapView.from_json_bytes(body)
     except Exception as exc:
@@ -441,6 +622,45 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
         raise UnparseableSourcemap({"url": http.expose_url(url)})
 
 
+def _fetch_in_worker(func, url):
+    # Worker threads hold their own database connections.
+    db.close_old_connections()
+    return func(url)
+
+
+def fetch_concurrently(func, urls, deadline):
+    """
+    Call `func` for every url on the fetch thread pool and yield `(url,
+    result, error)` in the order of `urls`.  `error` is the data of a
+    `BadSource` raised by `func` or a timeout error if the call did not
+    complete before `deadline`.
+    """
+    global _fetch_executor
+    if _fetch_executor is None:
+        _fetch_executor = ThreadPoolExecutor(max_workers=settings.SENTRY_SOURCE_FETCH_CONCURRENCY)
+
+    futures = [_fetch_executor.submit(_fetch_in_worker, func, url) for url in urls]
+    done, not_done = wait(futures, timeout=max(deadline - time.time(), 0))
+    if not_done:
+        metrics.incr("sourcemaps.fetch_timeout", amount=len(not_done), skip_internal=True)
+
+    for url, future in zip(urls, futures):
+        if future in not_done:
+            future.cancel()
+            error = {
+                "type": EventError.FETCH_TIMEOUT,
+                "url": http.expose_url(url),
+                "timeout": settings.SENTRY_SOURCE_FETCH_EVENT_TIMEOUT,
+            }
+            yield url, None, error
+            continue
+
+        try:
+            yield url, future.result(), None
+        except http.BadSource as exc:
+            yield url, None, exc.data
+
+
 def is_data_uri(url):
     return url[:BASE64_PREAMBLE_LENGTH] == BASE64_SOURCEMAP_PREAMBLE
 
@@ -517,6 +737,11 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         self.release = None
         self.dist = None
 
+        # release artifacts and their keys in the parsed artifact cache, as
+        # prefetched by `prefetch_release_files`
+        self.release_files = {}
+        self.release_file_keys = {}
+
     def get_stacktraces(self, data):
         exceptions = get_path(data, "exception", "values", filter=True, default=())
         stacktraces = [e["stacktrace"] for e in exceptions if e.get("stacktrace")]
@@ -795,6 +1020,49 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             return True
         return False
 
+    def get_release_file_key(self, filename):
+        """
+        Return the key of the release artifact for `filename` in the parsed
+        artifact cache, or `None` if it cannot be cached.
+        """
+        if self.release is None or not parsed_artifact_cache.enabled:
+            return None
+        # truncated urls are never fetched, see `fetch_file`
+        if filename[-3:] == "...":
+            return None
+        if filename in self.release_file_keys:
+            return self.release_file_keys[filename]
+        return get_release_file_key(filename, self.release, self.dist)
+
+    def prefetch_release_files(self, filenames):
+        """
+        Resolve the release artifacts of all `filenames` in bulk, so that
+        fetching them does not need a cache and database lookup per file.
+        Only the `ReleaseFile` rows are loaded here; their bodies are read
+        when the files are fetched, concurrently if enabled.  Artifacts that
+        are already in the parsed artifact cache are skipped.
+        """
+        if self.release is None:
+            return
+
+        # truncated urls are never fetched, see `fetch_file`
+        filenames = [filename for filename in filenames if filename[-3:] != "..."]
+
+        with metrics.timer("sourcemaps.prefetch_release_files"):
+            if parsed_artifact_cache.enabled:
+                self.release_file_keys.update(
+                    get_release_file_keys(filenames, self.release, self.dist)
+                )
+                filenames = [
+                    filename
+                    for filename in filenames
+                    if self.release_file_keys[filename] is None
+                    or ("source",) + self.release_file_keys[filename] not in parsed_artifact_cache
+                ]
+
+            if filenames:
+                self.release_files.update(lookup_release_files(filenames, self.release, self.dist))
+
     def get_sourceview(self, filename):
         if filename not in self.cache:
             self.cache_source(filename)
@@ -806,60 +1074,25 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         map (if any).
         """
 
-        sourcemaps = self.sourcemaps
-        cache = self.cache
-
-        self.fetch_count += 1
-
-        if self.fetch_count > self.max_fetches:
-            cache.add_error(filename, {"type": EventError.JS_TOO_MANY_REMOTE_SOURCES})
+        if not self.count_fetch(filename):
             return
 
         # TODO: respect cache-control/max-age headers to some extent
         logger.debug("Attempting to cache source %r", filename)
         try:
             # this both looks in the database and tries to scrape the internet
-            result = fetch_file(
-                filename,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping,
-            )
+            source = self.fetch_source(filename)
         except http.BadSource as exc:
-            # most people don't upload release artifacts for their third-party libraries,
-            # so ignore missing node_modules files
-            if exc.data["type"] == EventError.JS_MISSING_SOURCE and "node_modules" in filename:
-                pass
-            else:
-                cache.add_error(filename, exc.data)
-
-            # either way, there's no more for us to do here, since we don't have
-            # a valid file to cache
-            return
-        cache.add(filename, result.body, result.encoding)
-        cache.alias(result.url, filename)
-
-        sourcemap_url = discover_sourcemap(result)
-        if not sourcemap_url:
+            self.add_source_error(filename, exc.data)
             return
 
-        logger.debug(
-            "Found sourcemap URL %r for minified script %r", sourcemap_url[:256], result.url
-        )
-        sourcemaps.link(filename, sourcemap_url)
-        if sourcemap_url in sourcemaps:
+        sourcemap_url = self.add_source(filename, source)
+        if sourcemap_url is None:
             return
 
         # pull down sourcemap
         try:
-            sourcemap_view = fetch_sourcemap(
-                sourcemap_url,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping,
-            )
+            sourcemap_view = self.fetch_sourcemap_view(sourcemap_url)
         except http.BadSource as exc:
             # we don't perform the same check here as above, because if someone has
             # uploaded a node_modules file, which has a sourceMappingURL, they
@@ -867,10 +1100,112 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             # working, if that's the case). If they're not looking for it to be
             # mapped, then they shouldn't be uploading the source file in the
             # first place.
-            cache.add_error(filename, exc.data)
+            self.cache.add_error(filename, exc.data)
+            return
+
+        self.add_sourcemap(sourcemap_url, sourcemap_view)
+
+    def count_fetch(self, filename):
+        """
+        Count a fetch of `filename` against `max_fetches`.  Returns `False`
+        and records an error if the limit is exceeded.
+        """
+        self.fetch_count += 1
+
+        if self.fetch_count > self.max_fetches:
+            self.cache.add_error(filename, {"type": EventError.JS_TOO_MANY_REMOTE_SOURCES})
+            return False
+        return True
+
+    def fetch_source(self, filename):
+        """
+        Fetch a source file and return `(source_view, url, sourcemap_url)`.
+
+        This does not modify the caches of this processor and can be called
+        from worker threads.
+        """
+        source_key = self.get_release_file_key(filename)
+        if source_key is not None:
+            rv = parsed_artifact_cache.get(("source",) + source_key)
+            if rv is not None:
+                return rv
+
+        result = fetch_file(
+            filename,
+            project=self.project,
+            release=self.release,
+            dist=self.dist,
+            allow_scraping=self.allow_scraping,
+            release_files=self.release_files,
+        )
+        rv = (
+            make_source_view(result.body, result.encoding),
+            result.url,
+            discover_sourcemap(result),
+        )
+
+        if source_key is not None and matches_release_file_key(source_key, result.body):
+            parsed_artifact_cache.set(("source",) + source_key, rv, size=len(result.body))
+        return rv
+
+    def fetch_sourcemap_view(self, sourcemap_url):
+        """
+        Fetch and parse a sourcemap.
+
+        This does not modify the caches of this processor and can be called
+        from worker threads.
+        """
+        sourcemap_key = None
+        if not is_data_uri(sourcemap_url):
+            sourcemap_key = self.get_release_file_key(sourcemap_url)
+            if sourcemap_key is not None:
+                sourcemap_view = parsed_artifact_cache.get(("sourcemap",) + sourcemap_key)
+                if sourcemap_view is not None:
+                    return sourcemap_view
+
+        body = fetch_sourcemap_body(
+            sourcemap_url,
+            project=self.project,
+            release=self.release,
+            dist=self.dist,
+            allow_scraping=self.allow_scraping,
+            release_files=self.release_files,
+        )
+        sourcemap_view = parse_sourcemap(sourcemap_url, body)
+
+        if sourcemap_key is not None and matches_release_file_key(sourcemap_key, body):
+            parsed_artifact_cache.set(
+                ("sourcemap",) + sourcemap_key, sourcemap_view, size=len(body)
+            )
+        return sourcemap_view
+
+    def add_source_error(self, filename, error):
+        # most people don't upload release artifacts for their third-party libraries,
+        # so ignore missing node_modules files
+        if error["type"] == EventError.JS_MISSING_SOURCE and "node_modules" in filename:
             return
+        self.cache.add_error(filename, error)
+
+    def add_source(self, filename, source):
+        """
+        Add a source returned by `fetch_source` to the cache.  Returns the
+        url of its sourcemap if that still needs to be fetched.
+        """
+        source_view, url, sourcemap_url = source
+        self.cache.add(filename, source_view)
+        self.cache.alias(url, filename)
+
+        if not sourcemap_url:
+            return None
+
+        logger.debug("Found sourcemap URL %r for minified script %r", sourcemap_url[:256], url)
+        self.sourcemaps.link(filename, sourcemap_url)
+        if sourcemap_url in self.sourcemaps:
+            return None
+        return sourcemap_url
 
-        sourcemaps.add(sourcemap_url, sourcemap_view)
+    def add_sourcemap(self, sourcemap_url, sourcemap_view):
+        self.sourcemaps.add(sourcemap_url, sourcemap_view)
 
         # cache any inlined sources
         for src_id, source_name in sourcemap_view.iter_sources():
@@ -899,9 +1234,47 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f["abs_path"])
 
+        self.prefetch_release_files(pending_file_list)
+
+        if settings.SENTRY_SOURCE_FETCH_CONCURRENCY > 1 and len(pending_file_list) > 1:
+            self.populate_source_cache_concurrently(pending_file_list)
+            return
+
         for idx, filename in enumerate(pending_file_list):
             self.cache_source(filename=filename)
 
+    def populate_source_cache_concurrently(self, filenames):
+        """
+        Like calling `cache_source` for all `filenames`, but fetches all
+        source files and then all sourcemaps on a thread pool.  Fetches that
+        do not complete within `SENTRY_SOURCE_FETCH_EVENT_TIMEOUT` are
+        recorded as errors.
+        """
+        deadline = time.time() + settings.SENTRY_SOURCE_FETCH_EVENT_TIMEOUT
+        filenames = [filename for filename in filenames if self.count_fetch(filename)]
+
+        pending_sourcemaps = {}
+        with metrics.timer("sourcemaps.fetch_sources"):
+            for filename, source, error in fetch_concurrently(
+                self.fetch_source, filenames, deadline
+            ):
+                if error is not None:
+                    self.add_source_error(filename, error)
+                    continue
+                sourcemap_url = self.add_source(filename, source)
+                if sourcemap_url is not None:
+                    pending_sourcemaps.setdefault(sourcemap_url, []).append(filename)
+
+        with metrics.timer("sourcemaps.fetch_sourcemaps"):
+            for sourcemap_url, sourcemap_view, error in fetch_concurrently(
+                self.fetch_sourcemap_view, list(pending_sourcemaps), deadline
+            ):
+                if error is not None:
+                    for filename in pending_sourcemaps[sourcemap_url]:
+                        self.cache.add_error(filename, error)
+                    continue
+                self.add_sourcemap(sourcemap_url, sourcemap_view)
+
     def close(self):
         StacktraceProcessor.close(self)
         if self.sourcemaps_touched:
@@ -1,9 +1,18 @@
 from __future__ import absolute_import
 
+import threading
+import time
+
 from django.db import connection, connections
 from django.db.models.signals import post_migrate
 
 from sentry.db.models import FlexibleForeignKey, Model, sane_repr, BoundedBigIntegerField
+from sentry.utils import metrics
+
+# Seconds after which the rest of a reserved block of short IDs is
+# abandoned, so that short IDs keep roughly following the creation order of
+# groups across processes.
+SHORT_ID_BLOCK_TTL = 60
 
 
 class Counter(Model):
@@ -42,6 +51,55 @@ def increment_project_counter(project, delta=1):
         cur.close()
 
 
+class ShortIdAllocator(object):
+    """
+    Hands out the short IDs of projects from blocks that are reserved with a
+    single counter increment, so that creating a group does not need to lock
+    the counter row of its project every time.
+
+    Short IDs stay unique, but they are not strictly ordered across
+    processes, and the IDs of a block that is abandoned before it is used
+    up are skipped.
+    """
+
+    def __init__(self):
+        # project_id -> (next short ID, last short ID, expires)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def next(self, project, block_size):
+        if block_size <= 1:
+            return increment_project_counter(project)
+
+        with self._lock:
+            now = time.time()
+            block = self._blocks.get(project.id)
+            if block is not None:
+                next_id, last_id, expires = block
+                if expires <= now:
+                    metrics.incr("short_id.block.gap", amount=last_id - next_id + 1)
+                elif next_id <= last_id:
+                    self._blocks[project.id] = (next_id + 1, last_id, expires)
+                    return next_id
+
+            with metrics.timer("short_id.block.reserve", tags={"block_size": block_size}):
+                last_id = increment_project_counter(project, block_size)
+
+            self._blocks[project.id] = (
+                last_id - block_size + 2,
+                last_id,
+                now + SHORT_ID_BLOCK_TTL,
+            )
+            return last_id - block_size + 1
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+short_id_allocator = ShortIdAllocator()
+
+
 # this must be idempotent because it seems to execute twice
 # (at least during test runs)
 def create_counter_function(app_config, using, **kwargs):
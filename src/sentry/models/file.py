@@ -6,7 +6,9 @@ import mmap
 import tempfile
 import time
 
+from collections import OrderedDict
 from hashlib import sha1
+from io import BytesIO
 from uuid import uuid4
 from threading import Semaphore
 from concurrent.futures import ThreadPoolExecutor
@@ -34,6 +36,7 @@ DEFAULT_BLOB_SIZE = 1024 * 1024  # one mb
 CHUNK_STATE_HEADER = "__state"
 MULTI_BLOB_UPLOAD_CONCURRENCY = 8
 MAX_FILE_SIZE = 2 ** 31  # 2GB is the maximum offset supported by fileblob
+READ_AHEAD_MAX_BYTES = 32 * DEFAULT_BLOB_SIZE
 
 
 class nooplogger(object):
@@ -95,6 +98,11 @@ def get_storage():
     return storage(**options)
 
 
+def _save_blob_contents(path, contents):
+    storage = get_storage()
+    storage.save(path, ContentFile(contents))
+
+
 class FileBlob(Model):
     __core__ = False
 
@@ -227,6 +235,56 @@ class FileBlob(Model):
                     pass
             logger.debug("FileBlob.from_files.end")
 
+    @classmethod
+    def _from_chunks(cls, chunks, executor, logger=nooplogger):
+        """
+        Returns a FileBlob for each of the given byte strings, in order.
+
+        Chunks are hashed and uploaded on the given executor, while the
+        database is only accessed from the calling thread.  Blobs that already
+        exist are found with a single query; for the others the upload locks
+        are taken in checksum order, so that concurrent uploads of overlapping
+        chunks cannot deadlock.
+        """
+        if len(chunks) == 1:
+            checksums = [sha1(chunks[0]).hexdigest()]
+        else:
+            checksums = list(executor.map(lambda c: sha1(c).hexdigest(), chunks))
+
+        blobs = {blob.checksum: blob for blob in cls.objects.filter(checksum__in=set(checksums))}
+        metrics.incr("filestore.blob-dedup", amount=sum(1 for c in checksums if c in blobs))
+
+        contents_by_checksum = dict(zip(checksums, chunks))
+        locks = []
+        uploads = []
+        try:
+            for checksum in sorted(set(checksums) - set(blobs)):
+                lock = _locked_blob(checksum, logger=logger)
+                existing = lock.__enter__()
+                locks.append(lock)
+                if existing is not None:
+                    blobs[checksum] = existing
+                    continue
+
+                contents = contents_by_checksum[checksum]
+                blob = cls(size=len(contents), checksum=checksum)
+                blob.path = cls.generate_unique_path()
+                uploads.append((blob, executor.submit(_save_blob_contents, blob.path, contents)))
+
+            for blob, future in uploads:
+                future.result()
+                blob.save()
+                blobs[blob.checksum] = blob
+                metrics.timing("filestore.blob-size", blob.size)
+        finally:
+            for lock in locks:
+                try:
+                    lock.__exit__(None, None, None)
+                except Exception:
+                    pass
+
+        return [blobs[checksum] for checksum in checksums]
+
     @classmethod
     def from_file(cls, fileobj, logger=nooplogger):
         """
@@ -321,21 +379,28 @@ class File(Model):
         app_label = "sentry"
         db_table = "sentry_file"
 
-    def _get_chunked_blob(self, mode=None, prefetch=False, prefetch_to=None, delete=True):
+    def _get_chunked_blob(
+        self, mode=None, prefetch=False, prefetch_to=None, delete=True, read_ahead=None
+    ):
         return ChunkedFileBlobIndexWrapper(
             FileBlobIndex.objects.filter(file=self).select_related("blob").order_by("offset"),
             mode=mode,
             prefetch=prefetch,
             prefetch_to=prefetch_to,
             delete=delete,
+            read_ahead=read_ahead,
         )
 
-    def getfile(self, mode=None, prefetch=False):
+    def getfile(self, mode=None, prefetch=False, read_ahead=None):
         """Returns a file object.  By default the file is fetched on
         demand but if prefetch is enabled the file is fully prefetched
         into a tempfile before reading can happen.
+
+        When fetched on demand, ``read_ahead`` blobs (by default the
+        ``filestore.read-ahead`` option) are downloaded in the background
+        ahead of the reader.
         """
-        impl = self._get_chunked_blob(mode, prefetch)
+        impl = self._get_chunked_blob(mode, prefetch, read_ahead=read_ahead)
         return FileObj(impl, self.name)
 
     def save_to(self, path):
@@ -370,6 +435,11 @@ class File(Model):
         """
         Save a fileobj into a number of chunks.
 
+        Chunks are read in batches of ``MULTI_BLOB_UPLOAD_CONCURRENCY``.  The
+        blobs of a batch are hashed and uploaded concurrently, and blobs that
+        already exist are looked up with a single query and not uploaded
+        again.
+
         Returns a list of `FileBlobIndex` items.
 
         >>> indexes = file.putfile(fileobj)
@@ -378,17 +448,32 @@ class File(Model):
         offset = 0
         checksum = sha1(b"")
 
-        while True:
-            contents = fileobj.read(blob_size)
-            if not contents:
-                break
-            checksum.update(contents)
+        with ThreadPoolExecutor(max_workers=MULTI_BLOB_UPLOAD_CONCURRENCY) as exe:
+            while True:
+                chunks = []
+                while len(chunks) < MULTI_BLOB_UPLOAD_CONCURRENCY:
+                    contents = fileobj.read(blob_size)
+                    if not contents:
+                        break
+                    checksum.update(contents)
+                    chunks.append(contents)
+
+                if not chunks:
+                    break
 
-            blob_fileobj = ContentFile(contents)
-            blob = FileBlob.from_file(blob_fileobj, logger=logger)
+                blobs = FileBlob._from_chunks(chunks, exe, logger=logger)
+                indexes = []
+                for blob in blobs:
+                    indexes.append(FileBlobIndex(file=self, blob=blob, offset=offset))
+                    offset += blob.size
+
+                # Link the blobs right away, so that they are cleaned up with
+                # the file if reading the rest of it fails.
+                results.extend(FileBlobIndex.objects.bulk_create(indexes))
+
+                if len(chunks) < MULTI_BLOB_UPLOAD_CONCURRENCY:
+                    break
 
-            results.append(FileBlobIndex.objects.create(file=self, blob=blob, offset=offset))
-            offset += blob.size
         self.size = offset
         self.checksum = checksum.hexdigest()
         metrics.timing("filestore.file-size", offset)
@@ -411,12 +496,18 @@ class File(Model):
 
             new_checksum = sha1(b"")
             offset = 0
+            indexes = []
             for blob in file_blobs:
-                FileBlobIndex.objects.create(file=self, blob=blob, offset=offset)
-                for chunk in blob.getfile().chunks():
+                indexes.append(FileBlobIndex.objects.create(file=self, blob=blob, offset=offset))
+                offset += blob.size
+
+            with ChunkedFileBlobIndexWrapper(indexes) as f:
+                while True:
+                    chunk = f.read(65536)
+                    if not chunk:
+                        break
                     new_checksum.update(chunk)
                     tf.write(chunk)
-                offset += blob.size
 
             self.size = offset
             self.checksum = new_checksum.hexdigest()
@@ -457,17 +548,96 @@ class FileBlobIndex(Model):
         unique_together = (("file", "blob", "offset"),)
 
 
+class BlobReadAhead(object):
+    """
+    Downloads the blobs following the one being read in the background.
+
+    At most ``window`` blobs are downloaded or held ahead of the reader, and
+    no more than ``max_bytes`` unless that would leave nothing to download.
+    """
+
+    def __init__(self, indexes, window, max_bytes=READ_AHEAD_MAX_BYTES):
+        self._indexes = indexes
+        self._window = window
+        self._max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=window)
+        self._pending = OrderedDict()
+        self._bytes_read = 0
+        self._started = time.time()
+
+    @staticmethod
+    def _fetch(blob):
+        with blob.getfile() as f:
+            return f.read()
+
+    def _schedule(self, start):
+        in_flight = sum(self._indexes[pos].blob.size or 0 for pos in self._pending)
+        for pos in range(start, min(start + self._window, len(self._indexes))):
+            if pos in self._pending:
+                continue
+            size = self._indexes[pos].blob.size or 0
+            if self._pending and in_flight + size > self._max_bytes:
+                break
+            self._pending[pos] = self._executor.submit(self._fetch, self._indexes[pos].blob)
+            in_flight += size
+
+    def getfile(self, position):
+        """
+        Returns a file object for the blob at the given position of the
+        indexes and schedules the downloads of the blobs following it.
+        """
+        # Drop downloads that are no longer ahead of the reader, e.g. after seeking.
+        for pos in list(self._pending):
+            if pos < position or pos >= position + self._window:
+                self._pending.pop(pos).cancel()
+
+        future = self._pending.pop(position, None)
+        if future is None:
+            future = self._executor.submit(self._fetch, self._indexes[position].blob)
+        self._schedule(position + 1)
+
+        if not future.done():
+            metrics.incr("filestore.read-ahead.stall")
+        with metrics.timer("filestore.read-ahead.wait"):
+            contents = future.result()
+
+        self._bytes_read += len(contents)
+        return BytesIO(contents)
+
+    def close(self):
+        for future in six.itervalues(self._pending):
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+        if self._bytes_read:
+            duration = time.time() - self._started
+            metrics.timing("filestore.read-ahead.bytes", self._bytes_read)
+            if duration > 0:
+                metrics.timing("filestore.read-ahead.throughput", self._bytes_read / duration)
+
+
 class ChunkedFileBlobIndexWrapper(object):
-    def __init__(self, indexes, mode=None, prefetch=False, prefetch_to=None, delete=True):
+    def __init__(
+        self, indexes, mode=None, prefetch=False, prefetch_to=None, delete=True, read_ahead=None
+    ):
         # eager load from database incase its a queryset
         self._indexes = list(indexes)
         self._curfile = None
         self._curidx = None
+        self._curpos = None
+        self._read_ahead = None
         if prefetch:
             self.prefetched = True
             self._prefetch(prefetch_to, delete)
         else:
             self.prefetched = False
+            if read_ahead is None:
+                from sentry import options
+
+                read_ahead = options.get("filestore.read-ahead")
+            if read_ahead > 0 and len(self._indexes) > 1:
+                self._read_ahead = BlobReadAhead(self._indexes, read_ahead)
         self.mode = mode
         self.open()
 
@@ -491,9 +661,13 @@ class ChunkedFileBlobIndexWrapper(object):
         old_file = self._curfile
         try:
             try:
-                self._curidx = six.next(self._idxiter)
-                self._curfile = self._curidx.blob.getfile()
+                self._curpos, self._curidx = six.next(self._idxiter)
+                if self._read_ahead is not None:
+                    self._curfile = self._read_ahead.getfile(self._curpos)
+                else:
+                    self._curfile = self._curidx.blob.getfile()
             except StopIteration:
+                self._curpos = None
                 self._curidx = None
                 self._curfile = None
         finally:
@@ -541,8 +715,12 @@ class ChunkedFileBlobIndexWrapper(object):
     def close(self):
         if self._curfile:
             self._curfile.close()
+        if self._read_ahead is not None:
+            self._read_ahead.close()
+            self._read_ahead = None
         self._curfile = None
         self._curidx = None
+        self._curpos = None
         self.closed = True
 
     def seek(self, pos):
@@ -561,7 +739,8 @@ class ChunkedFileBlobIndexWrapper(object):
         for n, idx in enumerate(self._indexes[::-1]):
             if idx.offset <= pos:
                 if idx != self._curidx:
-                    self._idxiter = iter(self._indexes[-(n + 1) :])
+                    start = len(self._indexes) - (n + 1)
+                    self._idxiter = enumerate(self._indexes[start:], start)
                     self._nextidx()
                 break
         else:
@@ -14,7 +14,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.utils.http import urlencode
 from uuid import uuid1
 
-from sentry import projectoptions
+from sentry import options, projectoptions
 from sentry.app import locks
 from sentry.constants import ObjectStatus, RESERVED_PROJECT_SLUGS
 from sentry.db.mixin import PendingDeletionMixin, delete_pending_deletion_option
@@ -129,9 +129,9 @@ class Project(Model, PendingDeletionMixin):
         return u"%s (%s)" % (self.name, self.slug)
 
     def next_short_id(self):
-        from sentry.models import Counter
+        from sentry.models.counter import short_id_allocator
 
-        return Counter.increment(self)
+        return short_id_allocator.next(self, options.get("store.short-id-block-size"))
 
     def save(self, *args, **kwargs):
         if not self.slug:
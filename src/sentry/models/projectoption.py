@@ -1,5 +1,7 @@
 from __future__ import absolute_import, print_function
 
+import six
+
 from django.db import models
 
 from sentry import projectoptions
@@ -54,6 +56,46 @@ class ProjectOptionManager(OptionManager):
                 self._option_cache[cache_key] = result
         return self._option_cache.get(cache_key, {})
 
+    def get_all_values_bulk(self, projects):
+        """
+        Bulk version of ``get_all_values``. The options of projects missing in
+        the local cache are loaded with a single cache and database roundtrip.
+        """
+        project_ids = [p.id if isinstance(p, models.Model) else p for p in projects]
+        cache_keys = {project_id: self._make_key(project_id) for project_id in project_ids}
+
+        missing = [
+            project_id
+            for project_id, cache_key in six.iteritems(cache_keys)
+            if cache_key not in self._option_cache
+        ]
+        if missing:
+            cached = cache.get_many([cache_keys[project_id] for project_id in missing])
+            uncached = {}
+            for project_id in missing:
+                result = cached.get(cache_keys[project_id])
+                if result is None:
+                    uncached[project_id] = {}
+                else:
+                    self._option_cache[cache_keys[project_id]] = result
+
+            if uncached:
+                for option in self.filter(project__in=list(uncached)):
+                    uncached[option.project_id][option.key] = option.value
+                cache.set_many(
+                    {
+                        cache_keys[project_id]: result
+                        for project_id, result in six.iteritems(uncached)
+                    }
+                )
+                for project_id, result in six.iteritems(uncached):
+                    self._option_cache[cache_keys[project_id]] = result
+
+        return {
+            project_id: self._option_cache.get(cache_key, {})
+            for project_id, cache_key in six.iteritems(cache_keys)
+        }
+
     def reload_cache(self, project_id, update_reason):
         if update_reason != "projectoption.get_all_values":
             schedule_update_config_cache(
@@ -1,17 +1,130 @@
 from __future__ import absolute_import
 
+import copy
 import six
+import threading
 
 from base64 import b64encode
+from collections import OrderedDict
 from threading import local
+from time import time
 from uuid import uuid4
 
+from django.conf import settings
 from django.core.cache import caches, InvalidCacheBackendError
 
+from sentry.utils import json, metrics
 from sentry.utils.cache import memoize
 from sentry.utils.services import Service
 
 
+class LocalNodeCache(object):
+    """
+    A process wide LRU of decoded node payloads that sits in front of the
+    ``nodedata`` cache.
+
+    The cache is bounded by the JSON encoded size of the payloads, which
+    defaults to the `SENTRY_NODESTORE_LOCAL_CACHE_SIZE` setting.  As other
+    processes can change nodes, entries also expire after
+    `SENTRY_NODESTORE_LOCAL_CACHE_TTL` seconds.
+
+    Payloads are kept decoded, which saves the ``nodedata`` roundtrip and the
+    JSON decoding on a hit.  Readers and writers get their own deep copies,
+    so that changes to them don't leak into the cache.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return settings.SENTRY_NODESTORE_LOCAL_CACHE_SIZE
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return settings.SENTRY_NODESTORE_LOCAL_CACHE_TTL
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_many(self, id_list):
+        rv = {}
+        now = time()
+        with self._lock:
+            for id in id_list:
+                try:
+                    value, size, expires = self._items.pop(id)
+                except KeyError:
+                    continue
+                if expires <= now:
+                    self._size -= size
+                    continue
+                self._items[id] = (value, size, expires)
+                rv[id] = value
+
+        rv = {id: copy.deepcopy(value) for id, value in six.iteritems(rv)}
+
+        if rv:
+            metrics.incr("nodestore.local_cache.hit", amount=len(rv))
+        if len(rv) < len(id_list):
+            metrics.incr("nodestore.local_cache.miss", amount=len(id_list) - len(rv))
+        return rv
+
+    def set_many(self, items):
+        max_size = self.max_size
+        expires = time() + self.ttl
+        sized_items = [
+            (id, copy.deepcopy(value), len(json.dumps(value))) for id, value in six.iteritems(items)
+        ]
+
+        evicted = 0
+        with self._lock:
+            for id, value, size in sized_items:
+                old = self._items.pop(id, None)
+                if old is not None:
+                    self._size -= old[1]
+                if size > max_size:
+                    continue
+                self._items[id] = (value, size, expires)
+                self._size += size
+                while self._size > max_size:
+                    _, (_, old_size, _) = self._items.popitem(last=False)
+                    self._size -= old_size
+                    evicted += 1
+            total_size = self._size
+
+        if evicted:
+            metrics.incr("nodestore.local_cache.evict", amount=evicted)
+        metrics.timing("nodestore.local_cache.size", total_size)
+
+    def delete_many(self, id_list):
+        with self._lock:
+            for id in id_list:
+                old = self._items.pop(id, None)
+                if old is not None:
+                    self._size -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+local_node_cache = LocalNodeCache()
+
+
 class NodeStorage(local, Service):
     __all__ = (
         "create",
@@ -30,6 +143,7 @@ class NodeStorage(local, Service):
         "_set_cache_item",
         "_delete_cache_item",
         "_delete_cache_items",
+        "_clear_cache",
     )
 
     def create(self, data):
@@ -99,31 +213,55 @@ class NodeStorage(local, Service):
         raise NotImplementedError
 
     def _get_cache_item(self, id):
-        if self.cache:
-            return self.cache.get(id)
+        return self._get_cache_items([id]).get(id)
 
     def _get_cache_items(self, id_list):
+        rv = {}
+        local_cache = self.local_cache
+        if local_cache is not None:
+            rv = local_cache.get_many(id_list)
+            if len(rv) == len(id_list):
+                return rv
+            id_list = [id for id in id_list if id not in rv]
+
         if self.cache:
-            return self.cache.get_many(id_list)
-        return {}
+            items = self.cache.get_many(id_list)
+            if items and local_cache is not None:
+                local_cache.set_many(items)
+            rv.update(items)
+        return rv
 
     def _set_cache_item(self, id, data):
-        if self.cache and data:
-            self.cache.set(id, data)
+        self._set_cache_items({id: data})
 
     def _set_cache_items(self, items):
         cacheable_items = {k: v for k, v in six.iteritems(items) if v}
+        if self.local_cache is not None:
+            self.local_cache.set_many(cacheable_items)
         if self.cache:
             self.cache.set_many(cacheable_items)
 
     def _delete_cache_item(self, id):
-        if self.cache:
-            self.cache.delete(id)
+        self._delete_cache_items([id])
 
     def _delete_cache_items(self, id_list):
+        if self.local_cache is not None:
+            self.local_cache.delete_many(id_list)
         if self.cache:
             self.cache.delete_many(id_list)
 
+    def _clear_cache(self):
+        if self.local_cache is not None:
+            self.local_cache.clear()
+        if self.cache:
+            self.cache.clear()
+
+    @property
+    def local_cache(self):
+        if local_node_cache.enabled:
+            return local_node_cache
+        return None
+
     @memoize
     def cache(self):
         try:
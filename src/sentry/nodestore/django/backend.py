@@ -1,16 +1,118 @@
 from __future__ import absolute_import
 
 import math
+import six
+import zlib
 
+from base64 import b64decode, b64encode
+
+from django.db import connections, router
 from django.utils import timezone
 
 from sentry.db.models import create_or_update
+from sentry.exceptions import InvalidConfiguration
 from sentry.nodestore.base import NodeStorage
+from sentry.utils import json
 
 from .models import Node
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # NOQA
+
+
+COMPRESSION_FORMATS = ("zlib", "zstd")
+
 
 class DjangoNodeStorage(NodeStorage):
+    """
+    A database backed node storage.
+
+    By default node payloads are stored pickled, as done by the ``data``
+    field of the ``Node`` model.  With ``compression`` set to ``"zlib"`` or
+    ``"zstd"``, payloads are stored as compressed JSON prefixed with their
+    format and ``set_multi`` writes all nodes with a single upsert.  Rows
+    written before compression was enabled are still read transparently,
+    while compressed rows can only be read with compression enabled.
+
+    >>> DjangoNodeStorage(
+    ...     compression='zlib',
+    ...     cleanup_chunk_size=10000,
+    ... )
+    """
+
+    def __init__(self, compression=None, cleanup_chunk_size=10000):
+        if compression is not None and compression not in COMPRESSION_FORMATS:
+            raise InvalidConfiguration("Unknown nodestore compression: %r" % (compression,))
+        if compression == "zstd" and zstandard is None:
+            raise InvalidConfiguration("zstd compression requires the zstandard package")
+        self.compression = compression
+        self.cleanup_chunk_size = cleanup_chunk_size
+
+    def encode_data(self, data):
+        payload = json.dumps(data).encode("utf-8")
+        if self.compression == "zstd":
+            payload = zstandard.ZstdCompressor().compress(payload)
+        else:
+            payload = zlib.compress(payload)
+        return u"%s:%s" % (self.compression, b64encode(payload).decode("ascii"))
+
+    def decode_data(self, value):
+        # Base64 never contains a colon, so rows without a format prefix were
+        # written by the ``data`` field itself.
+        fmt, sep, payload = value.partition(":")
+        if not sep:
+            return Node._meta.get_field("data").to_python(value)
+
+        payload = b64decode(payload)
+        if fmt == "zstd":
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif fmt == "zlib":
+            payload = zlib.decompress(payload)
+        else:
+            raise ValueError("Unknown node data format: %r" % (fmt,))
+        return json.loads(payload.decode("utf-8"))
+
+    def _get_nodes(self, id_list):
+        if not self.compression:
+            return {n.id: n.data for n in Node.objects.filter(id__in=id_list)}
+
+        # Read the raw column, the ``data`` field only understands pickles.
+        return {
+            id: self.decode_data(value)
+            for id, value in Node.objects.filter(id__in=id_list).values_list("id", "data")
+        }
+
+    def _upsert_nodes(self, values):
+        if not values:
+            return
+
+        using = router.db_for_write(Node)
+        quote_name = connections[using].ops.quote_name
+        now = timezone.now()
+
+        params = []
+        # Write in a stable order so that concurrent upserts don't deadlock.
+        for id, data in sorted(six.iteritems(values)):
+            params.extend((id, self.encode_data(data), now))
+
+        query = u"""
+            insert into {table} ({id}, {data}, {timestamp})
+            values {values}
+            on conflict ({id}) do update
+            set {data} = excluded.{data}, {timestamp} = excluded.{timestamp}
+        """.format(
+            table=quote_name(Node._meta.db_table),
+            id=quote_name("id"),
+            data=quote_name("data"),
+            timestamp=quote_name("timestamp"),
+            values=u", ".join([u"(%s, %s, %s)"] * len(values)),
+        )
+
+        with connections[using].cursor() as cursor:
+            cursor.execute(query, params)
+
     def delete(self, id):
         Node.objects.filter(id=id).delete()
         self._delete_cache_item(id)
@@ -19,6 +121,13 @@ class DjangoNodeStorage(NodeStorage):
         item_from_cache = self._get_cache_item(id)
         if item_from_cache:
             return item_from_cache
+
+        if self.compression:
+            data = self._get_nodes([id]).get(id)
+            if data is not None:
+                self._set_cache_item(id, data)
+            return data
+
         try:
             data = Node.objects.get(id=id).data
             self._set_cache_item(id, data)
@@ -32,7 +141,7 @@ class DjangoNodeStorage(NodeStorage):
             return cache_items
 
         uncached_ids = [id for id in id_list if id not in cache_items]
-        items = {n.id: n.data for n in Node.objects.filter(id__in=uncached_ids)}
+        items = self._get_nodes(uncached_ids)
         self._set_cache_items(items)
         items.update(cache_items)
         return items
@@ -42,18 +151,29 @@ class DjangoNodeStorage(NodeStorage):
         self._delete_cache_items(id_list)
 
     def set(self, id, data, ttl=None):
-        create_or_update(Node, id=id, values={"data": data, "timestamp": timezone.now()})
+        if self.compression:
+            self._upsert_nodes({id: data})
+        else:
+            create_or_update(Node, id=id, values={"data": data, "timestamp": timezone.now()})
         self._set_cache_item(id, data)
 
+    def set_multi(self, values):
+        if not self.compression:
+            return super(DjangoNodeStorage, self).set_multi(values)
+
+        self._upsert_nodes(values)
+        self._set_cache_items(values)
+
     def cleanup(self, cutoff_timestamp):
         from sentry.db.deletion import BulkDeleteQuery
 
         total_seconds = (timezone.now() - cutoff_timestamp).total_seconds()
         days = math.floor(total_seconds / 86400)
 
-        BulkDeleteQuery(model=Node, dtfield="timestamp", days=days).execute()
-        if self.cache:
-            self.cache.clear()
+        BulkDeleteQuery(model=Node, dtfield="timestamp", days=days).execute(
+            chunk_size=self.cleanup_chunk_size
+        )
+        self._clear_cache()
 
     def bootstrap(self):
         # Nothing for Django backend to do during bootstrap
@@ -94,6 +94,8 @@ register("beacon.anonymous", type=Bool, flags=FLAG_REQUIRED)
 # Filestore
 register("filestore.backend", default="filesystem", flags=FLAG_NOSTORE)
 register("filestore.options", default={"location": "/tmp/sentry-files"}, flags=FLAG_NOSTORE)
+# Number of blobs downloaded ahead of the reader when streaming files, 0 disables it
+register("filestore.read-ahead", default=0, flags=FLAG_PRIORITIZE_DISK)
 
 # Symbol server
 register("symbolserver.enabled", default=False, flags=FLAG_ALLOW_EMPTY | FLAG_PRIORITIZE_DISK)
@@ -265,3 +267,30 @@ register("processing.can-use-scrubbers", default=True)
 #
 # Note: A value that is neither 0 nor 1 is regarded as 0
 register("store.use-relay-dsn-sample-rate", default=1)
+
+# Number of time shards that plain Discover exports are split into. Every
+# shard is paged by keyset and exported by its own chain of tasks.
+register("dataexport.shards", default=1, flags=FLAG_PRIORITIZE_DISK)
+
+# Serve full project configs to internal Relays from the projectconfig cache
+# where available, embedding the cached JSON without decoding it.
+register("relay.serve-cached-project-configs", default=False, flags=FLAG_PRIORITIZE_DISK)
+
+# Number of id range shards the largest child relations of a scheduled
+# deletion are split into. Shards are deleted by concurrent tasks.
+register("deletions.shards", default=1, flags=FLAG_PRIORITIZE_DISK)
+
+# Maximum number of chunks deleted by all deletion shards per minute.
+register("deletions.shard-chunks-per-minute", default=600, flags=FLAG_PRIORITIZE_DISK)
+
+# Number of event batches an unmerge task processes before it continues in
+# a new task. The cursor is checkpointed after every batch.
+register("unmerge.checkpoint-batches", default=10, flags=FLAG_PRIORITIZE_DISK)
+
+# Maximum number of events per second and project that group reprocessing
+# resubmits for processing. Set to 0 for no limit.
+register("reprocessing2.events-per-second", default=100, flags=FLAG_PRIORITIZE_DISK)
+
+# Number of group short IDs a process reserves per project at once. Set to 1
+# to take every short ID from the project counter directly.
+register("store.short-id-block-size", default=1, flags=FLAG_PRIORITIZE_DISK)
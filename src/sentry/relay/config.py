@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+import copy
 import six
 import uuid
 
@@ -50,7 +51,7 @@ def get_public_key_configs(project, full_config, project_keys=None):
     return public_keys
 
 
-def get_filter_settings(project):
+def get_filter_settings(project, custom_filters_enabled=None):
     filter_settings = {}
 
     for flt in get_all_filter_specs():
@@ -58,7 +59,10 @@ def get_filter_settings(project):
         settings = _load_filter_settings(flt, project)
         filter_settings[filter_id] = settings
 
-    if features.has("projects:custom-inbound-filters", project):
+    if custom_filters_enabled is None:
+        custom_filters_enabled = features.has("projects:custom-inbound-filters", project)
+
+    if custom_filters_enabled:
         invalid_releases = project.get_option(u"sentry:{}".format(FilterTypes.RELEASES))
         if invalid_releases:
             filter_settings["releases"] = {"releases": invalid_releases}
@@ -102,6 +106,93 @@ def get_project_config(project, full_config=True, project_keys=None):
 
     :return: a ProjectConfig object for the given project
     """
+    return _get_project_config(project, full_config=full_config, project_keys=project_keys)
+
+
+def get_project_configs(projects, project_keys=None):
+    """
+    Constructs the full ProjectConfig of many projects of one organization.
+
+    In contrast to calling ``get_project_config`` for every project, all
+    organization and project options, as well as feature flags and the
+    event retention, are loaded upfront with a fixed number of queries.
+
+    Additionally, the config of every active project key is returned under
+    its public key.  It only differs from the project config in the public
+    keys and quotas, which are restricted to that key.
+
+    :param projects: The projects to load configuration for.
+    :param project_keys: A dict mapping project ids to their project keys.
+
+    :return: a dict mapping project ids and public keys to ProjectConfig
+        objects, as stored in the projectconfig cache
+    """
+    from sentry.models import Organization, OrganizationOption, ProjectOption
+
+    projects = list(projects)
+    if not projects:
+        return {}
+    if project_keys is None:
+        project_keys = {}
+
+    organizations = {
+        organization.id: organization
+        for organization in Organization.objects.filter(
+            id__in=set(project.organization_id for project in projects)
+        )
+    }
+
+    custom_filters_enabled = {}
+    event_retention = {}
+    for organization in six.itervalues(organizations):
+        OrganizationOption.objects.get_all_values(organization)
+        org_projects = [p for p in projects if p.organization_id == organization.id]
+        for project in org_projects:
+            project.organization = organization
+        custom_filters_enabled.update(
+            features.has_for_batch("projects:custom-inbound-filters", organization, org_projects)
+        )
+        event_retention[organization.id] = quotas.get_event_retention(organization)
+
+    ProjectOption.objects.get_all_values_bulk(projects)
+
+    configs = {}
+    for project in projects:
+        keys = project_keys.get(project.id) or []
+        project_config = _get_project_config(
+            project,
+            project_keys=keys,
+            custom_filters_enabled=custom_filters_enabled.get(project),
+            event_retention=event_retention[project.organization_id],
+        )
+        configs[project.id] = project_config
+
+        for key in keys:
+            if key.status != ProjectKeyStatus.ACTIVE:
+                continue
+            configs[key.public_key] = _get_project_key_config(project_config, key)
+
+    return configs
+
+
+def _get_project_key_config(project_config, project_key):
+    """
+    Derives the config restricted to a single project key from the full
+    config of its project.
+    """
+    project = project_config.project
+    if project_config.disabled:
+        return ProjectConfig(project, disabled=True)
+
+    cfg = copy.deepcopy(project_config.to_dict())
+    cfg["publicKeys"] = get_public_key_configs(project, True, project_keys=[project_key])
+    cfg["config"]["quotas"] = get_quotas(project, keys=[project_key])
+    return ProjectConfig(project, **cfg)
+
+
+def _get_project_config(
+    project, full_config=True, project_keys=None, custom_filters_enabled=None, event_retention=None
+):
     with configure_scope() as scope:
         scope.set_tag("project", project.id)
 
@@ -138,11 +229,15 @@ def get_project_config(project, full_config=True, project_keys=None):
         return ProjectConfig(project, **cfg)
 
     with Hub.current.start_span(op="get_filter_settings"):
-        cfg["config"]["filterSettings"] = get_filter_settings(project)
+        cfg["config"]["filterSettings"] = get_filter_settings(
+            project, custom_filters_enabled=custom_filters_enabled
+        )
     with Hub.current.start_span(op="get_grouping_config_dict_for_project"):
         cfg["config"]["groupingConfig"] = get_grouping_config_dict_for_project(project)
-    with Hub.current.start_span(op="get_event_retention"):
-        cfg["config"]["eventRetention"] = quotas.get_event_retention(project.organization)
+    if event_retention is None:
+        with Hub.current.start_span(op="get_event_retention"):
+            event_retention = quotas.get_event_retention(project.organization)
+    cfg["config"]["eventRetention"] = event_retention
     with Hub.current.start_span(op="get_all_quotas"):
         cfg["config"]["quotas"] = get_quotas(project, keys=project_keys)
 
@@ -4,12 +4,17 @@ from sentry.utils.services import Service
 
 
 class ProjectConfigCache(Service):
-    __all__ = ("set_many", "delete_many", "get")
+    __all__ = ("set_many", "delete_many", "get", "get_raw_many")
 
     def __init__(self, **options):
         pass
 
-    def set_many(self, configs):
+    def set_many(self, configs, invalidate=True):
+        """
+        Caches the given configs.  Pass ``invalidate=False`` to write back
+        configs that were computed on a cache miss rather than changed, so
+        that the local caches of other processes are kept.
+        """
         pass
 
     def delete_many(self, project_ids):
@@ -17,3 +22,10 @@ class ProjectConfigCache(Service):
 
     def get(self, project_id):
         raise NotImplementedError()
+
+    def get_raw_many(self, project_ids):
+        """
+        Returns the JSON encoded configs of the given project ids or public
+        keys that are cached, keyed by their text representation.
+        """
+        return {}
@@ -1,20 +1,43 @@
 from __future__ import absolute_import
 
 import six
+import threading
+
+from collections import OrderedDict
+from time import time
 
 from sentry.relay.projectconfig_cache.base import ProjectConfigCache
-from sentry.utils import json
+from sentry.utils import json, metrics
 from sentry.utils.redis import get_dynamic_cluster_from_options, validate_dynamic_cluster
 
 
 REDIS_CACHE_TIMEOUT = 3600  # 1 hr
 
+# Incremented on every invalidating write, which invalidates the local caches
+# of all processes.
+VERSION_KEY = "relayconfig-version"
+
 
 class RedisProjectConfigCache(ProjectConfigCache):
-    def __init__(self, **options):
+    """
+    Stores the JSON encoded project configs in Redis.
+
+    With ``local_cache_ttl`` set, the encoded configs read from Redis are
+    additionally kept in a per-process cache of at most ``local_cache_size``
+    entries.  Entries are stamped with a version that is bumped by
+    ``delete_many`` and by ``set_many`` unless ``invalidate=False`` is
+    passed, so a read costs one Redis roundtrip for the version regardless
+    of the number of configs.
+    """
+
+    def __init__(self, local_cache_ttl=0, local_cache_size=10000, **options):
         self.is_redis_cluster, self.cluster, options = get_dynamic_cluster_from_options(
             "SENTRY_RELAY_PROJECTCONFIG_CACHE_OPTIONS", options
         )
+        self.local_cache_ttl = local_cache_ttl
+        self.local_cache_size = local_cache_size
+        self._local_cache = OrderedDict()
+        self._local_cache_lock = threading.Lock()
         super(RedisProjectConfigCache, self).__init__(**options)
 
     def validate(self):
@@ -29,34 +52,107 @@ class RedisProjectConfigCache(ProjectConfigCache):
         else:
             return self.cluster.get_local_client_for_key(routing_key)
 
-    def set_many(self, configs):
-        for project_id, config in six.iteritems(configs):
-            # XXX(markus): Figure out how to do pipelining here. We may have
-            # multiple routing keys (-> multiple clients).
-            #
-            # We cannot route by org, because Relay does not know the org when
-            # fetching.
+    def __execute_many(self, commands):
+        """
+        Executes a list of ``(method, args)`` commands, batched per node,
+        and returns their results in order.
+
+        We cannot route by org, because Relay does not know the org when
+        fetching, so the keys of one update are spread across the cluster.
+        """
+        if self.is_redis_cluster:
+            pipe = self.cluster.pipeline(transaction=False)
+            for method, args in commands:
+                getattr(pipe, method)(*args)
+            return pipe.execute()
+
+        # rb batches the commands of a map per host and runs the hosts in
+        # parallel.
+        with self.cluster.map() as client:
+            promises = [getattr(client, method)(*args) for method, args in commands]
+        return [promise.value for promise in promises]
 
-            key = self.__get_redis_key(project_id)
-            client = self.__get_redis_client(key)
-            client.setex(key, REDIS_CACHE_TIMEOUT, json.dumps(config))
+    def set_many(self, configs, invalidate=True):
+        commands = [
+            ("setex", (self.__get_redis_key(project_id), REDIS_CACHE_TIMEOUT, json.dumps(config)))
+            for project_id, config in six.iteritems(configs)
+        ]
+        if not commands:
+            return
+        if not invalidate:
+            self.__execute_many(commands)
+            return
+        self.__execute_many(commands + [("incr", (VERSION_KEY,))])
+        self.__clear_local_cache()
 
     def delete_many(self, project_ids):
-        for project_id in project_ids:
-            # XXX(markus): Figure out how to do pipelining here. We may have
-            # multiple routing keys (-> multiple clients).
-            #
-            # We cannot route by org, because Relay does not know the org when
-            # fetching.
+        commands = [("delete", (self.__get_redis_key(project_id),)) for project_id in project_ids]
+        if commands:
+            self.__execute_many(commands + [("incr", (VERSION_KEY,))])
+            self.__clear_local_cache()
+
+    def __clear_local_cache(self):
+        with self._local_cache_lock:
+            self._local_cache.clear()
+
+    def __get_local_many(self, project_ids, version):
+        rv = {}
+        now = time()
+        with self._local_cache_lock:
+            for project_id in project_ids:
+                entry = self._local_cache.get(project_id)
+                if entry is None:
+                    continue
+                value, entry_version, expires = entry
+                if entry_version != version or expires <= now:
+                    del self._local_cache[project_id]
+                    continue
+                rv[project_id] = value
+
+        if rv:
+            metrics.incr("relay.projectconfig_cache.local.hit", amount=len(rv))
+        if len(rv) < len(project_ids):
+            metrics.incr("relay.projectconfig_cache.local.miss", amount=len(project_ids) - len(rv))
+        return rv
+
+    def __set_local_many(self, values, version):
+        expires = time() + self.local_cache_ttl
+        with self._local_cache_lock:
+            for project_id, value in six.iteritems(values):
+                self._local_cache.pop(project_id, None)
+                self._local_cache[project_id] = (value, version, expires)
+            while len(self._local_cache) > self.local_cache_size:
+                self._local_cache.popitem(last=False)
+
+    def get_raw_many(self, project_ids):
+        project_ids = [six.text_type(project_id) for project_id in project_ids]
+        if not project_ids:
+            return {}
+
+        version = None
+        rv = {}
+        if self.local_cache_ttl > 0:
+            version = self.__get_redis_client(VERSION_KEY).get(VERSION_KEY)
+            rv = self.__get_local_many(project_ids, version)
+
+        missing = [project_id for project_id in project_ids if project_id not in rv]
+        if missing:
+            results = self.__execute_many(
+                [("get", (self.__get_redis_key(project_id),)) for project_id in missing]
+            )
+            fetched = {
+                project_id: result.decode("utf-8") if isinstance(result, bytes) else result
+                for project_id, result in zip(missing, results)
+                if result is not None
+            }
+            if self.local_cache_ttl > 0:
+                self.__set_local_many(fetched, version)
+            rv.update(fetched)
 
-            key = self.__get_redis_key(project_id)
-            client = self.__get_redis_client(key)
-            client.delete(key)
+        return rv
 
     def get(self, project_id):
-        key = self.__get_redis_key(project_id)
-        client = self.__get_redis_client(key)
-        rv = client.get(key)
+        rv = self.get_raw_many([project_id]).get(six.text_type(project_id))
         if rv is not None:
             return json.loads(rv)
         return None
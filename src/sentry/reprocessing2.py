@@ -1,17 +1,19 @@
-from __future__ import absolute_import
+from __future__ import absolute_import, division
 
 import uuid
 import hashlib
 import logging
 import sentry_sdk
 import six
+import time
 
+from collections import defaultdict
 from django.conf import settings
 
-from sentry import nodestore, features, eventstore
+from sentry import nodestore, features, eventstore, options
 from sentry.attachments import CachedAttachment, attachment_cache
 from sentry import models
-from sentry.utils import snuba
+from sentry.utils import json, snuba
 from sentry.utils.cache import cache_key_for_event
 from sentry.utils.redis import redis_clusters
 from sentry.eventstore.processing import event_processing_store
@@ -73,13 +75,56 @@ def delete_unprocessed_events(events):
 
 
 def reprocess_event(project_id, event_id, start_time):
-    node_id = _generate_unprocessed_event_node_id(project_id=project_id, event_id=event_id)
+    reprocess_events(project_id=project_id, event_ids=[event_id], start_time=start_time)
 
-    with sentry_sdk.start_span(op="reprocess_events.nodestore.get"):
-        data = nodestore.get(node_id)
-    if data is None:
+
+def reprocess_events(project_id, event_ids, start_time):
+    """
+    Resubmits a batch of events of a project for processing.  The unprocessed
+    payloads, events and attachments of the whole batch are each loaded with
+    a single query.
+    """
+    node_ids = {
+        _generate_unprocessed_event_node_id(project_id=project_id, event_id=event_id): event_id
+        for event_id in event_ids
+    }
+
+    with sentry_sdk.start_span(op="reprocess_events.nodestore.get_multi"):
+        payloads = nodestore.get_multi(list(node_ids))
+
+    payloads = {node_ids[node_id]: data for node_id, data in six.iteritems(payloads) if data}
+    if not payloads:
         return
 
+    # The payload of an event is stored under its original event ID.
+    original_event_ids = {event_id: data["event_id"] for event_id, data in payloads.items()}
+
+    events = {
+        event.event_id: event
+        for event in eventstore.get_unfetched_events(
+            eventstore.Filter(
+                project_ids=[project_id], event_ids=list(set(original_event_ids.values()))
+            ),
+            limit=len(payloads),
+            referrer="reprocessing2.reprocess_events",
+        )
+    }
+
+    attachments = defaultdict(list)
+    for attachment in models.EventAttachment.objects.filter(
+        project_id=project_id, event_id__in=list(events)
+    ).select_related("file"):
+        attachments[attachment.event_id].append(attachment)
+
+    for event_id, data in six.iteritems(payloads):
+        event = events.get(original_event_ids[event_id])
+        if event is None:
+            continue
+
+        _reprocess_event(project_id, data, event, attachments[event.event_id], start_time)
+
+
+def _reprocess_event(project_id, data, event, attachments, start_time):
     from sentry.event_manager import set_tag
     from sentry.tasks.store import preprocess_event_from_reprocessing
     from sentry.ingest.ingest_consumer import CACHE_TIMEOUT
@@ -93,11 +138,6 @@ def reprocess_event(project_id, event_id, start_time):
     # cache/event_processing_store
     orig_event_id = data["event_id"]
     set_tag(data, "original_event_id", orig_event_id)
-
-    event = eventstore.get_event_by_id(project_id, orig_event_id)
-    if event is None:
-        return
-
     set_tag(data, "original_group_id", event.group_id)
 
     # XXX: reuse event IDs
@@ -106,13 +146,9 @@ def reprocess_event(project_id, event_id, start_time):
     cache_key = event_processing_store.store(data)
 
     # Step 2: Copy attachments into attachment cache
-    queryset = models.EventAttachment.objects.filter(
-        project_id=project_id, event_id=orig_event_id
-    ).select_related("file")
-
     attachment_objects = []
 
-    for attachment_id, attachment in enumerate(queryset):
+    for attachment_id, attachment in enumerate(attachments):
         with sentry_sdk.start_span(op="reprocess_event._copy_attachment_into_cache") as span:
             span.set_data("attachment_id", attachment.id)
             attachment_objects.append(
@@ -195,6 +231,32 @@ def _get_sync_counter_key(group_id):
     return "re2:count:{}".format(group_id)
 
 
+def _get_info_key(group_id):
+    return "re2:info:{}".format(group_id)
+
+
+def _get_budget_key(project_id, timestamp):
+    return "re2:budget:{}:{}".format(project_id, timestamp)
+
+
+def reserve_reprocessing_budget(project_id, count):
+    """
+    Reserves ``count`` events of the per-second reprocessing budget of a
+    project.  Returns ``False`` if the budget of the current second is used
+    up, in which case events should not be submitted before the next second.
+    """
+    events_per_second = options.get("reprocessing2.events-per-second")
+    if not events_per_second:
+        return True
+
+    key = _get_budget_key(project_id, int(time.time()))
+    pipe = _get_sync_redis_client().pipeline()
+    pipe.incrby(key, count)
+    pipe.expire(key, 60)
+    used = pipe.execute()[0]
+    return used <= events_per_second
+
+
 def mark_event_reprocessed(data):
     """
     This function is supposed to be unconditionally called when an event has
@@ -261,8 +323,14 @@ def start_group_reprocessing(project_id, group_id, max_events=None, acting_user_
     if max_events is not None:
         event_count = min(event_count, max_events)
 
-    key = _get_sync_counter_key(group_id)
-    _get_sync_redis_client().setex(key, _REDIS_SYNC_TTL, event_count)
+    pipe = _get_sync_redis_client().pipeline()
+    pipe.setex(_get_sync_counter_key(group_id), _REDIS_SYNC_TTL, event_count)
+    pipe.setex(
+        _get_info_key(group_id),
+        _REDIS_SYNC_TTL,
+        json.dumps({"totalEvents": event_count, "startedAt": time.time()}),
+    )
+    pipe.execute()
 
 
 def is_group_finished(group_id):
@@ -272,3 +340,36 @@ def is_group_finished(group_id):
 
     pending = int(_get_sync_redis_client().get(_get_sync_counter_key(group_id)))
     return pending <= 0
+
+
+def get_progress(group_id):
+    """
+    Returns the progress of a group that is being reprocessed, including the
+    rate at which its events are processed and the estimated number of
+    seconds until it is finished, or ``None`` if it is not being reprocessed.
+    """
+    pending, info = _get_sync_redis_client().mget(
+        [_get_sync_counter_key(group_id), _get_info_key(group_id)]
+    )
+    if info is None:
+        return None
+
+    info = json.loads(info)
+    total = info["totalEvents"]
+    pending = min(max(int(pending or 0), 0), total)
+    elapsed = time.time() - info["startedAt"]
+    rate = (total - pending) / elapsed if elapsed > 0 else 0.0
+
+    if not pending:
+        eta = 0
+    elif rate:
+        eta = int(pending / rate)
+    else:
+        eta = None
+
+    return {
+        "totalEvents": total,
+        "pendingEvents": pending,
+        "eventsPerSecond": rate,
+        "etaSeconds": eta,
+    }
@@ -2,10 +2,13 @@ from __future__ import absolute_import
 
 import logging
 import six
+import threading
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
 from datetime import timedelta
 from django.core.cache import cache
+from django.db import connections, router
 from django.utils import timezone
 from random import randrange
 
@@ -17,6 +20,88 @@ from sentry.utils.safe import safe_execute
 
 RuleFuture = namedtuple("RuleFuture", ["rule", "kwargs"])
 
+# The number of compiled rules kept per process.
+COMPILED_RULE_CACHE_SIZE = 1000
+
+
+class CompiledRule(object):
+    """
+    The parts of a rule that don't depend on the event, with its conditions
+    and filters instantiated once.
+    """
+
+    def __init__(self, rule, project, logger):
+        self.rule = rule
+        self.data = deepcopy(rule.data)
+        self.environment_id = rule.environment_id
+        self.label = rule.label
+        self.condition_match = rule.data.get("action_match") or Rule.DEFAULT_CONDITION_MATCH
+        self.filter_match = rule.data.get("filter_match") or Rule.DEFAULT_FILTER_MATCH
+        self.frequency = rule.data.get("frequency") or Rule.DEFAULT_FREQUENCY
+
+        self.conditions = []
+        self.filters = []
+        for condition in rule.data.get("conditions", ()):
+            condition_cls = rules.get(condition["id"])
+            if condition_cls is None:
+                logger.warn("Unregistered condition or filter %r", condition["id"])
+                # Unregistered conditions never match, but still count
+                # towards the match function.
+                self.filters.append(None)
+                continue
+
+            condition_inst = condition_cls(project, data=condition, rule=rule)
+            if condition_cls.rule_type == "condition/event":
+                self.conditions.append(condition_inst)
+            else:
+                self.filters.append(condition_inst)
+
+    def is_stale(self, rule):
+        """
+        Whether the rule changed since it was compiled.  Conditions read the
+        environment and label of the rule they were instantiated with.
+        """
+        return (
+            self.data != rule.data
+            or self.environment_id != rule.environment_id
+            or self.label != rule.label
+        )
+
+
+class CompiledRuleCache(object):
+    """
+    A process wide LRU of compiled rules keyed by rule id.  Rules whose data,
+    environment or label changed since they were compiled are compiled again.
+    """
+
+    def __init__(self, max_size=COMPILED_RULE_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rule, project, logger):
+        with self._lock:
+            compiled = self._items.pop(rule.id, None)
+            if compiled is not None:
+                self._items[rule.id] = compiled
+
+        if compiled is not None and not compiled.is_stale(rule):
+            return compiled
+
+        compiled = CompiledRule(rule, project, logger)
+        with self._lock:
+            self._items[rule.id] = compiled
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+compiled_rules = CompiledRuleCache()
+
 
 class RuleProcessor(object):
     logger = logging.getLogger("sentry.rules")
@@ -37,31 +122,108 @@ class RuleProcessor(object):
         return Rule.get_for_project(self.project.id)
 
     def get_rule_status(self, rule):
-        key = "grouprulestatus:1:%s" % hash_values([self.group.id, rule.id])
-        rule_status = cache.get(key)
-        if rule_status is None:
-            rule_status, _ = GroupRuleStatus.objects.get_or_create(
-                rule=rule, group=self.group, defaults={"project": self.project}
+        return self.get_rule_statuses([rule])[rule.id]
+
+    def _get_rule_status_cache_key(self, rule_id):
+        return "grouprulestatus:1:%s" % hash_values([self.group.id, rule_id])
+
+    def get_rule_statuses(self, rules_list):
+        """
+        Returns the ``GroupRuleStatus`` of the group for each of the given
+        rules keyed by rule id, fetching all uncached rows with one query.
+        """
+        cache_keys = {self._get_rule_status_cache_key(rule.id): rule.id for rule in rules_list}
+        statuses = {
+            cache_keys[key]: status for key, status in six.iteritems(cache.get_many(cache_keys))
+        }
+
+        missing = [rule for rule in rules_list if rule.id not in statuses]
+        if not missing:
+            return statuses
+
+        fetched = {
+            status.rule_id: status
+            for status in GroupRuleStatus.objects.filter(
+                group=self.group, rule__in=[rule.id for rule in missing]
+            )
+        }
+        # Only happens the first time rules are applied to a group.
+        uncreated = [rule.id for rule in missing if rule.id not in fetched]
+        if uncreated:
+            self.create_rule_statuses(uncreated)
+            for status in GroupRuleStatus.objects.filter(group=self.group, rule__in=uncreated):
+                fetched[status.rule_id] = status
+
+        cache.set_many(
+            {self._get_rule_status_cache_key(rule_id): s for rule_id, s in six.iteritems(fetched)},
+            300,
+        )
+        statuses.update(fetched)
+        return statuses
+
+    def create_rule_statuses(self, rule_ids):
+        """
+        Creates the ``GroupRuleStatus`` of the group for the given rules with
+        a single statement, skipping those created concurrently.
+        """
+        using = router.db_for_write(GroupRuleStatus)
+        quote_name = connections[using].ops.quote_name
+
+        params = []
+        for rule_id in sorted(rule_ids):
+            params.extend(
+                (self.project.id, rule_id, self.group.id, GroupRuleStatus.ACTIVE, timezone.now())
             )
-            cache.set(key, rule_status, 300)
-        return rule_status
-
-    def condition_matches(self, condition, state, rule):
-        condition_cls = rules.get(condition["id"])
-        if condition_cls is None:
-            self.logger.warn("Unregistered condition %r", condition["id"])
-            return
 
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
-        return safe_execute(condition_inst.passes, self.event, state, _with_transaction=False)
+        query = u"""
+            insert into {table} ({project_id}, {rule_id}, {group_id}, {status}, {date_added})
+            values {values}
+            on conflict ({rule_id}, {group_id}) do nothing
+        """.format(
+            table=quote_name(GroupRuleStatus._meta.db_table),
+            project_id=quote_name("project_id"),
+            rule_id=quote_name("rule_id"),
+            group_id=quote_name("group_id"),
+            status=quote_name("status"),
+            date_added=quote_name("date_added"),
+            values=u", ".join([u"(%s, %s, %s, %s, %s)"] * len(rule_ids)),
+        )
 
-    def get_rule_type(self, condition):
-        rule_cls = rules.get(condition["id"])
-        if rule_cls is None:
-            self.logger.warn("Unregistered condition or filter %r", condition["id"])
-            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(query, params)
+
+    def activate_rule_statuses(self, cutoffs, now):
+        """
+        Sets ``last_active`` of the given rule statuses to ``now`` with a
+        single statement, unless they were already activated after their
+        cutoff (e.g. by a concurrent event).  Returns the ids of the statuses
+        that were updated.
+        """
+        if not cutoffs:
+            return set()
+
+        using = router.db_for_write(GroupRuleStatus)
+        quote_name = connections[using].ops.quote_name
+        table = quote_name(GroupRuleStatus._meta.db_table)
+
+        params = [now]
+        for status_id, cutoff in sorted(six.iteritems(cutoffs)):
+            params.extend((status_id, cutoff))
+
+        query = u"""
+            update {table}
+            set last_active = %s
+            from (values {values}) as cutoffs (id, cutoff)
+            where {table}.id = cutoffs.id
+            and ({table}.last_active is null or {table}.last_active <= cutoffs.cutoff)
+            returning {table}.id
+        """.format(
+            table=table, values=u", ".join([u"(%s::bigint, %s::timestamptz)"] * len(cutoffs))
+        )
 
-        return rule_cls.rule_type
+        with connections[using].cursor() as cursor:
+            cursor.execute(query, params)
+            return set(row[0] for row in cursor.fetchall())
 
     def get_state(self):
         return EventState(
@@ -80,74 +242,90 @@ class RuleProcessor(object):
             return lambda bool_iter: not any(bool_iter)
         return None
 
-    def apply_rule(self, rule):
-        condition_match = rule.data.get("action_match") or Rule.DEFAULT_CONDITION_MATCH
-        filter_match = rule.data.get("filter_match") or Rule.DEFAULT_FILTER_MATCH
-        rule_condition_list = rule.data.get("conditions", ())
-        frequency = rule.data.get("frequency") or Rule.DEFAULT_FREQUENCY
-
-        if (
-            rule.environment_id is not None
-            and self.event.get_environment().id != rule.environment_id
-        ):
-            return
-
-        status = self.get_rule_status(rule)
-
-        now = timezone.now()
-        freq_offset = now - timedelta(minutes=frequency)
-
-        if status.last_active and status.last_active > freq_offset:
-            return
-
-        state = self.get_state()
-
-        condition_list = []
-        filter_list = []
-        for rule_cond in rule_condition_list:
-            if self.get_rule_type(rule_cond) == "condition/event":
-                condition_list.append(rule_cond)
-            else:
-                filter_list.append(rule_cond)
+    def matches_rule(self, compiled, state):
+        rule = compiled.rule
 
         # if conditions exist evaluate them, otherwise move to the filters section
-        if condition_list:
-            condition_iter = (self.condition_matches(c, state, rule) for c in condition_list)
+        if compiled.conditions:
+            condition_iter = (self.condition_inst_matches(c, state) for c in compiled.conditions)
 
-            condition_func = self.get_match_function(condition_match)
+            condition_func = self.get_match_function(compiled.condition_match)
             if condition_func:
                 condition_passed = condition_func(condition_iter)
             else:
                 self.logger.error(
-                    "Unsupported condition_match %r for rule %d", condition_match, rule.id
+                    "Unsupported condition_match %r for rule %d", compiled.condition_match, rule.id
                 )
-                return
+                return False
 
             if not condition_passed:
-                return
+                return False
 
         # if filters exist evaluate them, otherwise pass
-        if filter_list:
-            filter_iter = (self.condition_matches(f, state, rule) for f in filter_list)
-            filter_func = self.get_match_function(filter_match)
+        if compiled.filters:
+            filter_iter = (self.condition_inst_matches(f, state) for f in compiled.filters)
+            filter_func = self.get_match_function(compiled.filter_match)
             if filter_func:
-                passed = filter_func(filter_iter)
+                return filter_func(filter_iter)
             else:
-                self.logger.error("Unsupported filter_match %r for rule %d", filter_match, rule.id)
-                return
-        else:
-            passed = True
-
-        if passed:
-            passed = (
-                GroupRuleStatus.objects.filter(id=status.id)
-                .exclude(last_active__gt=freq_offset)
-                .update(last_active=now)
-            )
+                self.logger.error(
+                    "Unsupported filter_match %r for rule %d", compiled.filter_match, rule.id
+                )
+                return False
+
+        return True
 
-        if not passed:
+    def condition_inst_matches(self, condition_inst, state):
+        if condition_inst is None:
             return
+        return safe_execute(condition_inst.passes, self.event, state, _with_transaction=False)
+
+    def apply_rule(self, rule):
+        self.apply_rules([rule])
+
+    def apply_rules(self, rules_list):
+        """
+        Evaluates all rules against the event, then activates the passing
+        rules in bulk and collects the futures of their actions.
+        """
+        environment_id = None
+        candidates = []
+        for rule in rules_list:
+            if rule.environment_id is not None:
+                if environment_id is None:
+                    environment_id = self.event.get_environment().id
+                if environment_id != rule.environment_id:
+                    continue
+            candidates.append(rule)
+
+        if not candidates:
+            return
+
+        statuses = self.get_rule_statuses(candidates)
+        state = self.get_state()
+        now = timezone.now()
+
+        passed = []
+        cutoffs = {}
+        for rule in candidates:
+            compiled = compiled_rules.get(rule, self.project, self.logger)
+            status = statuses[rule.id]
+            freq_offset = now - timedelta(minutes=compiled.frequency)
+
+            if status.last_active and status.last_active > freq_offset:
+                continue
+
+            if self.matches_rule(compiled, state):
+                passed.append((rule, status))
+                cutoffs[status.id] = freq_offset
+
+        activated = self.activate_rule_statuses(cutoffs, now)
+
+        for rule, status in passed:
+            if status.id in activated:
+                self.fire_rule(rule, state)
 
+    def fire_rule(self, rule, state):
         if randrange(10) == 0:
             analytics.record(
                 "issue_alert.fired",
@@ -186,6 +364,5 @@ class RuleProcessor(object):
             return six.itervalues({})
 
         self.grouped_futures.clear()
-        for rule in self.get_rules():
-            self.apply_rule(rule)
+        self.apply_rules(self.get_rules())
         return six.itervalues(self.grouped_futures)
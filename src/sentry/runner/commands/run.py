@@ -456,6 +456,12 @@ def batching_kafka_options(group):
     default=None,
     help="(Deprecated) Ingest consumers no longer use multiple processing threads.",
 )
+@click.option(
+    "--flush-concurrency",
+    type=int,
+    default=None,
+    help="Number of threads used to flush a batch. Messages belonging to the same event are always processed in order.",
+)
 @configuration
 def ingest_consumer(consumer_types, all_consumer_types, **options):
     """
@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 
 import mmh3
-from sentry.utils.compat import map
+from sentry.utils.compat import zip
 
 
 class MinHashSignatureBuilder(object):
@@ -10,9 +10,31 @@ class MinHashSignatureBuilder(object):
         self.rows = rows
 
     def __call__(self, features):
-        return map(
-            lambda column: min(
-                map(lambda feature: mmh3.hash(feature, column) % self.rows, features)
-            ),
-            range(self.columns),
-        )
+        return self.build_many([features])[0]
+
+    def build_many(self, feature_sets):
+        """
+        Build the signatures of many feature sets at once. Every distinct
+        feature is hashed once per column, even if it is shared between
+        feature sets, and the column minima are taken over the per-feature
+        hash rows.
+        """
+        columns = range(self.columns)
+        rows = self.rows
+        hash = mmh3.hash
+
+        hashes = {}
+        signatures = []
+        for features in feature_sets:
+            values = []
+            for feature in set(features):
+                value = hashes.get(feature)
+                if value is None:
+                    value = hashes[feature] = [hash(feature, column) % rows for column in columns]
+                values.append(value)
+
+            if not values:
+                raise ValueError("cannot build a signature without features")
+
+            signatures.append([min(column) for column in zip(*values)])
+        return signatures
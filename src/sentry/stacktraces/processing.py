@@ -2,14 +2,18 @@ from __future__ import absolute_import
 
 import six
 import logging
+import threading
 from datetime import datetime
+from django.conf import settings
 from django.utils import timezone
 
 from collections import namedtuple, OrderedDict
+from time import time
 
 import sentry_sdk
 
 from sentry.models import Project, Release
+from sentry.utils import metrics
 from sentry.utils.cache import cache
 from sentry.utils.hashlib import hash_values
 from sentry.utils.safe import get_path, safe_execute
@@ -26,6 +30,87 @@ StacktraceInfo.__eq__ = lambda a, b: a is b
 StacktraceInfo.__ne__ = lambda a, b: a is not b
 
 
+# How long processors' frame cache values are kept in the shared cache
+FRAME_CACHE_TTL = 3600
+
+
+class LocalFrameCache(object):
+    """
+    A process wide LRU of frame cache values that sits in front of the
+    shared cache.  Frames of common runtimes and libraries repeat across
+    many events, so their values are mostly found here.
+
+    The cache holds at most `SENTRY_FRAME_CACHE_LOCAL_SIZE` values, which
+    expire after `SENTRY_FRAME_CACHE_LOCAL_TTL` seconds.  Values are shared
+    between events and must not be modified by processors.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return settings.SENTRY_FRAME_CACHE_LOCAL_SIZE
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return settings.SENTRY_FRAME_CACHE_LOCAL_TTL
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_many(self, keys):
+        if self.max_size <= 0:
+            return {}
+
+        rv = {}
+        now = time()
+        with self._lock:
+            for key in keys:
+                try:
+                    value, expires = self._items.pop(key)
+                except KeyError:
+                    continue
+                if expires <= now:
+                    continue
+                self._items[key] = (value, expires)
+                rv[key] = value
+
+        if rv:
+            metrics.incr("stacktraces.frame_cache.local.hit", amount=len(rv))
+        if len(rv) < len(keys):
+            metrics.incr("stacktraces.frame_cache.local.miss", amount=len(keys) - len(rv))
+        return rv
+
+    def set_many(self, items):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+
+        expires = time() + self.ttl
+        with self._lock:
+            for key, value in six.iteritems(items):
+                self._items.pop(key, None)
+                if value is not None:
+                    self._items[key] = (value, expires)
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_frame_cache = LocalFrameCache()
+
+
 class ProcessableFrame(object):
     def __init__(self, frame, idx, processor, stacktrace_info, processable_frames):
         self.frame = frame
@@ -69,7 +154,8 @@ class ProcessableFrame(object):
 
     def set_cache_value(self, value):
         if self.cache_key is not None:
-            cache.set(self.cache_key, value, 3600)
+            cache.set(self.cache_key, value, FRAME_CACHE_TTL)
+            local_frame_cache.set_many({self.cache_key: value})
             return True
         return False
 
@@ -446,9 +532,19 @@ def get_crash_frame_from_event_data(data, frame_filter=None):
 
 
 def lookup_frame_cache(keys):
-    rv = {}
-    for key in keys:
-        rv[key] = cache.get(key)
+    """
+    Returns the cached values of the given frame cache keys, ``None`` for
+    the keys that are not cached.
+    """
+    keys = list(keys)
+    rv = local_frame_cache.get_many(keys)
+    missing = [key for key in keys if key not in rv]
+    if missing:
+        fetched = cache.get_many(missing)
+        local_frame_cache.set_many(fetched)
+        rv.update(fetched)
+    for key in missing:
+        rv.setdefault(key, None)
     return rv
 
 
@@ -473,11 +569,12 @@ def get_stacktrace_processing_task(infos, processors):
                 processable_frame
             )
             if processable_frame.cache_key is not None:
-                to_lookup[processable_frame.cache_key] = processable_frame
+                to_lookup.setdefault(processable_frame.cache_key, []).append(processable_frame)
 
     frame_cache = lookup_frame_cache(to_lookup)
-    for cache_key, processable_frame in six.iteritems(to_lookup):
-        processable_frame.cache_value = frame_cache.get(cache_key)
+    for cache_key, processable_frames in six.iteritems(to_lookup):
+        for processable_frame in processable_frames:
+            processable_frame.cache_value = frame_cache.get(cache_key)
 
     return StacktraceProcessingTask(
         processable_stacktraces=by_stacktrace_info, processors=by_processor
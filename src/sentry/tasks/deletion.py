@@ -8,10 +8,13 @@ from django.apps import apps
 from django.db import transaction
 from django.utils import timezone
 
+from sentry import options
 from sentry.constants import ObjectStatus
 from sentry.exceptions import DeleteAborted
 from sentry.signals import pending_delete
 from sentry.tasks.base import instrumented_task, retry, track_group_async_operation
+from sentry.utils import json, metrics
+from sentry.utils.imports import import_string
 
 
 logger = logging.getLogger(__name__)
@@ -19,6 +22,12 @@ logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 5
 
+# Relations spanning fewer ids than this are not worth sharding
+MIN_SHARD_ID_SPAN = 10000
+
+# How long a shard waits when deletions are rate limited
+RATE_LIMITED_COUNTDOWN = 10
+
 
 @instrumented_task(name="sentry.tasks.deletion.run_scheduled_deletions", queue="cleanup")
 def run_scheduled_deletions():
@@ -70,12 +79,187 @@ def run_deletion(deletion_id):
         transaction_id=deletion.guid,
         actor_id=deletion.actor_id,
     )
+
+    shards = deletion.data.get("shards")
+    if shards is None:
+        shard_count = options.get("deletions.shards")
+        if shard_count > 1 and start_deletion_shards(deletion, task, shard_count):
+            return
+    elif not all(shard["done"] for shard in shards):
+        # The last shard to finish schedules this task again.
+        return
+
     has_more = task.chunk()
     if has_more:
         run_deletion.apply_async(kwargs={"deletion_id": deletion_id}, countdown=15)
     deletion.delete()
 
 
+def _get_task_path(task_cls):
+    return u"{}.{}".format(task_cls.__module__, task_cls.__name__)
+
+
+def split_id_range(min_id, max_id, count):
+    """
+    Splits the inclusive id range ``[min_id, max_id]`` into ``count``
+    contiguous inclusive ranges.
+    """
+    step = max((max_id - min_id + 1) // count, 1)
+    bounds = list(range(min_id, max_id + 1, step))[:count]
+    return [
+        (start, (bounds[i + 1] - 1) if i + 1 < len(bounds) else max_id)
+        for i, start in enumerate(bounds)
+    ]
+
+
+def start_deletion_shards(deletion, task, shard_count):
+    """
+    Splits the id ranges of the largest child relations of a scheduled
+    deletion into shards that are deleted by concurrent
+    ``run_deletion_shard`` tasks.  Returns whether any shards were started.
+
+    Only relations deleted by a ``ModelDeletionTask`` with a JSON serializable
+    query are sharded, as bulk deletions are already cheap per row.
+    """
+    from django.db.models import Max, Min
+    from sentry.deletions import BulkModelDeletionTask, ModelDeletionTask, ModelRelation
+
+    instance = deletion.get_instance()
+    relations = task.get_child_relations(instance)
+    relations = task.extend_relations(relations, instance)
+    relations = task.filter_relations(relations)
+
+    shards = []
+    for relation in relations:
+        if not isinstance(relation, ModelRelation):
+            continue
+
+        model = relation.params["model"]
+        query = relation.params["query"]
+        task_cls = relation.task or task.manager.tasks.get(model, task.manager.default_task)
+        if not issubclass(task_cls, ModelDeletionTask) or issubclass(
+            task_cls, BulkModelDeletionTask
+        ):
+            continue
+        try:
+            json.dumps(query)
+        except TypeError:
+            continue
+
+        bounds = model.objects.filter(**query).aggregate(min_id=Min("id"), max_id=Max("id"))
+        if bounds["min_id"] is None or bounds["max_id"] - bounds["min_id"] < MIN_SHARD_ID_SPAN:
+            continue
+
+        for start, end in split_id_range(bounds["min_id"], bounds["max_id"], shard_count):
+            shards.append(
+                {
+                    "model": u"{}.{}".format(model._meta.app_label, model.__name__),
+                    "task": _get_task_path(task_cls),
+                    "query": query,
+                    "start": start,
+                    "end": end,
+                    "cursor": None,
+                    "done": False,
+                }
+            )
+
+    if not shards:
+        return False
+
+    deletion.data = dict(deletion.data, shards=shards)
+    deletion.save(update_fields=["data"])
+    metrics.timing("deletions.shard.count", len(shards))
+    logger.info(
+        "deletion.shards.start",
+        extra={"deletion_id": deletion.id, "transaction_id": deletion.guid, "shards": len(shards)},
+    )
+
+    for index in range(len(shards)):
+        run_deletion_shard.delay(deletion_id=deletion.id, shard=index)
+    return True
+
+
+def _update_deletion_shard(deletion_id, index, **values):
+    """
+    Updates the state of a shard and returns whether all shards are done.
+    """
+    from sentry.models import ScheduledDeletion
+
+    with transaction.atomic():
+        deletion = ScheduledDeletion.objects.select_for_update().get(id=deletion_id)
+        shards = deletion.data["shards"]
+        shards[index].update(values)
+        deletion.save(update_fields=["data"])
+        return all(shard["done"] for shard in shards)
+
+
+@instrumented_task(
+    name="sentry.tasks.deletion.run_deletion_shard",
+    queue="cleanup",
+    default_retry_delay=60 * 5,
+    max_retries=MAX_RETRIES,
+)
+@retry(exclude=(DeleteAborted,))
+def run_deletion_shard(deletion_id, shard):
+    """
+    Deletes a chunk of the rows of a single shard of a scheduled deletion.
+    """
+    from sentry import deletions
+    from sentry.app import ratelimiter
+    from sentry.models import ScheduledDeletion
+
+    try:
+        deletion = ScheduledDeletion.objects.get(id=deletion_id)
+    except ScheduledDeletion.DoesNotExist:
+        return
+
+    if deletion.aborted:
+        raise DeleteAborted
+
+    state = deletion.data["shards"][shard]
+    if state["done"]:
+        return
+
+    # Shared by all shards, so that deletions can't starve production writes.
+    if ratelimiter.is_limited(
+        "deletions:shard-chunks", limit=options.get("deletions.shard-chunks-per-minute"), window=60
+    ):
+        metrics.incr("deletions.shard.rate_limited")
+        run_deletion_shard.apply_async(
+            kwargs={"deletion_id": deletion_id, "shard": shard}, countdown=RATE_LIMITED_COUNTDOWN
+        )
+        return
+
+    app_label, model_name = state["model"].split(".", 1)
+    model = apps.get_model(app_label, model_name)
+    task = deletions.get(
+        model=model,
+        query=state["query"],
+        task=import_string(state["task"]),
+        transaction_id=deletion.guid,
+        actor_id=deletion.actor_id,
+        id_range=(state["start"], state["end"]),
+        cursor=state["cursor"],
+    )
+
+    with metrics.timer("deletions.shard.chunk", tags={"model": model_name}):
+        has_more = task.chunk()
+
+    if task.cursor is not None:
+        progress = float(task.cursor - state["start"] + 1) / (state["end"] - state["start"] + 1)
+        metrics.timing("deletions.shard.progress", progress, tags={"model": model_name})
+
+    all_done = _update_deletion_shard(deletion_id, shard, cursor=task.cursor, done=not has_more)
+    if has_more:
+        run_deletion_shard.delay(deletion_id=deletion_id, shard=shard)
+    elif all_done:
+        logger.info(
+            "deletion.shards.done",
+            extra={"deletion_id": deletion_id, "transaction_id": deletion.guid},
+        )
+        run_deletion.delay(deletion_id=deletion_id)
+
+
 @instrumented_task(
     name="sentry.tasks.deletion.revoke_api_tokens",
     queue="cleanup",
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import logging
+import six
 
 from django.conf import settings
 import sentry_sdk
@@ -29,9 +30,9 @@ def update_config_cache(generate, organization_id=None, project_id=None, update_
         invalidated.
     """
 
-    from sentry.models import Project, ProjectKey, ProjectKeyStatus
+    from sentry.models import Project, ProjectKey
     from sentry.relay import projectconfig_cache
-    from sentry.relay.config import get_project_config
+    from sentry.relay.config import get_project_configs
 
     if project_id:
         set_current_project(project_id)
@@ -64,24 +65,10 @@ def update_config_cache(generate, organization_id=None, project_id=None, update_
         project_keys.setdefault(key.project_id, []).append(key)
 
     if generate:
-        config_cache = {}
-        for project in projects:
-            project_config = get_project_config(
-                project, project_keys=project_keys.get(project.id, []), full_config=True
-            )
-            config_cache[project.id] = project_config.to_dict()
-
-            for key in project_keys.get(project.id) or ():
-                # XXX(markus): This is currently the cleanest way to get only
-                # state for a single projectkey (considering quotas and
-                # everything)
-                if key.status != ProjectKeyStatus.ACTIVE:
-                    continue
-
-                project_config = get_project_config(project, project_keys=[key], full_config=True)
-                config_cache[key.public_key] = project_config.to_dict()
-
-        projectconfig_cache.set_many(config_cache)
+        configs = get_project_configs(projects, project_keys=project_keys)
+        projectconfig_cache.set_many(
+            {key: project_config.to_dict() for key, project_config in six.iteritems(configs)}
+        )
     else:
         cache_keys_to_delete = []
         for project in projects:
@@ -2,12 +2,45 @@ from __future__ import absolute_import
 
 import time
 
-from sentry import eventstore
+from concurrent.futures import ThreadPoolExecutor
+
+from sentry import eventstore, options
 
 from sentry.tasks.base import instrumented_task
+from sentry.utils import metrics
 
 GROUP_REPROCESSING_CHUNK_SIZE = 100
 
+# Number of pages of events a single ``reprocess_group`` task submits, the
+# next page is fetched from Snuba while the current one is submitted.
+GROUP_REPROCESSING_PAGES_PER_TASK = 10
+
+# Number of events resubmitted by a single ``reprocess_events`` task
+REPROCESS_EVENTS_BATCH_SIZE = 10
+
+
+def _get_events_page(project_id, group_id, cursor, offset, limit):
+    conditions = []
+    if cursor is not None:
+        conditions.extend(
+            [
+                ["timestamp", "<=", cursor["timestamp"]],
+                [["timestamp", "<", cursor["timestamp"]], ["event_id", "<", cursor["event_id"]]],
+            ]
+        )
+
+    return list(
+        eventstore.get_unfetched_events(
+            eventstore.Filter(
+                project_ids=[project_id], group_ids=[group_id], conditions=conditions
+            ),
+            limit=limit,
+            orderby=["-timestamp", "-event_id"],
+            offset=offset,
+            referrer="reprocessing2.reprocess_group",
+        )
+    )
+
 
 @instrumented_task(
     name="sentry.tasks.reprocessing2.reprocess_group",
@@ -16,9 +49,15 @@ GROUP_REPROCESSING_CHUNK_SIZE = 100
     soft_time_limit=110,
 )
 def reprocess_group(
-    project_id, group_id, offset=0, start_time=None, max_events=None, acting_user_id=None
+    project_id,
+    group_id,
+    offset=0,
+    start_time=None,
+    max_events=None,
+    acting_user_id=None,
+    cursor=None,
 ):
-    from sentry.reprocessing2 import start_group_reprocessing
+    from sentry.reprocessing2 import reserve_reprocessing_budget, start_group_reprocessing
 
     if start_time is None:
         start_time = time.time()
@@ -26,43 +65,88 @@ def reprocess_group(
             project_id, group_id, max_events=max_events, acting_user_id=acting_user_id
         )
 
-    if max_events is not None and max_events <= 0:
-        events = []
-    else:
-        limit = GROUP_REPROCESSING_CHUNK_SIZE
-
-        if max_events is not None:
-            limit = min(limit, max_events)
-
-        events = list(
-            eventstore.get_unfetched_events(
-                eventstore.Filter(project_ids=[project_id], group_ids=[group_id],),
-                limit=limit,
-                orderby=["-timestamp"],
-                offset=offset,
-                referrer="reprocessing2.reprocess_group",
-            )
+    limit = GROUP_REPROCESSING_CHUNK_SIZE
+    events_per_second = options.get("reprocessing2.events-per-second")
+    if events_per_second:
+        limit = min(limit, events_per_second)
+
+    def get_limit():
+        if max_events is None:
+            return limit
+        return min(limit, max_events)
+
+    def reschedule(countdown):
+        reprocess_group.apply_async(
+            kwargs={
+                "project_id": project_id,
+                "group_id": group_id,
+                "offset": offset,
+                "start_time": start_time,
+                "max_events": max_events,
+                "cursor": cursor,
+            },
+            countdown=countdown,
         )
 
-    if not events:
+    if get_limit() <= 0:
         wait_group_reprocessed.delay(project_id=project_id, group_id=group_id)
         return
 
-    for event in events:
-        reprocess_event.delay(
-            project_id=project_id, event_id=event.event_id, start_time=start_time,
-        )
+    # Events are submitted at most at the configured rate per project.  The
+    # budget of a page is reserved before it is fetched, so that no page is
+    # fetched in vain.
+    if not reserve_reprocessing_budget(project_id, get_limit()):
+        metrics.incr("reprocessing2.reprocess_group.rate_limited")
+        reschedule(countdown=1)
+        return
 
-    if max_events is not None:
-        max_events -= len(events)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page_limit = get_limit()
+        future = executor.submit(_get_events_page, project_id, group_id, cursor, offset, page_limit)
 
-    reprocess_group.delay(
-        project_id=project_id,
-        group_id=group_id,
-        offset=offset + len(events),
-        start_time=start_time,
-        max_events=max_events,
-    )
+        for page in range(GROUP_REPROCESSING_PAGES_PER_TASK):
+            events = future.result()
+
+            if max_events is not None:
+                max_events -= len(events)
+
+            # A partial page means that there are no more events to submit.
+            if len(events) < page_limit or get_limit() <= 0:
+                _submit_events(project_id, events, start_time)
+                wait_group_reprocessed.delay(project_id=project_id, group_id=group_id)
+                return
+
+            cursor = {"timestamp": events[-1].timestamp, "event_id": events[-1].event_id}
+            offset = 0
+
+            prefetched = page + 1 < GROUP_REPROCESSING_PAGES_PER_TASK and (
+                reserve_reprocessing_budget(project_id, get_limit())
+            )
+            if prefetched:
+                page_limit = get_limit()
+                future = executor.submit(
+                    _get_events_page, project_id, group_id, cursor, offset, page_limit
+                )
+
+            _submit_events(project_id, events, start_time)
+
+            if not prefetched:
+                break
+
+    # Continue with the next page right away if this task has submitted its
+    # maximum number of pages, or in the next second if the budget is used up.
+    reschedule(countdown=0 if page + 1 == GROUP_REPROCESSING_PAGES_PER_TASK else 1)
+
+
+def _submit_events(project_id, events, start_time):
+    for i in range(0, len(events), REPROCESS_EVENTS_BATCH_SIZE):
+        reprocess_events.delay(
+            project_id=project_id,
+            event_ids=[event.event_id for event in events[i : i + REPROCESS_EVENTS_BATCH_SIZE]],
+            start_time=start_time,
+        )
+
+    metrics.incr("reprocessing2.events_submitted", amount=len(events))
 
 
 @instrumented_task(
@@ -77,6 +161,18 @@ def reprocess_event(project_id, event_id, start_time):
     reprocess_event_impl(project_id=project_id, event_id=event_id, start_time=start_time)
 
 
+@instrumented_task(
+    name="sentry.tasks.reprocessing2.reprocess_events",
+    queue="events.reprocessing.preprocess_event",  # XXX: dedicated queue
+    time_limit=120,
+    soft_time_limit=110,
+)
+def reprocess_events(project_id, event_ids, start_time):
+    from sentry.reprocessing2 import reprocess_events as reprocess_events_impl
+
+    reprocess_events_impl(project_id=project_id, event_ids=event_ids, start_time=start_time)
+
+
 @instrumented_task(
     name="sentry.tasks.reprocessing2.wait_group_reprocessed",
     queue="sleep",
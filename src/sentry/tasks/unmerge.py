@@ -2,10 +2,12 @@ from __future__ import absolute_import
 
 import logging
 from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 
-from django.db import transaction
+from django.db import IntegrityError, router, transaction
 
-from sentry import eventstore, eventstream
+from sentry import eventstore, eventstream, options
 from sentry.app import tsdb
 from sentry.constants import DEFAULT_LOGGER_NAME, LOG_LEVELS_MAP
 from sentry.event_manager import generate_culprit
@@ -24,11 +26,15 @@ from sentry.models import (
 )
 from sentry import similarity
 from sentry.tasks.base import instrumented_task
+from sentry.utils import json, metrics, redis
 from six.moves import reduce
 
 
 logger = logging.getLogger(__name__)
 
+# How long the progress of an unmerge is kept after its last checkpoint
+UNMERGE_PROGRESS_TTL = 60 * 60 * 24 * 7
+
 
 def cache(function):
     results = {}
@@ -57,11 +63,6 @@ def get_caches():
                 organization_id=organization_id, name=name
             )
         ),
-        "GroupRelease": cache(
-            lambda group_id, environment, release_id: GroupRelease.objects.get(
-                group_id=group_id, environment=environment, release_id=release_id
-            )
-        ),
         "Project": cache(lambda id: Project.objects.get(id=id)),
         "Release": cache(
             lambda organization_id, version: Release.objects.get(
@@ -270,8 +271,8 @@ def collect_group_environment_data(events):
     return results
 
 
-def repair_group_environment_data(caches, project, events):
-    for (group_id, env_name), first_release in collect_group_environment_data(events).items():
+def repair_group_environment_data(caches, project, group_environments):
+    for (group_id, env_name), first_release in group_environments.items():
         fields = {}
         if first_release:
             fields["first_release"] = caches["Release"](project.organization_id, first_release)
@@ -331,20 +332,64 @@ def collect_release_data(caches, project, events):
     return results
 
 
-def repair_group_release_data(caches, project, events):
-    attributes = collect_release_data(caches, project, events).items()
-    for (group_id, environment, release_id), (first_seen, last_seen) in attributes:
-        instance, created = GroupRelease.objects.get_or_create(
-            project_id=project.id,
-            group_id=group_id,
-            environment=environment,
-            release_id=release_id,
-            defaults={"first_seen": first_seen, "last_seen": last_seen},
-        )
-
-        if not created:
+def repair_group_release_data(project, group_releases):
+    """
+    Creates or backfills the ``GroupRelease`` rows of the collected
+    ``(group_id, environment, release_id)`` keys and returns their ids.
+    """
+    if not group_releases:
+        return {}
+
+    def get_instances():
+        return {
+            (instance.group_id, instance.environment, instance.release_id): instance
+            for instance in GroupRelease.objects.filter(
+                group_id__in=set(group_id for group_id, _, _ in group_releases),
+                release_id__in=set(release_id for _, _, release_id in group_releases),
+            )
+        }
+
+    instances = get_instances()
+
+    missing = []
+    for key, (first_seen, last_seen) in group_releases.items():
+        instance = instances.get(key)
+        if instance is None:
+            group_id, environment, release_id = key
+            missing.append(
+                GroupRelease(
+                    project_id=project.id,
+                    group_id=group_id,
+                    environment=environment,
+                    release_id=release_id,
+                    first_seen=first_seen,
+                    last_seen=last_seen,
+                )
+            )
+        elif instance.first_seen != first_seen:
             instance.update(first_seen=first_seen)
 
+    if missing:
+        try:
+            with transaction.atomic(using=router.db_for_write(GroupRelease)):
+                GroupRelease.objects.bulk_create(missing)
+        except IntegrityError:
+            # Rows created concurrently by ingestion are backfilled one by one.
+            for instance in missing:
+                existing, created = GroupRelease.objects.get_or_create(
+                    project_id=project.id,
+                    group_id=instance.group_id,
+                    environment=instance.environment,
+                    release_id=instance.release_id,
+                    defaults={"first_seen": instance.first_seen, "last_seen": instance.last_seen},
+                )
+                if not created:
+                    existing.update(first_seen=instance.first_seen)
+
+        instances = get_instances()
+
+    return {key: instance.id for key, instance in instances.items()}
+
 
 def get_event_user_from_interface(value):
     return EventUser(
@@ -355,70 +400,118 @@ def get_event_user_from_interface(value):
     )
 
 
-def collect_tsdb_data(caches, project, events):
-    counters = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-
-    sets = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
-
-    frequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int))))
-
-    for event in events:
-        environment = caches["Environment"](project.organization_id, get_environment_name(event))
-
-        counters[event.datetime][tsdb.models.group][(event.group_id, environment.id)] += 1
-
-        user = event.data.get("user")
-        if user:
-            sets[event.datetime][tsdb.models.users_affected_by_group][
-                (event.group_id, environment.id)
-            ].add(get_event_user_from_interface(user).tag_value)
-
-        frequencies[event.datetime][tsdb.models.frequent_environments_by_group][event.group_id][
-            environment.id
-        ] += 1
+class DenormalizationRepairs(object):
+    """
+    Collects the denormalized data of a batch of events in memory, so that it
+    can be repaired with a few bulk writes instead of with writes for every
+    event.
+    """
 
-        release = event.get_tag("sentry:release")
-        if release:
-            # TODO: I'm also not sure if "environment" here is correct, see
-            # similar comment above during creation.
-            grouprelease = caches["GroupRelease"](
-                event.group_id,
-                get_environment_name(event),
-                caches["Release"](project.organization_id, release).id,
+    def __init__(self, caches, project):
+        self.caches = caches
+        self.project = project
+
+        # (group_id, environment) -> first release
+        self.group_environments = OrderedDict()
+        # (group_id, environment, release_id) -> (first_seen, last_seen)
+        self.group_releases = OrderedDict()
+        # environment_id -> (timestamp, group_id) -> count
+        self.counters = defaultdict(lambda: defaultdict(int))
+        # (environment_id, timestamp) -> group_id -> users
+        self.users = defaultdict(lambda: defaultdict(set))
+        # timestamp -> group_id -> environment_id -> count
+        self.environments = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        # timestamp -> group_id -> (environment, release_id) -> count
+        self.releases = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+
+    def add(self, events):
+        """
+        Collects the data of a date-descending sorted batch of events, which
+        must be older than the events of all previously added batches.
+        """
+        for key, first_release in collect_group_environment_data(events).items():
+            # Events without a release don't reset the first release of the
+            # newer events, as is the case when repairing batch by batch.
+            if first_release or key not in self.group_environments:
+                self.group_environments[key] = first_release
+
+        for key, (first_seen, last_seen) in collect_release_data(
+            self.caches, self.project, events
+        ).items():
+            if key in self.group_releases:
+                last_seen = self.group_releases[key][1]
+            self.group_releases[key] = (first_seen, last_seen)
+
+        organization_id = self.project.organization_id
+        for event in events:
+            environment = get_environment_name(event)
+            environment_id = self.caches["Environment"](organization_id, environment).id
+
+            self.counters[environment_id][(event.datetime, event.group_id)] += 1
+
+            user = event.data.get("user")
+            if user:
+                self.users[(environment_id, event.datetime)][event.group_id].add(
+                    get_event_user_from_interface(user).tag_value
+                )
+
+            self.environments[event.datetime][event.group_id][environment_id] += 1
+
+            release = event.get_tag("sentry:release")
+            if release:
+                release_id = self.caches["Release"](organization_id, release).id
+                self.releases[event.datetime][event.group_id][(environment, release_id)] += 1
+
+        events_by_group = defaultdict(list)
+        for event in events:
+            events_by_group[event.group_id].append(event)
+        for group_events in events_by_group.values():
+            similarity.record(self.project, group_events)
+
+    def flush(self):
+        repair_group_environment_data(self.caches, self.project, self.group_environments)
+        group_release_ids = repair_group_release_data(self.project, self.group_releases)
+        self.repair_tsdb_data(group_release_ids)
+        self.__init__(self.caches, self.project)
+
+    def repair_tsdb_data(self, group_release_ids):
+        for environment_id, counters in self.counters.items():
+            tsdb.incr_multi(
+                [
+                    (tsdb.models.group, group_id, {"timestamp": timestamp, "count": count})
+                    for (timestamp, group_id), count in counters.items()
+                ],
+                environment_id=environment_id,
             )
 
-            frequencies[event.datetime][tsdb.models.frequent_releases_by_group][event.group_id][
-                grouprelease.id
-            ] += 1
-
-    return counters, sets, frequencies
-
-
-def repair_tsdb_data(caches, project, events):
-    counters, sets, frequencies = collect_tsdb_data(caches, project, events)
-
-    for timestamp, data in counters.items():
-        for model, keys in data.items():
-            for (key, environment_id), value in keys.items():
-                tsdb.incr(model, key, timestamp, value, environment_id=environment_id)
-
-    for timestamp, data in sets.items():
-        for model, keys in data.items():
-            for (key, environment_id), values in keys.items():
-                # TODO: This should use `record_multi` rather than `record`.
-                tsdb.record(model, key, values, timestamp, environment_id=environment_id)
-
-    for timestamp, data in frequencies.items():
-        tsdb.record_frequency_multi(data.items(), timestamp)
-
-
-def repair_denormalizations(caches, project, events):
-    repair_group_environment_data(caches, project, events)
-    repair_group_release_data(caches, project, events)
-    repair_tsdb_data(caches, project, events)
+        for (environment_id, timestamp), users in self.users.items():
+            tsdb.record_multi(
+                [
+                    (tsdb.models.users_affected_by_group, group_id, values)
+                    for group_id, values in users.items()
+                ],
+                timestamp,
+                environment_id=environment_id,
+            )
 
-    for event in events:
-        similarity.record(project, [event])
+        for timestamp in set(self.environments) | set(self.releases):
+            releases = {
+                group_id: {
+                    group_release_ids[(group_id, environment, release_id)]: count
+                    for (environment, release_id), count in items.items()
+                }
+                for group_id, items in self.releases.get(timestamp, {}).items()
+            }
+            tsdb.record_frequency_multi(
+                [
+                    (
+                        tsdb.models.frequent_environments_by_group,
+                        self.environments.get(timestamp, {}),
+                    ),
+                    (tsdb.models.frequent_releases_by_group, releases),
+                ],
+                timestamp,
+            )
 
 
 def lock_hashes(project_id, source_id, fingerprints):
@@ -444,36 +537,35 @@ def unlock_hashes(project_id, fingerprints):
     ).update(state=GroupHash.State.UNLOCKED)
 
 
-@instrumented_task(name="sentry.tasks.unmerge", queue="unmerge")
-def unmerge(
-    project_id,
-    source_id,
-    destination_id,
-    fingerprints,
-    actor_id,
-    last_event=None,
-    batch_size=500,
-    source_fields_reset=False,
-    eventstream_state=None,
-):
-    # XXX: The queryset chunking logic below is awfully similar to
-    # ``RangeQuerySetWrapper``. Ideally that could be refactored to be able to
-    # be run without iteration by passing around a state object and we could
-    # just use that here instead.
+class UnmergeProgress(object):
+    """
+    The cursor and progress of an unmerge, stored in Redis after every
+    batch.  A task that crashed or was delivered again resumes from the last
+    checkpoint rather than from the cursor it was scheduled with.
+    """
 
-    source = Group.objects.get(project_id=project_id, id=source_id)
+    def __init__(self, unmerge_id):
+        self.key = u"unmerge:{}".format(unmerge_id)
+        self.cluster = redis.clusters.get("default")
 
-    caches = get_caches()
+    @property
+    def client(self):
+        return self.cluster.get_local_client_for_key(self.key)
 
-    project = caches["Project"](project_id)
+    def get(self):
+        value = self.client.get(self.key)
+        if value is None:
+            return None
+        return json.loads(value)
 
-    # On the first iteration of this loop, we clear out all of the
-    # denormalizations from the source group so that we can have a clean slate
-    # for the new, repaired data.
-    if last_event is None:
-        fingerprints = lock_hashes(project_id, source_id, fingerprints)
-        truncate_denormalizations(project, source)
+    def save(self, **state):
+        self.client.setex(self.key, UNMERGE_PROGRESS_TTL, json.dumps(state))
+
+    def delete(self):
+        self.client.delete(self.key)
 
+
+def fetch_events(project_id, source_id, last_event, batch_size):
     # We process events sorted in descending order by -timestamp, -event_id. We need
     # to include event_id as well as timestamp in the ordering criteria since:
     #
@@ -500,60 +592,167 @@ def unmerge(
             ]
         )
 
-    events = eventstore.get_events(
+    # Node data is bound by the caller, so that this can run in a thread.
+    return eventstore.get_unfetched_events(
         filter=eventstore.Filter(
-            project_ids=[project_id], group_ids=[source.id], conditions=conditions
+            project_ids=[project_id], group_ids=[source_id], conditions=conditions
         ),
         limit=batch_size,
         referrer="unmerge",
         orderby=["-timestamp", "-event_id"],
     )
 
-    # If there are no more events to process, we're done with the migration.
-    if not events:
-        unlock_hashes(project_id, fingerprints)
-        logger.warning("Unmerge complete (eventstream state: %s)", eventstream_state)
-        if eventstream_state:
-            eventstream.end_unmerge(eventstream_state)
 
-        return destination_id
+@instrumented_task(name="sentry.tasks.unmerge", queue="unmerge")
+def unmerge(
+    project_id,
+    source_id,
+    destination_id,
+    fingerprints,
+    actor_id,
+    last_event=None,
+    batch_size=500,
+    source_fields_reset=False,
+    eventstream_state=None,
+    unmerge_id=None,
+):
+    source = Group.objects.get(project_id=project_id, id=source_id)
 
-    source_events = []
-    destination_events = []
+    caches = get_caches()
 
-    for event in events:
-        (destination_events if get_fingerprint(event) in fingerprints else source_events).append(
-            event
+    project = caches["Project"](project_id)
+
+    # Callers should pass an id, otherwise a redelivered first task cannot
+    # find the progress of the original delivery.
+    if unmerge_id is None:
+        unmerge_id = uuid4().hex
+
+    progress = UnmergeProgress(unmerge_id)
+    state = progress.get()
+    if state is not None:
+        destination_id = state["destination_id"]
+        last_event = state["last_event"]
+        source_fields_reset = state["source_fields_reset"]
+        eventstream_state = state["eventstream_state"]
+    else:
+        state = {"events": 0, "batches": 0}
+
+    # On the first iteration of this loop, we clear out all of the
+    # denormalizations from the source group so that we can have a clean slate
+    # for the new, repaired data.
+    if last_event is None:
+        fingerprints = lock_hashes(project_id, source_id, fingerprints)
+        truncate_denormalizations(project, source)
+
+    # Several batches are processed by every task.  The next batch is fetched
+    # from Snuba while the current one is being processed.
+    repairs = DenormalizationRepairs(caches, project)
+    checkpoint_batches = max(options.get("unmerge.checkpoint-batches"), 1)
+    events_processed = 0
+    done = False
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_events, project_id, source_id, last_event, batch_size)
+        for batch in range(checkpoint_batches):
+            with metrics.timer("unmerge.fetch_wait"):
+                events = future.result()
+
+            # If there are no more events to process, we're done with the migration.
+            done = len(events) < batch_size
+            if not events:
+                break
+
+            last_event = {"timestamp": events[-1].timestamp, "event_id": events[-1].event_id}
+            if not done and batch + 1 < checkpoint_batches:
+                future = executor.submit(
+                    fetch_events, project_id, source_id, last_event, batch_size
+                )
+
+            eventstore.bind_nodes(events, "data")
+
+            source_events = []
+            destination_events = []
+
+            for event in events:
+                (
+                    destination_events if get_fingerprint(event) in fingerprints else source_events
+                ).append(event)
+
+            if source_events:
+                if not source_fields_reset:
+                    source.update(**get_group_creation_attributes(caches, source_events))
+                    source_fields_reset = True
+                else:
+                    source.update(**get_group_backfill_attributes(caches, source, source_events))
+
+            (destination_id, eventstream_state) = migrate_events(
+                caches,
+                project,
+                source_id,
+                destination_id,
+                fingerprints,
+                destination_events,
+                actor_id,
+                eventstream_state,
+            )
+
+            repairs.add(events)
+            with metrics.timer("unmerge.flush_repairs"):
+                repairs.flush()
+            events_processed += len(events)
+            state["events"] += len(events)
+            state["batches"] += 1
+
+            if done:
+                break
+
+            # The events of this batch have left the source group, so a task
+            # that crashes has to resume after them, and their repairs must
+            # already be written.
+            progress.save(
+                destination_id=destination_id,
+                last_event=last_event,
+                source_fields_reset=source_fields_reset,
+                eventstream_state=eventstream_state,
+                events=state["events"],
+                batches=state["batches"],
+            )
+
+    metrics.incr("unmerge.events", amount=events_processed)
+
+    if done:
+        progress.delete()
+        unlock_hashes(project_id, fingerprints)
+        logger.warning(
+            "Unmerge complete (eventstream state: %s)",
+            eventstream_state,
+            extra={"unmerge_id": unmerge_id, "events": state["events"]},
         )
+        if eventstream_state:
+            eventstream.end_unmerge(eventstream_state)
 
-    if source_events:
-        if not source_fields_reset:
-            source.update(**get_group_creation_attributes(caches, source_events))
-            source_fields_reset = True
-        else:
-            source.update(**get_group_backfill_attributes(caches, source, source_events))
+        return destination_id
 
-    (destination_id, eventstream_state) = migrate_events(
-        caches,
-        project,
-        source_id,
-        destination_id,
-        fingerprints,
-        destination_events,
-        actor_id,
-        eventstream_state,
+    logger.info(
+        "unmerge.checkpoint",
+        extra={
+            "unmerge_id": unmerge_id,
+            "source_id": source_id,
+            "destination_id": destination_id,
+            "events": state["events"],
+            "batches": state["batches"],
+        },
     )
 
-    repair_denormalizations(caches, project, events)
-
     unmerge.delay(
         project_id,
         source_id,
         destination_id,
         fingerprints,
         actor_id,
-        last_event={"timestamp": events[-1].timestamp, "event_id": events[-1].event_id},
+        last_event=last_event,
         batch_size=batch_size,
         source_fields_reset=source_fields_reset,
         eventstream_state=eventstream_state,
+        unmerge_id=unmerge_id,
     )
@@ -160,8 +160,12 @@ def bulk_delete_objects(
             params.append(value)
 
     for column, value in filters.items():
-        query.append("%s = %%s" % (quote_name(column),))
-        params.append(value)
+        if column.endswith("__in"):
+            query.append("%s = any(%%s)" % (quote_name(column[: -len("__in")]),))
+            params.append(list(value))
+        else:
+            query.append("%s = %%s" % (quote_name(column),))
+            params.append(value)
 
     query = """
         delete from %(table)s
@@ -9,6 +9,7 @@ from sentry.testutils import APITestCase, SnubaTestCase
 from sentry.testutils.factories import DEFAULT_EVENT_DATA
 from sentry.testutils.helpers.datetime import iso_format, before_now
 from sentry.eventstream.snuba import SnubaEventStream
+from sentry.utils.compat import mock
 
 
 class GroupHashesTest(APITestCase, SnubaTestCase):
@@ -109,5 +110,11 @@ class GroupHashesTest(APITestCase, SnubaTestCase):
             ]
         )
 
-        response = self.client.delete(url, format="json")
+        with mock.patch("sentry.api.endpoints.group_hashes.unmerge") as mock_unmerge:
+            response = self.client.delete(url, format="json")
         assert response.status_code == 202, response.content
+
+        unmerge_id = response.data["unmergeId"]
+        mock_unmerge.delay.assert_called_once_with(
+            group.project_id, group.id, None, mock.ANY, self.user.id, unmerge_id=unmerge_id,
+        )
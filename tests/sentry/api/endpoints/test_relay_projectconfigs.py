@@ -260,7 +260,12 @@ def test_untrusted_external_relays_should_not_receive_configs(
 @pytest.fixture
 def projectconfig_cache_set(monkeypatch):
     calls = []
-    monkeypatch.setattr("sentry.relay.projectconfig_cache.set_many", calls.append)
+
+    def set_many(configs, invalidate=True):
+        assert not invalidate
+        calls.append(configs)
+
+    monkeypatch.setattr("sentry.relay.projectconfig_cache.set_many", set_many)
     return calls
 
 
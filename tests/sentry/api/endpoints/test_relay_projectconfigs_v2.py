@@ -13,6 +13,7 @@ from sentry.constants import ObjectStatus
 from sentry.utils import safe, json
 from sentry.models.relay import Relay
 from sentry.models import ProjectKey, ProjectKeyStatus
+from sentry.testutils.helpers import override_options
 
 from sentry_relay.auth import generate_key_pair
 
@@ -259,7 +260,12 @@ def test_untrusted_external_relays_should_not_receive_configs(
 @pytest.fixture
 def projectconfig_cache_set(monkeypatch):
     calls = []
-    monkeypatch.setattr("sentry.relay.projectconfig_cache.set_many", calls.append)
+
+    def set_many(configs, invalidate=True):
+        assert not invalidate
+        calls.append(configs)
+
+    monkeypatch.setattr("sentry.relay.projectconfig_cache.set_many", set_many)
     return calls
 
 
@@ -303,6 +309,34 @@ def test_relay_projectconfig_cache_full_config(
     assert redis_cfg == http_cfg
 
 
+@pytest.mark.django_db
+def test_relay_projectconfig_cache_serves_cached_configs(
+    call_endpoint, default_projectkey, projectconfig_cache_set, monkeypatch
+):
+    """
+    With serving from the cache enabled, cached configs are embedded into the
+    response as they are and only missing configs are computed.
+    """
+    missing_key = ProjectKey.generate_api_key()
+    cached_cfg = {"disabled": False, "slug": "cached"}
+    monkeypatch.setattr(
+        "sentry.relay.projectconfig_cache.get_raw_many",
+        lambda keys: {six.text_type(default_projectkey.public_key): json.dumps(cached_cfg)},
+    )
+
+    with override_options({"relay.serve-cached-project-configs": True}):
+        result, status_code = call_endpoint(
+            full_config=True, public_keys=[default_projectkey.public_key, missing_key]
+        )
+
+    assert status_code < 400
+    assert result == {
+        "configs": {default_projectkey.public_key: cached_cfg, missing_key: {"disabled": True}}
+    }
+    (call,) = projectconfig_cache_set
+    assert list(call) == [missing_key]
+
+
 @pytest.mark.django_db
 def test_relay_nonexistent_project(call_endpoint, projectconfig_cache_set, task_runner):
     wrong_public_key = ProjectKey.generate_api_key()
@@ -1,8 +1,14 @@
 from __future__ import absolute_import
 
 import copy
+import pytest
 
-from sentry.attachments.base import CachedAttachment, BaseAttachmentCache
+from sentry.attachments.base import (
+    BaseAttachmentCache,
+    CachedAttachment,
+    MissingAttachmentChunks,
+)
+from sentry.utils.compat import mock
 
 
 class InMemoryCache(object):
@@ -30,6 +36,18 @@ class InMemoryCache(object):
     def delete(self, key):
         del self.data[key]
 
+    def get_many(self, keys, raw=False):
+        values = ((key, self.get(key, raw=raw)) for key in keys)
+        return {key: value for key, value in values if value is not None}
+
+    def set_many(self, mapping, timeout=None, raw=False):
+        for key, value in mapping.items():
+            self.set(key, value, timeout, raw=raw)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
 
 def test_meta_basic():
     att = CachedAttachment(key="c:foo", id=123, name="lol.txt", content_type="text/plain", chunks=3)
@@ -112,3 +130,48 @@ def test_basic_rate_limited():
     assert att2.id == att.id == 0
     assert att2.data == att.data == b"Hello World! Bye."
     assert att2.rate_limited is True
+
+
+def test_chunked_stream():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    chunks = [b"chunk%d " % i for i in range(10)]
+    for i, chunk in enumerate(chunks):
+        cache.set_chunk("c:foo", 123, i, chunk)
+
+    att = CachedAttachment(key="c:foo", id=123, name="lol.txt", chunks=len(chunks), cache=cache)
+
+    with mock.patch.object(data, "get_many", wraps=data.get_many) as get_many:
+        stream = att.getfile()
+        assert get_many.call_count == 1
+
+        assert stream.read(3) == b"chu"
+        assert stream.read(5) == b"nk0 c"
+        assert stream.read() == b"".join(chunks)[8:]
+        assert stream.read() == b""
+
+        # 10 chunks are fetched in batches of ATTACHMENT_PREFETCH_CHUNKS
+        assert get_many.call_count == 3
+
+    assert b"".join(att.getfile()) == b"".join(chunks)
+
+
+def test_chunked_stream_missing_chunks():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    for i in range(6):
+        cache.set_chunk("c:foo", 123, i, b"Hello World! ")
+    del data.data["c:foo:a:123:5"]
+
+    att = CachedAttachment(key="c:foo", id=123, name="lol.txt", chunks=6, cache=cache)
+    stream = att.getfile()
+    assert stream.read(13) == b"Hello World! "
+
+    with pytest.raises(MissingAttachmentChunks):
+        stream.read()
+
+    del data.data["c:foo:a:123:0"]
+    with pytest.raises(MissingAttachmentChunks):
+        att.getfile()
@@ -2,6 +2,8 @@
 
 from __future__ import absolute_import
 
+from contextlib import contextmanager
+
 from sentry.utils.compat import mock
 import zlib
 import pytest
@@ -10,6 +12,11 @@ from sentry.cache.redis import RedisClusterCache, RbCache
 from sentry.utils.imports import import_string
 
 
+class FakeResult(object):
+    def __init__(self, value):
+        self.value = value
+
+
 class FakeClient(object):
     def __init__(self):
         self.data = {}
@@ -17,6 +24,21 @@ class FakeClient(object):
     def get(self, key):
         return self.data[key]
 
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        return [self.client.get(key) for key in self.commands]
+
 
 @pytest.fixture
 def mock_client():
@@ -29,6 +51,14 @@ def mocked_attachment_cache(request, mock_client):
         def get_routing_client(self):
             return mock_client
 
+        @contextmanager
+        def map(self):
+            class MappingClient(object):
+                def get(self, key):
+                    return FakeResult(mock_client.get(key))
+
+            yield MappingClient()
+
     if request.param == "rb":
         with mock.patch(
             "sentry.cache.redis.get_cluster_from_options", return_value=(RbCluster(), {})
@@ -2,11 +2,15 @@
 
 from __future__ import absolute_import
 
+import logging
+
 from sentry.utils.compat import mock
 
 from datetime import timedelta
+from django.db import OperationalError
 from django.utils import timezone
 from sentry.buffer.base import Buffer
+from sentry.event_manager import ScoreClause
 from sentry.models import Group, Organization, Project, Release, ReleaseProject, Team
 from sentry.testutils import TestCase
 
@@ -76,3 +80,78 @@ class BufferTest(TestCase):
         self.buf.process(Group, columns, filters, {"last_seen": the_date}, signal_only=True)
         group.refresh_from_db()
         assert group.times_seen == prev_times_seen
+
+    def test_process_batch(self):
+        groups = [Group.objects.create(project=Project(id=1)) for _ in range(3)]
+        the_date = timezone.now() + timedelta(days=5)
+        incrs = [
+            (Group, {"times_seen": i + 1}, {"id": group.id}, {"last_seen": the_date}, None)
+            for i, group in enumerate(groups)
+        ]
+        # Would update the same row twice in the statement
+        incrs.append(
+            (Group, {"times_seen": 1}, {"id": groups[0].id}, {"last_seen": the_date}, None)
+        )
+
+        with mock.patch.object(self.buf, "process", wraps=self.buf.process) as process:
+            self.buf.process_batch(incrs)
+        process.assert_called_once_with(*incrs[-1])
+
+        for i, group in enumerate(groups):
+            group_ = Group.objects.get(id=group.id)
+            times_seen = group.times_seen + i + 1 + (1 if i == 0 else 0)
+            assert group_.times_seen == times_seen
+            assert group_.last_seen == the_date
+            assert abs(group_.score - Group.calculate_score(times_seen, the_date)) <= 1
+
+    def test_process_batch_existing_aggregates(self):
+        # Extras as sent by ``_process_existing_aggregate``
+        groups = [Group.objects.create(project=Project(id=1)) for _ in range(4)]
+        the_date = timezone.now() + timedelta(days=5)
+        first_seen = timezone.now() - timedelta(days=5)
+        incrs = []
+        for i, group in enumerate(groups):
+            extra = {
+                "last_seen": the_date,
+                "score": ScoreClause(group),
+                "data": {"metadata": {"title": "foo %d" % i}},
+            }
+            if i < 2:
+                extra["first_seen"] = first_seen
+                extra["level"] = logging.WARNING
+            incrs.append((Group, {"times_seen": 1}, {"id": group.id}, extra, None))
+
+        with mock.patch.object(self.buf, "process", wraps=self.buf.process) as process:
+            self.buf.process_batch(incrs)
+        assert not process.called
+
+        for i, group in enumerate(groups):
+            group_ = Group.objects.get(id=group.id)
+            assert group_.times_seen == group.times_seen + 1
+            assert group_.last_seen == the_date
+            assert group_.data["metadata"] == {"title": "foo %d" % i}
+            assert abs(group_.score - Group.calculate_score(group_.times_seen, the_date)) <= 1
+            if i < 2:
+                assert group_.first_seen == first_seen
+                assert group_.level == logging.WARNING
+            else:
+                assert group_.first_seen == group.first_seen
+                assert group_.level == group.level
+
+    def test_process_batch_without_existing_row(self):
+        group = Group.objects.create(project=Project(id=1))
+        incrs = [
+            (Group, {"times_seen": 1}, {"message": "foo bar", "project_id": 1}, {}, None),
+            (Group, {"times_seen": 1}, {"message": group.message, "project_id": 1}, {}, None),
+        ]
+        self.buf.process_batch(incrs)
+        assert Group.objects.get(id=group.id).times_seen == group.times_seen + 1
+        assert Group.objects.get(message="foo bar").times_seen == 2
+
+    def test_process_batch_returns_database_errors(self):
+        incrs = [
+            (Group, {"times_seen": 1}, {"pk": 1}, {}, True),
+            (Group, {"times_seen": 1}, {"pk": 2}, {}, True),
+        ]
+        with mock.patch.object(self.buf, "process", side_effect=[OperationalError(), ValueError()]):
+            assert self.buf.process_batch(incrs) == incrs[:1]
@@ -8,6 +8,7 @@ from django.utils.encoding import force_text
 from sentry.utils.compat import mock, pickle
 
 from datetime import datetime
+from time import time
 from django.utils import timezone
 from sentry.buffer.redis import RedisBuffer
 from sentry.models import Group, Project
@@ -49,6 +50,76 @@ class RedisBufferTest(TestCase):
         client = self.buf.cluster.get_routing_client()
         assert client.zrange("b:p", 0, -1) == []
 
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_slices(self, process_incr):
+        self.buf.incr_batch_size = 2
+        self.buf.pending_scan_size = 1
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3})
+        self.buf.process_pending()
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo", "bar"]}),
+            mock.call(kwargs={"batch_keys": ["baz"]}),
+        ]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == []
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_max_inflight_batches(self, process_incr):
+        self.buf.incr_batch_size = 2
+        self.buf.max_inflight_batches = 1
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3})
+        self.buf.process_pending()
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo", "bar"], "batch_id": mock.ANY})
+        ]
+        batch_id = process_incr.apply_async.call_args[1]["kwargs"]["batch_id"]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == [b"baz"]
+        assert client.zrange("b:inflight-batches", 0, -1) == [batch_id.encode("utf-8")]
+
+        # The queued batch is still in flight
+        self.buf.process_pending()
+        assert len(process_incr.apply_async.mock_calls) == 1
+
+        self.buf.process(batch_keys=["foo", "bar"], batch_id=batch_id)
+        assert client.zcard("b:inflight-batches") == 0
+        self.buf.process_pending()
+        process_incr.apply_async.assert_called_with(
+            kwargs={"batch_keys": ["baz"], "batch_id": mock.ANY}
+        )
+        assert client.zrange("b:p", 0, -1) == []
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_max_inflight_batches_lost_task(self, process_incr):
+        self.buf.incr_batch_size = 1
+        self.buf.max_inflight_batches = 1
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2})
+
+        now = time()
+        with mock.patch("sentry.buffer.redis.time", return_value=now):
+            self.buf.process_pending()
+        assert len(process_incr.apply_async.mock_calls) == 1
+
+        # The task of the first batch never runs, so its batch is only
+        # forgotten once it is older than ``inflight_expire``.
+        with mock.patch("sentry.buffer.redis.time", return_value=now + 60):
+            self.buf.process_pending()
+        assert len(process_incr.apply_async.mock_calls) == 1
+
+        with mock.patch(
+            "sentry.buffer.redis.time", return_value=now + self.buf.inflight_expire + 1
+        ):
+            self.buf.process_pending()
+        assert len(process_incr.apply_async.mock_calls) == 2
+        process_incr.apply_async.assert_called_with(
+            kwargs={"batch_keys": ["bar"], "batch_id": mock.ANY}
+        )
+        client = self.buf.cluster.get_routing_client()
+        assert client.zcard("b:inflight-batches") == 1
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.base.Buffer.process")
     def test_process_does_bubble_up_json(self, process):
@@ -125,6 +196,54 @@ class RedisBufferTest(TestCase):
         pending = client.zrange("b:p", 0, -1)
         assert pending == [b"foo"]
 
+    @mock.patch("sentry.buffer.redis.process_incr", mock.Mock())
+    def test_incr_coalesces_writes(self):
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        buf = RedisBuffer(incr_coalesce_window=60, flush_on_shutdown=False)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1, "datetime": now}
+        key = buf._make_key(model, filters)
+
+        buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar"})
+        buf.incr(model, {"times_seen": 2}, filters, extra={"foo": "baz"}, signal_only=True)
+        buf.incr(model, {"times_seen": 1}, {"pk": 2, "datetime": now})
+
+        # nothing is written until the window elapses or a flush is forced
+        assert client.hgetall(key) == {}
+        assert client.zrange("b:p", 0, -1) == []
+
+        buf.flush_coalesced()
+
+        result = {force_text(k): v for k, v in six.iteritems(client.hgetall(key))}
+        assert pickle.loads(result.pop("f")) == filters
+        assert pickle.loads(result.pop("e+foo")) == "baz"
+        assert result == {"i+times_seen": b"3", "m": b"mock.mock.Mock", "s": b"1"}
+        assert len(client.zrange("b:p", 0, -1)) == 2
+
+        # a second flush without pending increments is a noop
+        buf.flush_coalesced()
+        assert client.hget(key, "i+times_seen") == b"3"
+
+    @mock.patch("sentry.buffer.redis.process_incr", mock.Mock())
+    def test_incr_coalesce_flushes_at_max_keys(self):
+        buf = RedisBuffer(
+            incr_coalesce_window=60, incr_coalesce_max_keys=2, flush_on_shutdown=False
+        )
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+
+        buf.incr(model, {"times_seen": 1}, {"pk": 1})
+        buf.incr(model, {"times_seen": 1}, {"pk": 1})
+        assert client.zrange("b:p", 0, -1) == []
+
+        buf.incr(model, {"times_seen": 1}, {"pk": 2})
+        assert len(client.zrange("b:p", 0, -1)) == 2
+        assert client.hget(buf._make_key(model, {"pk": 1}), "i+times_seen") == b"2"
+        assert client.hget(buf._make_key(model, {"pk": 2}), "i+times_seen") == b"1"
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.redis.process_incr")
     @mock.patch("sentry.buffer.redis.process_pending")
@@ -207,3 +326,77 @@ class RedisBufferTest(TestCase):
             "s": "1"
         }
     """
+
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_batch_keys(self, process_batch):
+        client = self.buf.cluster.get_routing_client()
+        for key, pk in (("foo", 1), ("bar", 2)):
+            client.hmset(
+                key,
+                {
+                    "e+foo": '["s","bar"]',
+                    "f": '{"pk": ["i","%d"]}' % pk,
+                    "i+times_seen": "2",
+                    "m": "sentry.models.Group",
+                },
+            )
+        self.buf.process(batch_keys=["foo", "bar", "baz"])
+        process_batch.assert_called_once_with(
+            [
+                (Group, {"times_seen": 2}, {"pk": 1}, {"foo": "bar"}, None),
+                (Group, {"times_seen": 2}, {"pk": 2}, {"foo": "bar"}, None),
+            ]
+        )
+        assert client.hgetall("foo") == {}
+        assert client.get("l:foo") is None
+
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_batch_keys_keeps_failed(self, process_batch):
+        process_batch.side_effect = lambda incrs: incrs[:1]
+        client = self.buf.cluster.get_routing_client()
+        for key, pk in (("foo", 1), ("bar", 2)):
+            client.hmset(
+                key,
+                {"f": '{"pk": ["i","%d"]}' % pk, "i+times_seen": "2", "m": "sentry.models.Group"},
+            )
+        self.buf.process(batch_keys=["foo", "bar"])
+        assert client.hget("foo", "i+times_seen") == b"2"
+        assert client.hget("foo", "r") == b"1"
+        assert client.hgetall("bar") == {}
+        assert client.zrange("b:p", 0, -1) == [b"foo"]
+
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_batch_keys_drops_failed_after_retries(self, process_batch):
+        process_batch.side_effect = lambda incrs: incrs
+        self.buf.incr_max_retries = 2
+        client = self.buf.cluster.get_routing_client()
+        client.hmset(
+            "foo",
+            {"f": '{"pk": ["i","1"]}', "i+times_seen": "2", "m": "sentry.models.Group", "r": "1"},
+        )
+        self.buf.process(batch_keys=["foo"])
+        assert client.hget("foo", "r") == b"2"
+
+        self.buf.process(batch_keys=["foo"])
+        assert client.hgetall("foo") == {}
+        assert client.zrange("b:p", 0, -1) == []
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_max_inflight_batches_shared(self, process_incr):
+        self.buf.incr_batch_size = 1
+        self.buf.max_inflight_batches = 2
+        self.buf.pending_partitions = 2
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p:0", {"foo": 1, "bar": 2})
+            client.zadd("b:p:1", {"baz": 1, "qux": 2})
+
+        # Partitions drain concurrently and must share the cap
+        self.buf.process_pending(partition=0)
+        self.buf.process_pending(partition=1)
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo"], "batch_id": mock.ANY}),
+            mock.call(kwargs={"batch_keys": ["bar"], "batch_id": mock.ANY}),
+        ]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zcard("b:inflight-batches") == 2
+        assert client.zrange("b:p:1", 0, -1) == [b"baz", b"qux"]
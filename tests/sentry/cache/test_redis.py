@@ -23,3 +23,22 @@ class RedisCacheTest(TestCase):
 
         with self.assertRaises(ValueTooLarge):
             self.backend.set("foo", "x" * (RedisCache.max_size + 1), 0)
+
+    def test_many(self):
+        self.backend.set_many({"foo": {"foo": "bar"}, "bar": [1, 2]}, 50)
+
+        assert self.backend.get("foo") == {"foo": "bar"}
+        assert self.backend.get_many(["foo", "bar", "baz"]) == {
+            "foo": {"foo": "bar"},
+            "bar": [1, 2],
+        }
+
+        self.backend.set_many({"raw": b"raw"}, 50, raw=True)
+        assert self.backend.get_many(["raw"], raw=True) == {"raw": b"raw"}
+
+        self.backend.delete_many(["foo", "bar", "raw"])
+        assert self.backend.get_many(["foo", "bar", "raw"]) == {}
+
+        with self.assertRaises(ValueTooLarge):
+            self.backend.set_many({"foo": "bar", "bar": "x" * (RedisCache.max_size + 1)}, 0)
+        assert self.backend.get("foo") is None
@@ -220,6 +220,51 @@ class AssembleDownloadTest(TestCase, SnubaTestCase):
 
         assert emailer.called
 
+    @patch("sentry.data_export.models.ExportedData.email_success")
+    def test_discover_sharded(self, emailer):
+        de = ExportedData.objects.create(
+            user=self.user,
+            organization=self.org,
+            query_type=ExportQueryType.DISCOVER,
+            query_info={
+                "project": [self.project.id],
+                "field": ["title"],
+                "query": "",
+                "statsPeriod": "1h",
+            },
+        )
+        with self.tasks():
+            assemble_download(de.id, batch_size=1, shards=3)
+        de = ExportedData.objects.get(id=de.id)
+        assert de.date_finished is not None
+        assert isinstance(de.file, File)
+        # Convert raw csv to list of line-strings
+        header, raw1, raw2, raw3 = de.file.getfile().read().strip().split(b"\r\n")
+        assert header == b"title"
+
+        assert raw1.startswith(b"<unlabeled event>")
+        assert raw2.startswith(b"<unlabeled event>")
+        assert raw3.startswith(b"<unlabeled event>")
+
+        assert emailer.called
+
+    @patch("sentry.data_export.models.ExportedData.email_success")
+    def test_discover_sharded_aggregates(self, emailer):
+        de = ExportedData.objects.create(
+            user=self.user,
+            organization=self.org,
+            query_type=ExportQueryType.DISCOVER,
+            query_info={"project": [self.project.id], "field": ["count()"], "query": ""},
+        )
+        with patch("sentry.data_export.tasks.start_sharded_export") as start_sharded_export:
+            with self.tasks():
+                assemble_download(de.id, shards=3)
+        assert not start_sharded_export.called
+        de = ExportedData.objects.get(id=de.id)
+        header, raw = de.file.getfile().read().strip().split(b"\r\n")
+        assert header == b"count"
+        assert raw == b"3"
+
     @patch("sentry.data_export.models.ExportedData.email_success")
     def test_discover_respects_selected_environment(self, emailer):
         de = ExportedData.objects.create(
@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+
+from sentry.deletions.base import (
+    BaseRelation,
+    BulkModelDeletionTask,
+    ModelRelation,
+    merge_relations,
+)
+from sentry.models import Group, GroupMeta, GroupSeen
+from sentry.tasks.deletion import split_id_range
+
+
+def test_merge_relations():
+    event_data = BaseRelation({"group_id": 1}, None)
+    relations = merge_relations(
+        [
+            ModelRelation(GroupMeta, {"group_id": 1}),
+            ModelRelation(GroupSeen, {"group_id": 1}, BulkModelDeletionTask),
+            event_data,
+            ModelRelation(GroupMeta, {"group_id": 2}),
+            ModelRelation(GroupSeen, {"group_id": 2}, BulkModelDeletionTask),
+            ModelRelation(Group, {"project__id": 1}),
+        ]
+    )
+
+    assert [r.params for r in relations] == [
+        {"model": GroupMeta, "query": {"group_id__in": [1, 2]}},
+        {"model": GroupSeen, "query": {"group_id__in": [1, 2]}},
+        {"group_id": 1},
+        {"model": Group, "query": {"project__id": 1}},
+    ]
+    assert relations[1].task is BulkModelDeletionTask
+    assert relations[2] is event_data
+
+
+def test_split_id_range():
+    assert split_id_range(1, 10, 3) == [(1, 3), (4, 6), (7, 10)]
+    assert split_id_range(5, 6, 3) == [(5, 5), (6, 6)]
+    assert split_id_range(5, 5, 3) == [(5, 5)]
@@ -18,8 +18,9 @@ from sentry.models import (
     ScheduledDeletion,
     ProjectDebugFile,
 )
-from sentry.tasks.deletion import run_deletion
+from sentry.tasks.deletion import run_deletion, run_deletion_shard
 from sentry.testutils import TestCase
+from sentry.utils.compat import mock
 
 
 class DeleteProjectTest(TestCase):
@@ -89,3 +90,26 @@ class DeleteProjectTest(TestCase):
         assert Commit.objects.filter(id=commit.id).exists()
         assert not ProjectDebugFile.objects.filter(id=dif.id).exists()
         assert not File.objects.filter(id=file.id).exists()
+
+    @mock.patch("sentry.tasks.deletion.MIN_SHARD_ID_SPAN", 0)
+    def test_sharded(self):
+        project = self.create_project(name="test")
+        groups = [self.create_group(project=project) for _ in range(5)]
+        for group in groups:
+            GroupMeta.objects.create(group=group, key="foo", value="bar")
+        other_group = self.create_group()
+
+        deletion = ScheduledDeletion.schedule(project, days=0)
+        deletion.update(in_progress=True)
+
+        with self.options({"deletions.shards": 3}), mock.patch(
+            "sentry.tasks.deletion.run_deletion_shard.delay", wraps=run_deletion_shard.delay,
+        ) as shard_delay, self.tasks():
+            run_deletion(deletion.id)
+
+        assert shard_delay.call_count >= 3
+        assert not Project.objects.filter(id=project.id).exists()
+        assert not Group.objects.filter(project_id=project.id).exists()
+        assert not GroupMeta.objects.filter(group__in=groups).exists()
+        assert Group.objects.filter(id=other_group.id).exists()
+        assert not ScheduledDeletion.objects.filter(id=deletion.id).exists()
@@ -21,6 +21,8 @@ from sentry.event_manager import (
     EventManager,
     EventUser,
     has_pending_commit_resolution,
+    _nodestore_save_many,
+    _tsdb_record_all_metrics,
 )
 from sentry.grouping.utils import hash_from_values
 from sentry.models import (
@@ -109,6 +111,46 @@ class EventManagerTest(TestCase):
 
         assert eventstream_insert.call_count == 2
 
+    def test_save_many_batches_writes(self):
+        timestamp = timezone.now().replace(microsecond=0)
+        environment = self.create_environment(project=self.project)
+        jobs = []
+        for i in range(3):
+            event = Event(
+                project_id=self.project.id, event_id=uuid.uuid4().hex, data={"timestamp": i},
+            )
+            jobs.append(
+                {
+                    "event": event,
+                    "project_id": self.project.id,
+                    "group": None,
+                    "release": None,
+                    "environment": environment,
+                    "user": EventUser(ident="%d" % (i % 2)),
+                }
+            )
+
+        with mock.patch.object(Event, "datetime", timestamp), mock.patch.object(
+            tsdb, "incr_multi"
+        ) as incr_multi, mock.patch.object(tsdb, "record_multi") as record_multi:
+            _tsdb_record_all_metrics(jobs)
+
+        incr_multi.assert_called_once_with(
+            [(tsdb.models.project, self.project.id, {"timestamp": timestamp, "count": 3})],
+            environment_id=environment.id,
+        )
+        (((records,), _),) = record_multi.call_args_list
+        assert [(model, key, sorted(values)) for model, key, values in records] == [
+            (tsdb.models.users_affected_by_project, self.project.id, ["id:0", "id:1"])
+        ]
+
+        with mock.patch.object(nodestore, "set_multi") as set_multi:
+            _nodestore_save_many(jobs)
+
+        set_multi.assert_called_once_with(
+            {job["event"].data.id: job["event"].data.get_data_to_save() for job in jobs}
+        )
+
     def test_updates_group(self):
         timestamp = time() - 300
         manager = EventManager(
@@ -2,10 +2,13 @@
 
 from __future__ import absolute_import, print_function
 
+import copy
+import random
+
 import six
 import pytest
 
-from sentry.grouping.enhancer import Enhancements, InvalidEnhancerConfig
+from sentry.grouping.enhancer import Enhancements, InvalidEnhancerConfig, load_enhancements
 
 
 def dump_obj(obj):
@@ -205,3 +208,74 @@ def test_package_matching():
     assert not bool(
         bundled_rule.get_matching_frame_actions({"package": "/usr/lib/linux-gate.so"}, "native")
     )
+
+
+def _apply_naive(enhancement, frames, platform):
+    for rule in enhancement.iter_rules():
+        for idx, frame in enumerate(frames):
+            for action in rule.get_matching_frame_actions(frame, platform) or ():
+                action.apply_modifications_to_frame(frames, idx)
+
+
+def _make_frames(count, seed):
+    rng = random.Random(seed)
+    functions = ["fn_%d" % i for i in range(100)] + [
+        "std::panicking::begin_panic",
+        "core::fmt::write",
+        "RtlUserThreadStart",
+        "_start",
+        "main",
+    ]
+    modules = ["app.module_%d" % i for i in range(20)] + ["std::io", "core::ptr", None]
+    paths = ["/usr/lib/libc.so", "/code/game/whatever/main.c", "/foo/test.js", None]
+    return [
+        {
+            "function": rng.choice(functions),
+            "module": rng.choice(modules),
+            "abs_path": rng.choice(paths),
+            "package": rng.choice(paths),
+            "in_app": rng.choice([True, False, None]),
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("platform", ["native", "javascript"])
+def test_rule_index_matches_naive_evaluation(platform):
+    rng = random.Random(42)
+    lines = []
+    for i in range(300):
+        matchers = []
+        if rng.random() < 0.3:
+            matchers.append("family:%s" % rng.choice(["native", "javascript", "native,javascript"]))
+        choice = rng.random()
+        if choice < 0.4:
+            matchers.append("function:fn_%d%s" % (rng.randrange(100), rng.choice(["", "*"])))
+        elif choice < 0.6:
+            matchers.append("module:app.module_%d%s" % (rng.randrange(20), rng.choice(["", "*"])))
+        elif choice < 0.7:
+            matchers.append("!function:fn_%d" % rng.randrange(100))
+        elif choice < 0.8:
+            matchers.append("function:*_%d" % rng.randrange(100))
+        else:
+            matchers.append("path:**/%s" % rng.choice(["*.js", "*.so", "whatever/*"]))
+        if rng.random() < 0.3:
+            matchers.append("app:%s" % rng.choice(["yes", "no"]))
+        action = rng.choice(["+app", "-app", "^-group", "v+group", "v-app", "-group"])
+        lines.append("%s %s" % (" ".join(matchers), action))
+
+    enhancement = Enhancements.from_config_string("\n".join(lines), bases=["common:2019-03-23"])
+
+    for seed in range(5):
+        expected = _make_frames(200, seed)
+        frames = copy.deepcopy(expected)
+        _apply_naive(enhancement, expected, platform)
+        enhancement.apply_modifications_to_frame(frames, platform)
+        assert frames == expected
+
+
+def test_load_enhancements_is_cached():
+    dumped = Enhancements.from_config_string("function:foo -group").dumps()
+    enhancement = load_enhancements(dumped)
+    assert load_enhancements(dumped) is enhancement
+    assert enhancement.get_index() is enhancement.get_index()
@@ -6,6 +6,7 @@ import time
 
 from sentry.utils import json
 from sentry.ingest.ingest_consumer import (
+    IngestConsumerWorker,
     process_event,
     process_attachment_chunk,
     process_individual_attachment,
@@ -321,3 +322,62 @@ def test_individual_attachments_missing_chunks(default_project, factories, monke
     )
 
     assert not attachments
+
+
+@pytest.mark.django_db
+def test_concurrent_flush_keeps_event_order(default_project, monkeypatch):
+    calls = []
+
+    def recorder(name):
+        def inner(message, projects):
+            assert projects == {default_project.id: default_project}
+            calls.append((message["event_id"], name))
+
+        return inner
+
+    monkeypatch.setattr("sentry.ingest.ingest_consumer.process_event", recorder("event"))
+    monkeypatch.setattr(
+        "sentry.ingest.ingest_consumer.process_attachment_chunk", recorder("attachment_chunk")
+    )
+    monkeypatch.setattr(
+        "sentry.ingest.ingest_consumer.process_individual_attachment", recorder("attachment")
+    )
+
+    event_ids = [uuid.uuid4().hex for _ in range(10)]
+    batch = []
+    for event_id in event_ids:
+        for message_type in ("event", "attachment", "attachment_chunk"):
+            batch.append(
+                {"type": message_type, "event_id": event_id, "project_id": default_project.id}
+            )
+
+    worker = IngestConsumerWorker(concurrency=4)
+    try:
+        worker.flush_batch(batch)
+    finally:
+        worker.shutdown()
+
+    assert len(calls) == len(batch)
+    for event_id in event_ids:
+        assert [name for id, name in calls if id == event_id] == [
+            "attachment_chunk",
+            "event",
+            "attachment",
+        ]
+
+
+@pytest.mark.django_db
+def test_concurrent_flush_raises(default_project, monkeypatch):
+    def broken(message, projects):
+        raise ValueError("broken")
+
+    monkeypatch.setattr("sentry.ingest.ingest_consumer.process_event", broken)
+
+    worker = IngestConsumerWorker(concurrency=2)
+    try:
+        with pytest.raises(ValueError):
+            worker.flush_batch(
+                [{"type": "event", "event_id": "a" * 32, "project_id": default_project.id}]
+            )
+    finally:
+        worker.shutdown()
@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 
-from sentry.lang.javascript.cache import SourceCache
+from sentry.lang.javascript.cache import ParsedArtifactCache, SourceCache
 from unittest import TestCase
 
 
@@ -38,3 +38,29 @@ class BasicCacheTest(TestCase):
         # fall back to utf-8
         cache.add(url, "foobar".encode("utf-32"), encoding="utf-32")
         assert cache.get(url)[0] == u"foobar"
+
+
+class ParsedArtifactCacheTest(TestCase):
+    def test_lru_eviction(self):
+        cache = ParsedArtifactCache(max_size=10)
+
+        cache.set("a", "A", size=4)
+        cache.set("b", "B", size=4)
+        assert cache.get("a") == "A"
+
+        # "b" is the least recently used item and gets evicted
+        cache.set("c", "C", size=4)
+        assert cache.get("b") is None
+        assert cache.get("a") == "A"
+        assert cache.get("c") == "C"
+
+        # items larger than the cache are never stored
+        cache.set("d", "D", size=11)
+        assert cache.get("d") is None
+        assert len(cache) == 2
+
+    def test_disabled(self):
+        cache = ParsedArtifactCache(max_size=0)
+        assert not cache.enabled
+        cache.set("a", "A", size=1)
+        assert cache.get("a") is None
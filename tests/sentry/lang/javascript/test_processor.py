@@ -1,9 +1,11 @@
 from __future__ import absolute_import
 
+import base64
 import pytest
 import re
 import responses
 import six
+import time
 import unittest
 from symbolic import SourceMapTokenMatch
 
@@ -17,9 +19,13 @@ from sentry.lang.javascript.processor import (
     discover_sourcemap,
     fetch_sourcemap,
     fetch_file,
+    parse_sourcemap,
     generate_module,
     trim_line,
     fetch_release_file,
+    fetch_release_files,
+    get_release_file_key,
+    parsed_artifact_cache,
     UnparseableSourcemap,
     get_max_age,
     CACHE_CONTROL_MAX,
@@ -214,6 +220,36 @@ class FetchReleaseFileTest(TestCase):
 
         assert result == new_result
 
+    def test_bulk(self):
+        project = self.project
+        release = Release.objects.create(organization_id=project.organization_id, version="abc")
+        release.add_project(project)
+
+        for name, body in (("~/a.min.js", b"a"), ("http://example.com/b.min.js", b"b")):
+            file = File.objects.create(name=name, type="release.file", headers={})
+            file.putfile(six.BytesIO(body))
+            ReleaseFile.objects.create(
+                name=name, release=release, organization_id=project.organization_id, file=file
+            )
+
+        filenames = [
+            "http://example.com/a.min.js",
+            "http://example.com/b.min.js?foo",
+            "http://example.com/missing.js",
+        ]
+        results = fetch_release_files(filenames, release)
+
+        assert results["http://example.com/a.min.js"].body == b"a"
+        assert results["http://example.com/b.min.js?foo"].body == b"b"
+        assert results["http://example.com/missing.js"] is None
+
+        # both found and missing files are cached
+        with self.assertNumQueries(0):
+            assert fetch_release_files(filenames, release) == results
+
+        for filename in filenames:
+            assert fetch_release_file(filename, release) == results[filename]
+
 
 class FetchFileTest(TestCase):
     @responses.activate
@@ -929,3 +965,152 @@ class CacheSourceTest(TestCase):
         # now we have an error
         assert len(processor.cache.get_errors(abs_path)) == 1
         assert processor.cache.get_errors(abs_path)[0] == {"url": map_url, "type": "js_no_source"}
+
+    @responses.activate
+    def test_populate_source_cache_concurrently(self):
+        responses.add(
+            responses.GET,
+            "http://example.com/a.js",
+            body="console.log(1);\n//# sourceMappingURL=" + base64_sourcemap,
+        )
+        responses.add(responses.GET, "http://example.com/b.js", body="console.log(2);")
+        responses.add(responses.GET, "http://example.com/c.js", status=404)
+
+        processor = JavaScriptStacktraceProcessor(
+            data={}, stacktrace_infos=None, project=self.create_project()
+        )
+        frames = [
+            {"abs_path": "http://example.com/a.js", "lineno": 1},
+            {"abs_path": "http://example.com/b.js", "lineno": 1},
+            {"abs_path": "http://example.com/c.js", "lineno": 1},
+        ]
+
+        with self.settings(SENTRY_SOURCE_FETCH_CONCURRENCY=4):
+            processor.populate_source_cache(frames)
+
+        assert processor.cache.get("http://example.com/a.js")[0] == u"console.log(1);"
+        assert processor.cache.get("http://example.com/b.js")[0] == u"console.log(2);"
+        assert processor.sourcemaps.get_link("http://example.com/a.js")[1] is not None
+        assert processor.cache.get("http://example.com/c.js") is None
+        assert processor.cache.get_errors("http://example.com/c.js") == [
+            {
+                "type": EventError.FETCH_INVALID_HTTP_CODE,
+                "value": 404,
+                "url": "http://example.com/c.js",
+            }
+        ]
+
+    @patch("sentry.lang.javascript.processor.JavaScriptStacktraceProcessor.fetch_source")
+    def test_populate_source_cache_concurrently_timeout(self, mock_fetch_source):
+        mock_fetch_source.side_effect = lambda filename: time.sleep(1)
+
+        processor = JavaScriptStacktraceProcessor(
+            data={}, stacktrace_infos=None, project=self.create_project()
+        )
+        frames = [
+            {"abs_path": "http://example.com/a.js", "lineno": 1},
+            {"abs_path": "http://example.com/b.js", "lineno": 1},
+        ]
+
+        with self.settings(
+            SENTRY_SOURCE_FETCH_CONCURRENCY=4, SENTRY_SOURCE_FETCH_EVENT_TIMEOUT=0.1
+        ):
+            processor.populate_source_cache(frames)
+
+        for frame in frames:
+            assert processor.cache.get_errors(frame["abs_path"]) == [
+                {"type": EventError.FETCH_TIMEOUT, "url": frame["abs_path"], "timeout": 0.1}
+            ]
+
+    @patch("sentry.lang.javascript.processor.fetch_release_file")
+    def test_populate_source_cache_prefetches_release_files(self, mock_fetch_release_file):
+        project = self.create_project()
+        release = self.create_release(project=project, version="12.31.12")
+
+        for name in ("app:///a.js", "app:///b.js"):
+            file = File.objects.create(name=name, type="release.file", headers={})
+            file.putfile(six.BytesIO(b"console.log(1);"))
+            self.create_release_file(release=release, file=file, name=name)
+
+        processor = JavaScriptStacktraceProcessor(
+            data={"release": release.version}, stacktrace_infos=None, project=project
+        )
+        processor.release = release
+        processor.populate_source_cache(
+            [{"abs_path": "app:///a.js"}, {"abs_path": "app:///b.js"}, {"abs_path": "app:///c.js"}]
+        )
+
+        assert not mock_fetch_release_file.called
+        assert processor.cache.get("app:///a.js")[0] == u"console.log(1);"
+        assert processor.cache.get("app:///b.js")[0] == u"console.log(1);"
+        assert processor.cache.get_errors("app:///c.js") == [
+            {"type": EventError.JS_MISSING_SOURCE, "url": "app:///c.js"}
+        ]
+        assert not processor.release_files
+
+    def test_prefetch_release_files_does_not_read_bodies(self):
+        project = self.create_project()
+        release = self.create_release(project=project, version="12.31.12")
+
+        file = File.objects.create(name="app:///a.js", type="release.file", headers={})
+        file.putfile(six.BytesIO(b"console.log(1);"))
+        releasefile = self.create_release_file(release=release, file=file, name="app:///a.js")
+
+        processor = JavaScriptStacktraceProcessor(
+            data={"release": release.version}, stacktrace_infos=None, project=project
+        )
+        processor.release = release
+        with patch("sentry.lang.javascript.processor.read_release_file") as mock_read:
+            processor.prefetch_release_files(["app:///a.js", "app:///b.js"])
+
+        assert not mock_read.called
+        assert processor.release_files == {"app:///a.js": releasefile, "app:///b.js": None}
+
+
+class ParsedArtifactCacheTest(TestCase):
+    def setUp(self):
+        parsed_artifact_cache.clear()
+        self.release = self.create_release(project=self.project, version="12.31.12")
+
+    def tearDown(self):
+        parsed_artifact_cache.clear()
+
+    def create_artifact(self, name, body):
+        file = File.objects.create(name=name, type="release.file", headers={})
+        file.putfile(six.BytesIO(body))
+        return self.create_release_file(release=self.release, file=file, name=name)
+
+    def test_get_release_file_key(self):
+        releasefile = self.create_artifact("~/file.min.js", b"console.log(42);")
+
+        assert get_release_file_key("http://example.com/file.min.js", self.release) == (
+            self.release.id,
+            None,
+            releasefile.ident,
+            releasefile.file.checksum,
+        )
+        assert get_release_file_key("http://example.com/missing.js", self.release) is None
+
+    def test_sourcemap_is_shared_across_events(self):
+        abs_path = "app:///file.min.js"
+        self.create_artifact(abs_path, b"console.log(42);\n//# sourceMappingURL=file.min.js.map")
+        self.create_artifact(abs_path + ".map", base64.b64decode(base64_sourcemap[29:]))
+
+        with patch(
+            "sentry.lang.javascript.processor.parse_sourcemap", side_effect=parse_sourcemap,
+        ) as mock_parse_sourcemap:
+            for _ in range(3):
+                processor = JavaScriptStacktraceProcessor(
+                    data={"release": self.release.version},
+                    stacktrace_infos=None,
+                    project=self.project,
+                )
+                processor.release = self.release
+                processor.cache_source(abs_path)
+
+                assert processor.cache.get(abs_path)
+                assert processor.sourcemaps.get_link(abs_path)[1] is not None
+                assert not processor.cache.get_errors(abs_path)
+
+        assert mock_parse_sourcemap.call_count == 1
+        assert len(parsed_artifact_cache) == 2
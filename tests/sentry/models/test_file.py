@@ -1,12 +1,14 @@
 from __future__ import absolute_import
 
 import os
+import pytest
 
 from django.core.files.base import ContentFile
 
 from sentry.models import File, FileBlob, FileBlobIndex
+from sentry.models.file import _save_blob_contents
 from sentry.testutils import TestCase
-from sentry.utils.compat import map
+from sentry.utils.compat import map, mock
 
 
 class FileBlobTest(TestCase):
@@ -108,6 +110,72 @@ class FileTest(TestCase):
         with self.assertRaises(ValueError):
             fp.read()
 
+    def test_putfile_dedups_blobs(self):
+        existing = FileBlob.from_file(ContentFile(b"bbb"))
+
+        file1 = File.objects.create(name="baz.js", type="default")
+        with mock.patch(
+            "sentry.models.file._save_blob_contents", wraps=_save_blob_contents
+        ) as save_blob_contents:
+            results = file1.putfile(ContentFile(b"aaabbbaaaccc"), 3)
+
+        # "aaa" is uploaded once, "bbb" already exists
+        assert save_blob_contents.call_count == 2
+        assert [r.offset for r in results] == [0, 3, 6, 9]
+        assert results[1].blob == existing
+        assert results[0].blob == results[2].blob
+        assert file1.size == 12
+        assert FileBlobIndex.objects.filter(file=file1).count() == 4
+
+        with file1.getfile() as fp:
+            assert fp.read() == b"aaabbbaaaccc"
+
+    @mock.patch("sentry.models.file.MULTI_BLOB_UPLOAD_CONCURRENCY", 2)
+    def test_putfile_links_blobs_of_failed_upload(self):
+        class FailingFile(object):
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+
+            def read(self, size):
+                if not self.chunks:
+                    raise IOError("missing chunk")
+                return self.chunks.pop(0)
+
+        file1 = File.objects.create(name="baz.js", type="default")
+        with pytest.raises(IOError):
+            file1.putfile(FailingFile([b"aaa", b"bbb", b"ccc"]), 3)
+
+        # The blobs of the uploaded batch can be cleaned up with the file
+        assert [i.offset for i in FileBlobIndex.objects.filter(file=file1).order_by("offset")] == [
+            0,
+            3,
+        ]
+
+    def test_file_handling_read_ahead(self):
+        fileobj = ContentFile("foo bar baz".encode("utf-8"))
+        file1 = File.objects.create(name="baz.js", type="default", size=11)
+        file1.putfile(fileobj, 2)
+
+        with file1.getfile(read_ahead=2) as fp:
+            assert fp.read(3).decode("utf-8") == "foo"
+            assert fp.read().decode("utf-8") == " bar baz"
+            fp.seek(5)
+            assert fp.tell() == 5
+            assert fp.read(4).decode("utf-8") == "ar b"
+            fp.seek(1)
+            assert fp.read().decode("utf-8") == "oo bar baz"
+
+    def test_multi_chunk_read_ahead(self):
+        random_data = os.urandom(1 << 23)
+
+        fileobj = ContentFile(random_data)
+        file = File.objects.create(name="test.bin", type="default", size=len(random_data))
+        file.putfile(fileobj)
+
+        with self.options({"filestore.read-ahead": 4}):
+            f = file.getfile()
+        assert f.read() == random_data
+
     def test_multi_chunk_prefetch(self):
         random_data = os.urandom(1 << 25)
 
@@ -2,8 +2,12 @@
 
 from __future__ import absolute_import
 
+import time
+
 from sentry.models import Counter
+from sentry.models.counter import SHORT_ID_BLOCK_TTL, ShortIdAllocator
 from sentry.testutils import TestCase
+from sentry.utils.compat import mock
 
 
 class ProjectCounterTest(TestCase):
@@ -15,3 +19,29 @@ class ProjectCounterTest(TestCase):
 
         assert Counter.increment(project, 42) == 42
         assert Counter.increment(project, 1) == 43
+
+    def test_short_id_blocks(self):
+        project = self.create_project()
+        Counter.increment(project, 5)
+
+        allocator = ShortIdAllocator()
+        other_allocator = ShortIdAllocator()
+
+        assert [allocator.next(project, 3) for _ in range(4)] == [6, 7, 8, 9]
+        # Another process reserves the block after the ones of this process
+        assert other_allocator.next(project, 3) == 12
+        assert Counter.objects.get(project=project).value == 14
+
+        with mock.patch("time.time", return_value=time.time() + SHORT_ID_BLOCK_TTL):
+            # The rest of an expired block is skipped
+            assert allocator.next(project, 3) == 15
+
+        assert allocator.next(project, 1) == 18
+
+    def test_next_short_id(self):
+        project = self.create_project()
+
+        with self.options({"store.short-id-block-size": 10}):
+            assert [project.next_short_id() for _ in range(3)] == [1, 2, 3]
+
+        assert Counter.objects.get(project=project).value == 10
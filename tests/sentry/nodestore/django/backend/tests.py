@@ -2,9 +2,13 @@
 
 from __future__ import absolute_import
 
+import pytest
+
 from datetime import timedelta
 from django.utils import timezone
 
+from sentry.exceptions import InvalidConfiguration
+from sentry.nodestore.base import local_node_cache
 from sentry.nodestore.django.models import Node
 from sentry.nodestore.django.backend import DjangoNodeStorage
 from sentry.testutils import TestCase
@@ -131,3 +135,93 @@ class DjangoNodeStorageTest(TestCase):
             self.ns.get("node_4")
             self.ns.get("node_4")
             assert mock_get.call_count == 2
+
+    def test_local_cache(self):
+        node_1 = ("a" * 32, {"foo": "a"})
+        node_2 = ("b" * 32, {"foo": "b"})
+
+        for node_id, data in [node_1, node_2]:
+            Node.objects.create(id=node_id, data=data)
+
+        with self.settings(SENTRY_NODESTORE_LOCAL_CACHE_SIZE=1024 * 1024), mock.patch.object(
+            DjangoNodeStorage, "cache", None
+        ):
+            local_node_cache.clear()
+            self.addCleanup(local_node_cache.clear)
+
+            assert self.ns.get(node_1[0]) == node_1[1]
+
+            # Only the miss is fetched from the database
+            with mock.patch.object(
+                Node.objects, "filter", wraps=Node.objects.filter
+            ) as mock_filter:
+                assert self.ns.get_multi([node_1[0], node_2[0]]) == {
+                    node_1[0]: node_1[1],
+                    node_2[0]: node_2[1],
+                }
+                mock_filter.assert_called_once_with(id__in=[node_2[0]])
+
+            with mock.patch.object(Node.objects, "get") as mock_get:
+                assert self.ns.get(node_2[0]) == node_2[1]
+                assert mock_get.call_count == 0
+
+            # Readers get their own copy of the payload
+            self.ns.get(node_1[0])["foo"] = "changed"
+            assert self.ns.get(node_1[0]) == node_1[1]
+
+            self.ns.delete(node_1[0])
+            self.ns.delete_multi([node_2[0]])
+            assert len(local_node_cache) == 0
+            assert self.ns.get_multi([node_1[0], node_2[0]]) == {}
+
+
+class CompressedDjangoNodeStorageTest(TestCase):
+    def setUp(self):
+        self.ns = DjangoNodeStorage(compression="zlib")
+
+    def test_set_and_get(self):
+        self.ns.set("d2502ebbd7df41ceba8d3275595cac33", {"foo": "bar"})
+        raw = Node.objects.filter(id="d2502ebbd7df41ceba8d3275595cac33").values_list(
+            "data", flat=True
+        )[0]
+        assert raw.startswith("zlib:")
+        assert self.ns.decode_data(raw) == {"foo": "bar"}
+
+        with mock.patch.object(DjangoNodeStorage, "cache", None):
+            assert self.ns.get("d2502ebbd7df41ceba8d3275595cac33") == {"foo": "bar"}
+            assert self.ns.get("5394aa025b8e401ca6bc3ddee3130edc") is None
+
+    def test_set_multi_upserts(self):
+        self.ns.set("d2502ebbd7df41ceba8d3275595cac33", {"foo": "old"})
+        with self.assertNumQueries(1):
+            self.ns.set_multi(
+                {
+                    "d2502ebbd7df41ceba8d3275595cac33": {"foo": "bar"},
+                    "5394aa025b8e401ca6bc3ddee3130edc": {"foo": "baz"},
+                }
+            )
+
+        with mock.patch.object(DjangoNodeStorage, "cache", None):
+            assert self.ns.get_multi(
+                ["d2502ebbd7df41ceba8d3275595cac33", "5394aa025b8e401ca6bc3ddee3130edc"]
+            ) == {
+                "d2502ebbd7df41ceba8d3275595cac33": {"foo": "bar"},
+                "5394aa025b8e401ca6bc3ddee3130edc": {"foo": "baz"},
+            }
+
+    def test_reads_uncompressed_rows(self):
+        Node.objects.create(id="d2502ebbd7df41ceba8d3275595cac33", data={"foo": "bar"})
+        self.ns.set("5394aa025b8e401ca6bc3ddee3130edc", {"foo": "baz"})
+
+        with mock.patch.object(DjangoNodeStorage, "cache", None):
+            assert self.ns.get("d2502ebbd7df41ceba8d3275595cac33") == {"foo": "bar"}
+            assert self.ns.get_multi(
+                ["d2502ebbd7df41ceba8d3275595cac33", "5394aa025b8e401ca6bc3ddee3130edc"]
+            ) == {
+                "d2502ebbd7df41ceba8d3275595cac33": {"foo": "bar"},
+                "5394aa025b8e401ca6bc3ddee3130edc": {"foo": "baz"},
+            }
+
+    def test_invalid_compression(self):
+        with pytest.raises(InvalidConfiguration):
+            DjangoNodeStorage(compression="lzma")
@@ -2,8 +2,9 @@
 
 from __future__ import absolute_import
 
-from sentry.nodestore.base import NodeStorage
+from sentry.nodestore.base import LocalNodeCache, NodeStorage
 from sentry.testutils import TestCase
+from sentry.utils.compat import mock
 
 
 class NodeStorageTest(TestCase):
@@ -13,3 +14,43 @@ class NodeStorageTest(TestCase):
     def test_generate_id(self):
         result = self.ns.generate_id()
         assert result
+
+
+class LocalNodeCacheTest(TestCase):
+    def test_get_many(self):
+        cache = LocalNodeCache(max_size=1024, ttl=60)
+        cache.set_many({"a": {"foo": "a"}, "b": {"foo": "b"}})
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"foo": "a"}, "b": {"foo": "b"}}
+
+        cache.delete_many(["a"])
+        assert cache.get_many(["a", "b"]) == {"b": {"foo": "b"}}
+
+    def test_copies_nested_values(self):
+        cache = LocalNodeCache(max_size=1024, ttl=60)
+        data = {"exception": {"values": [{"type": "ValueError"}]}}
+        cache.set_many({"a": data})
+        data["exception"]["values"].append({"type": "TypeError"})
+
+        value = cache.get_many(["a"])["a"]
+        value["exception"]["values"][0]["type"] = "KeyError"
+        assert cache.get_many(["a"]) == {"a": {"exception": {"values": [{"type": "ValueError"}]}}}
+
+    def test_evicts_least_recently_used(self):
+        # {"foo": "a"} is 11 bytes of JSON
+        cache = LocalNodeCache(max_size=30, ttl=60)
+        cache.set_many({"a": {"foo": "a"}})
+        cache.set_many({"b": {"foo": "b"}})
+        assert cache.get_many(["a"]) == {"a": {"foo": "a"}}
+
+        cache.set_many({"c": {"foo": "c"}})
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"foo": "a"}, "c": {"foo": "c"}}
+
+    def test_expires(self):
+        cache = LocalNodeCache(max_size=1024, ttl=60)
+        with mock.patch("sentry.nodestore.base.time", return_value=1000):
+            cache.set_many({"a": {"foo": "a"}})
+        with mock.patch("sentry.nodestore.base.time", return_value=1059):
+            assert cache.get_many(["a"]) == {"a": {"foo": "a"}}
+        with mock.patch("sentry.nodestore.base.time", return_value=1060):
+            assert cache.get_many(["a"]) == {}
+        assert len(cache) == 0
@@ -2,8 +2,12 @@ from __future__ import absolute_import
 
 import pytest
 
-from sentry.models import ProjectKey
-from sentry.relay.config import get_project_config
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from sentry.models import OrganizationOption, ProjectKey, ProjectOption
+from sentry.relay.config import get_project_config, get_project_configs
+from sentry.utils.cache import cache
 from sentry.utils.safe import get_path
 from sentry.testutils.helpers import Feature
 
@@ -73,3 +77,53 @@ def test_project_config_uses_filter_features(default_project, insta_snapshot, ha
         else:
             assert cfg_releases is None
             assert cfg_error_messages is None
+
+
+def _strip_volatile(cfg):
+    cfg = cfg.to_dict()
+    cfg.pop("lastFetch")
+    cfg.pop("rev")
+    cfg.pop("lastChange")
+    return cfg
+
+
+@pytest.mark.django_db
+def test_get_project_configs(default_project, default_projectkey):
+    default_project.update_option("sentry:relay_pii_config", PII_CONFIG)
+    default_project.update_option("sentry:relay-rev", "abc")
+    keys = list(ProjectKey.objects.filter(project=default_project))
+
+    configs = get_project_configs([default_project], {default_project.id: keys})
+    assert set(configs) == {default_project.id} | {key.public_key for key in keys}
+
+    cfg = get_project_config(default_project, full_config=True, project_keys=keys)
+    assert _strip_volatile(configs[default_project.id]) == _strip_volatile(cfg)
+
+    for key in keys:
+        cfg = get_project_config(default_project, full_config=True, project_keys=[key])
+        assert _strip_volatile(configs[key.public_key]) == _strip_volatile(cfg)
+
+
+@pytest.mark.django_db
+def test_get_project_configs_queries(factories, default_organization, default_team):
+    def count_queries(projects):
+        ProjectOption.objects.clear_local_cache()
+        OrganizationOption.objects.clear_local_cache()
+        cache.clear()
+        projects = list(projects)
+        project_keys = {}
+        for key in ProjectKey.objects.filter(project__in=projects):
+            project_keys.setdefault(key.project_id, []).append(key)
+
+        with CaptureQueriesContext(connection) as queries:
+            get_project_configs(projects, project_keys)
+        return len(queries.captured_queries)
+
+    projects = [factories.create_project(organization=default_organization, teams=[default_team])]
+    single = count_queries(projects)
+
+    for _ in range(5):
+        projects.append(
+            factories.create_project(organization=default_organization, teams=[default_team])
+        )
+    assert count_queries(projects) == single
@@ -0,0 +1,63 @@
+from __future__ import absolute_import
+
+import pytest
+
+from sentry.relay.projectconfig_cache.redis import RedisProjectConfigCache
+from sentry.utils.compat import mock
+
+
+@pytest.fixture
+def local_cache():
+    cache = RedisProjectConfigCache(local_cache_ttl=60, local_cache_size=2)
+    cache.delete_many(["1", "2", "3"])
+    return cache
+
+
+def test_get_raw_many(local_cache):
+    local_cache.set_many({1: {"disabled": True}, "abc": {"disabled": False}})
+
+    assert local_cache.get_raw_many([1, "abc", 2]) == {
+        "1": '{"disabled":true}',
+        "abc": '{"disabled":false}',
+    }
+    assert local_cache.get(1) == {"disabled": True}
+    assert local_cache.get(2) is None
+
+
+def test_local_cache(local_cache):
+    local_cache.set_many({1: {"disabled": True}})
+    assert local_cache.get(1) == {"disabled": True}
+
+    other = RedisProjectConfigCache(local_cache_ttl=60)
+    assert other.get(1) == {"disabled": True}
+
+    # only the version is read from redis
+    with mock.patch.object(local_cache.cluster, "map") as redis_map:
+        assert local_cache.get_raw_many([1]) == {"1": '{"disabled":true}'}
+    assert not redis_map.called
+
+    # writes in other processes bump the version and invalidate the entries
+    other.set_many({1: {"disabled": False}})
+    assert local_cache.get(1) == {"disabled": False}
+
+    other.delete_many([1])
+    assert local_cache.get(1) is None
+
+
+def test_local_cache_size(local_cache):
+    local_cache.set_many({1: {}, 2: {}, 3: {}})
+    local_cache.get_raw_many([1, 2, 3])
+    assert len(local_cache._local_cache) == 2
+
+
+def test_local_cache_write_back(local_cache):
+    local_cache.set_many({1: {"disabled": True}})
+    assert local_cache.get(1) == {"disabled": True}
+
+    # writing back computed configs does not invalidate the local caches
+    other = RedisProjectConfigCache(local_cache_ttl=60)
+    other.set_many({2: {"disabled": False}}, invalidate=False)
+    with mock.patch.object(local_cache.cluster, "map") as redis_map:
+        assert local_cache.get_raw_many([1]) == {"1": '{"disabled":true}'}
+    assert not redis_map.called
+    assert local_cache.get(2) == {"disabled": False}
@@ -3,6 +3,8 @@
 from __future__ import absolute_import
 
 from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from sentry.models import GroupRuleStatus, Rule, GroupStatus
@@ -10,7 +12,7 @@ from sentry.mail.actions import ActionTargetType
 from sentry.testutils import TestCase
 from sentry.utils.compat.mock import patch
 from sentry.rules import init_registry
-from sentry.rules.processor import RuleProcessor
+from sentry.rules.processor import RuleProcessor, compiled_rules
 from sentry.rules.filters.base import EventFilter
 
 EMAIL_ACTION_DATA = {
@@ -87,6 +89,81 @@ class RuleProcessorTest(TestCase):
         results = list(rp.apply())
         assert len(results) == 0
 
+    def test_many_rules_single_status_update(self):
+        rules_list = [self.rule] + [
+            Rule.objects.create(
+                project=self.event.project,
+                data={"conditions": [EVERY_EVENT_COND_DATA], "actions": [EMAIL_ACTION_DATA]},
+            )
+            for _ in range(4)
+        ]
+
+        rp = RuleProcessor(
+            self.event,
+            is_new=True,
+            is_regression=True,
+            is_new_group_environment=True,
+            has_reappeared=True,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            results = list(rp.apply())
+        assert len(results) == 1
+        callback, futures = results[0]
+        assert {f.rule.id for f in futures} == {r.id for r in rules_list}
+        assert GroupRuleStatus.objects.filter(group=self.event.group).count() == len(rules_list)
+
+        # The statuses of a new group are created with a single statement
+        inserts = [
+            q
+            for q in queries.captured_queries
+            if "sentry_grouprulestatus" in q["sql"]
+            and q["sql"].lstrip().lower().startswith("insert")
+        ]
+        assert len(inserts) == 1
+
+        GroupRuleStatus.objects.filter(rule__in=rules_list).update(
+            last_active=timezone.now() - timedelta(minutes=Rule.DEFAULT_FREQUENCY + 1)
+        )
+        event = self.store_event(data={}, project_id=self.project.id)
+        assert event.group_id == self.event.group_id
+
+        rp = RuleProcessor(
+            event,
+            is_new=False,
+            is_regression=False,
+            is_new_group_environment=False,
+            has_reappeared=False,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            results = list(rp.apply())
+        assert len(results) == 1
+        assert len(results[0][1]) == len(rules_list)
+
+        status_queries = [
+            q for q in queries.captured_queries if "sentry_grouprulestatus" in q["sql"]
+        ]
+        assert len(status_queries) == 1
+
+    def test_compiled_rules_are_reused(self):
+        compiled = compiled_rules.get(self.rule, self.project, RuleProcessor.logger)
+        assert compiled_rules.get(self.rule, self.project, RuleProcessor.logger) is compiled
+
+        self.rule.data["frequency"] = 5
+        self.rule.save()
+        recompiled = compiled_rules.get(self.rule, self.project, RuleProcessor.logger)
+        assert recompiled is not compiled
+        assert recompiled.frequency == 5
+
+    def test_compiled_rules_environment_change(self):
+        compiled = compiled_rules.get(self.rule, self.project, RuleProcessor.logger)
+        environment = self.create_environment(project=self.project)
+
+        self.rule.environment_id = environment.id
+        self.rule.save()
+        recompiled = compiled_rules.get(self.rule, self.project, RuleProcessor.logger)
+        assert recompiled is not compiled
+        assert all(c.rule.environment_id == environment.id for c in recompiled.conditions)
+
 
 # mock filter which always passes
 class MockFilterTrue(EventFilter):
@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 
+import mmh3
+import random
+
 from collections import Counter
 from unittest import TestCase
 
@@ -32,3 +35,21 @@ class MinHashSignatureBuilderTestCase(TestCase):
         self.assertAlmostEqual(
             similarity, estimation, delta=0.1  # totally made up constant, seems reasonable
         )
+
+    def test_build_many_matches_single_signatures(self):
+        def reference(features, columns, rows):
+            return [min(mmh3.hash(f, column) % rows for f in features) for column in range(columns)]
+
+        get_signature = MinHashSignatureBuilder(16, 0xFFFF)
+
+        rng = random.Random(1)
+        vocabulary = ["frame-{}".format(i) for i in range(500)]
+        feature_sets = [set(rng.sample(vocabulary, rng.randint(1, 50))) for _ in range(100)]
+
+        signatures = get_signature.build_many(feature_sets)
+        assert signatures == [reference(features, 16, 0xFFFF) for features in feature_sets]
+        assert signatures == [get_signature(features) for features in feature_sets]
+
+    def test_empty_features(self):
+        with self.assertRaises(ValueError):
+            MinHashSignatureBuilder(16, 0xFFFF)(set())
@@ -228,6 +228,7 @@ def test_max_events(
 
     # Make sure it never gets called
     monkeypatch.setattr("sentry.tasks.reprocessing2.reprocess_event", None)
+    monkeypatch.setattr("sentry.tasks.reprocessing2.reprocess_events", None)
 
     with task_runner():
         reprocess_group(default_project.id, event.group_id, max_events=0)
@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+
+import pytest
+
+from sentry.reprocessing2 import (
+    _get_info_key,
+    _get_sync_counter_key,
+    _get_sync_redis_client,
+    get_progress,
+    reserve_reprocessing_budget,
+)
+from sentry.testutils.helpers import override_options
+from sentry.utils import json
+from sentry.utils.compat import mock
+
+
+def test_get_progress():
+    client = _get_sync_redis_client()
+    client.set(_get_sync_counter_key(1234), 30)
+    client.set(_get_info_key(1234), json.dumps({"totalEvents": 100, "startedAt": 1000.0}))
+
+    with mock.patch("time.time", return_value=1010.0):
+        assert get_progress(1234) == {
+            "totalEvents": 100,
+            "pendingEvents": 30,
+            "eventsPerSecond": 7.0,
+            "etaSeconds": 4,
+        }
+
+    assert get_progress(4321) is None
+
+
+@pytest.mark.django_db
+def test_reserve_reprocessing_budget():
+    with override_options({"reprocessing2.events-per-second": 10}), mock.patch(
+        "time.time", return_value=1000.0
+    ):
+        assert reserve_reprocessing_budget(1, 6)
+        assert not reserve_reprocessing_budget(1, 6)
+        assert reserve_reprocessing_budget(2, 6)
+
+    with override_options({"reprocessing2.events-per-second": 0}):
+        assert reserve_reprocessing_budget(1, 1000)
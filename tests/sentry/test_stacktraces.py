@@ -2,13 +2,21 @@ from __future__ import absolute_import
 
 import pytest
 
+from django.test.utils import override_settings
+
 from sentry.grouping.api import get_default_grouping_config_dict, load_grouping_config
 from sentry.stacktraces.processing import (
+    StacktraceProcessor,
     find_stacktraces_in_data,
     normalize_stacktraces_for_grouping,
     get_crash_frame_from_event_data,
+    get_stacktrace_processing_task,
+    local_frame_cache,
+    lookup_frame_cache,
 )
 from sentry.testutils import TestCase
+from sentry.utils.cache import cache
+from sentry.utils.compat import mock
 
 
 class FindStacktracesTest(TestCase):
@@ -360,3 +368,72 @@ class NormalizeInApptest(TestCase):
 )
 def test_get_crash_frame(event):
     assert get_crash_frame_from_event_data(event)["marco"] == "polo"
+
+
+class FunctionCacheProcessor(StacktraceProcessor):
+    def handles_frame(self, frame, stacktrace_info):
+        return True
+
+    def preprocess_frame(self, processable_frame):
+        processable_frame.set_cache_key_from_values([processable_frame["function"]])
+
+
+class FrameCacheTest(TestCase):
+    def setUp(self):
+        local_frame_cache.clear()
+        self.addCleanup(local_frame_cache.clear)
+
+    def make_data(self, functions):
+        return {
+            "project": self.project.id,
+            "platform": "native",
+            "stacktrace": {"frames": [{"function": function} for function in functions]},
+        }
+
+    def test_lookup_frame_cache(self):
+        cache.set("pf:a", {"a": 1})
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            assert lookup_frame_cache(["pf:a", "pf:b"]) == {"pf:a": {"a": 1}, "pf:b": None}
+        assert get_many.call_count == 1
+
+    def test_processing_task_single_lookup(self):
+        # Most frames of an event come from a few runtime functions
+        functions = ["main", "dispatch", "run", "dispatch", "run", "dispatch", "handler"]
+        data = self.make_data(functions)
+        infos = find_stacktraces_in_data(data)
+        processor = FunctionCacheProcessor(data, infos, project=self.project)
+
+        processing_task = get_stacktrace_processing_task(infos, [processor])
+        (frame,) = [f for f in processing_task.iter_processable_frames() if f.idx == 0]
+        frame.set_cache_value({"symbol": "handler"})
+
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            processing_task = get_stacktrace_processing_task(infos, [processor])
+        assert get_many.call_count == 1
+        assert len(get_many.call_args[0][0]) == 4
+
+        frames = list(processing_task.iter_processable_frames())
+        assert len(frames) == len(functions)
+        for frame in frames:
+            if frame["function"] == "handler":
+                assert frame.cache_value == {"symbol": "handler"}
+            else:
+                assert frame.cache_value is None
+
+    @override_settings(SENTRY_FRAME_CACHE_LOCAL_SIZE=2)
+    def test_local_frame_cache(self):
+        cache.set_many({"pf:a": 1, "pf:b": 2, "pf:c": 3})
+        assert lookup_frame_cache(["pf:a", "pf:b", "pf:c", "pf:d"]) == {
+            "pf:a": 1,
+            "pf:b": 2,
+            "pf:c": 3,
+            "pf:d": None,
+        }
+        assert len(local_frame_cache) == 2
+
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            assert lookup_frame_cache(["pf:b", "pf:c"]) == {"pf:b": 2, "pf:c": 3}
+            assert get_many.call_count == 0
+
+            assert lookup_frame_cache(["pf:a", "pf:c"]) == {"pf:a": 1, "pf:c": 3}
+            get_many.assert_called_once_with(["pf:a"])
@@ -110,3 +110,30 @@ class SnubaEventStreamTest(TestCase, SnubaTestCase):
         )
         assert len(result["data"]) == 1
         assert result["data"][0]["group_id"] is None
+
+    @patch("sentry.eventstream.insert")
+    def test_insert_many(self, mock_eventstream_insert):
+        now = datetime.utcnow()
+        event = self.__build_event(now)
+
+        insert_kwargs = {
+            "event": event,
+            "group": event.group,
+            "is_new_group_environment": True,
+            "is_new": True,
+            "is_regression": False,
+            "primary_hash": "acbd18db4cc2f85cedef654fccc4a4d8",
+            "skip_consume": False,
+            "received_timestamp": event.data["received"],
+        }
+        self.kafka_eventstream.insert_many([insert_kwargs, insert_kwargs])
+
+        # Delivery callbacks are served once for the whole batch
+        assert self.kafka_eventstream.producer.poll.call_count == 1
+        assert self.kafka_eventstream.producer.produce.call_count == 2
+
+        for produce_args, produce_kwargs in self.kafka_eventstream.producer.produce.call_args_list:
+            assert produce_kwargs["key"] == six.text_type(self.project.id).encode("utf-8")
+            version, type_, payload1, payload2 = json.loads(produce_kwargs["value"])
+            assert type_ == "insert"
+            assert payload1["event_id"] == event.event_id
@@ -23,6 +23,7 @@ from sentry.tasks.unmerge import (
     get_group_backfill_attributes,
     get_group_creation_attributes,
     unmerge,
+    UnmergeProgress,
 )
 from sentry.testutils import SnubaTestCase, TestCase
 from sentry.utils.dates import to_timestamp
@@ -170,6 +171,56 @@ class UnmergeTestCase(TestCase, SnubaTestCase):
             "first_release": None,
         }
 
+    @with_feature("projects:similarity-indexing")
+    def test_unmerge_checkpoints(self):
+        now = before_now(minutes=5).replace(microsecond=0, tzinfo=pytz.utc)
+        project = self.create_project()
+
+        events = OrderedDict()
+        for i in xrange(7):
+            event = self.store_event(
+                data={
+                    "message": "This is message #%s." % i,
+                    "fingerprint": ["group1" if i % 2 else "group2"],
+                    "timestamp": iso_format(now + timedelta(seconds=i)),
+                },
+                project_id=project.id,
+            )
+            events.setdefault(get_fingerprint(event), []).append(event)
+
+        fingerprint, other_fingerprint = events.keys()
+        merge_source = events[fingerprint][0].group
+        source = events[other_fingerprint][0].group
+
+        with self.tasks():
+            eventstream_state = eventstream.start_merge(project.id, [merge_source.id], source.id)
+            merge_groups.delay([merge_source.id], source.id)
+            eventstream.end_merge(eventstream_state)
+
+        with self.options({"unmerge.checkpoint-batches": 2}), patch(
+            "sentry.tasks.unmerge.UnmergeProgress.save",
+            autospec=True,
+            side_effect=UnmergeProgress.save,
+        ) as save, self.tasks():
+            unmerge.delay(project.id, source.id, None, [fingerprint], None, batch_size=2)
+
+        # The first task processes two batches of two events, the remaining
+        # three events are processed by the next task. The cursor is saved
+        # after every batch but the last.
+        assert save.call_count == 3
+        assert [call[1]["events"] for call in save.call_args_list] == [2, 4, 6]
+        assert [call[1]["batches"] for call in save.call_args_list] == [1, 2, 3]
+        progress = save.call_args[0][0]
+        assert progress.get() is None
+
+        destination = GroupHash.objects.get(project=project, hash=fingerprint).group
+        assert destination.id != source.id
+        assert destination.times_seen == 4
+        assert Group.objects.get(id=source.id).times_seen == 3
+        assert not GroupHash.objects.filter(
+            project=project, state=GroupHash.State.LOCKED_IN_MIGRATION
+        ).exists()
+
     @with_feature("projects:similarity-indexing")
     def test_unmerge(self):
         now = before_now(minutes=5).replace(microsecond=0, tzinfo=pytz.utc)